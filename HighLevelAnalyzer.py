@@ -11,11 +11,47 @@ in sync, but this is the best I could get to (for now). Who knows what we learn
 For analysing the data the USB-PD data between de STUSB4500- SINK and USB-PD power supply there is already another HLA
 https://github.com/saleae/hla-usb-pd. This can be selected as extension in Saleae
 
+The same decoder can be used outside Logic 2 on an exported I2C capture, see offline.py
+
 October 2022, version 1.0.0
 Paul van Haastrecht
 
 '''
-from saleae.analyzers import HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting
+import sys
+import time
+
+try:
+    from saleae.analyzers import HighLevelAnalyzer, AnalyzerFrame, StringSetting, NumberSetting, ChoicesSetting
+
+except ImportError:
+    # not running inside Logic 2 (offline mode, see offline.py)
+    # provide the small part of the extension API this decoder uses
+
+    class HighLevelAnalyzer:
+        pass
+
+    class AnalyzerFrame:
+        def __init__(self, type, start_time, end_time, data=None):
+            self.type = type
+            self.start_time = start_time
+            self.end_time = end_time
+            self.data = data if data is not None else {}
+
+    class StringSetting:
+        def __init__(self, label=''):
+            self.label = label
+            self.default = ''
+
+    class NumberSetting:
+        def __init__(self, label='', min_value=None, max_value=None):
+            self.label = label
+            self.default = min_value if min_value is not None else 0
+
+    class ChoicesSetting:
+        def __init__(self, choices, label=''):
+            self.label = label
+            self.choices = choices
+            self.default = choices[0]
 
 # Registers with decoders
 
@@ -40,6 +76,7 @@ VBUS_CTRL                   = '0x27'        # read/decode only
 PE_FSM                      = '0x29'        # read/decode only
 GPIO_SW_GPIO                = '0x2d'
 TX_HEADER_LOW               = '0x51'
+RW_BUFFER                   = '0x53'
 DPM_PDO_NUMB                = '0x70'
 DPM_SNK_PDO1_0              = '0x85'        # > 0x88
 DPM_SNK_PDO2_0              = '0x89'        # > 0x8C
@@ -104,10 +141,10 @@ STUSB_Registers = {
     '0x48': 'RX_DATA_OBJ6_1: ',               # read only
     '0x49': 'RX_DATA_OBJ6_2: ',               # read only
     '0x4a': 'RX_DATA_OBJ6_3: ',               # read only
-    '0x4b': 'RX_DATA_OBJ6_0: ',               # read only
-    '0x4c': 'RX_DATA_OBJ6_1: ',               # read only
-    '0x4d': 'RX_DATA_OBJ6_2: ',               # read only
-    '0x4e': 'RX_DATA_OBJ6_3: ',               # read only
+    '0x4b': 'RX_DATA_OBJ7_0: ',               # read only
+    '0x4c': 'RX_DATA_OBJ7_1: ',               # read only
+    '0x4d': 'RX_DATA_OBJ7_2: ',               # read only
+    '0x4e': 'RX_DATA_OBJ7_3: ',               # read only
     '0x51': 'TX_HEADER_LOW: ',
     '0x52': 'TX_HEADER_HIGH: ',               # read / write but no description that it does
     '0x53': 'RW_BUFFER: ',
@@ -124,6 +161,17 @@ STUSB_Registers = {
     '0x97': 'CTRL_1: '                        # NVM control
 }
 
+# complete the names from the register header (tables generated by gen_tables.py), the names above are kept
+try:
+    from stusb4500_tables import REGISTERS as Header_registers
+
+except ImportError:
+    Header_registers = {}
+
+for reg in Header_registers:
+    if reg not in STUSB_Registers:
+        STUSB_Registers[reg] = Header_registers[reg][0][0] + ': '
+
 """ Password register """
 FTP_CUST_PASSWORD   = '0x47'     # enable NVM access
 
@@ -272,9 +320,1112 @@ PE_HARD_RESET_SHUTDOWN      = 0x1a
 PE_HARD_RESET_RECOVERY      = 0x1b
 PE_ERRORRECOVERY            = 0x40
 
+""" Settings """
+# the registers of which the decoded output depends on a setting (None : all registers)
+# a setting change only needs the transactions on these registers to be rendered again
+SETTING_REGISTERS = {
+    'power_units'     : (DPM_SNK_PDO1_0, DPM_SNK_PDO2_0, DPM_SNK_PDO3_0, RDO_REG_STATUS_0),
+    'register_filter' : (),                     # selects frames to show, does not change decoding
+    'state_display'   : (),
+    'read_display'    : (),
+    'nvm_timing'      : (),
+    'nvm_slow_ms'     : (),
+    'renegotiation_timing': (),
+    'sink_capabilities': (),
+    'trigger'         : (),
+    'anomalies'       : (),
+    'anomaly_sigma'   : (),
+    'sampling'        : (),
+    'sample_budget_ms': ()
+}
+
+UNITS_V_A       = 'V / A'
+UNITS_MV_MA     = 'mV / mA'
+
+STATES_EVERY_POLL       = 'every poll'
+STATES_TRANSITIONS      = 'transitions only'
+
+READS_SEPARATE          = 'pointer write and read'
+READS_COMBINED          = 'combined'
+
+NVM_TIMING_OFF          = 'off'
+NVM_TIMING_ALL          = 'all operations'
+NVM_TIMING_SLOW         = 'slow operations only'
+NVM_SLOW_DEFAULT_MS     = 10
+
+RENEGOTIATION_OFF       = 'off'
+RENEGOTIATION_ALL       = 'all attempts'
+RENEGOTIATION_FAILED    = 'failed attempts only'
+
+SINK_CAPABILITIES_OFF   = 'off'
+SINK_CAPABILITIES_ON    = 'on change'
+
+TRIGGER_NONE            = 'none'
+TRIGGER_HARD_RESET      = 'hard reset'
+TRIGGER_ERROR_RECOVERY  = 'error recovery'
+TRIGGER_VBUS_LOSS       = 'VBUS loss'
+TRIGGER_ANY             = 'any of these'
+
+ANOMALIES_OFF           = 'off'
+ANOMALIES_ON            = 'on'
+ANOMALY_SIGMA_DEFAULT   = 6
+
+SAMPLING_OFF            = 'off'
+SAMPLING_ADAPTIVE       = 'unchanged polls, adaptive'
+SAMPLE_BUDGET_DEFAULT_MS = 50       # decode time per second of capture
+SAMPLE_MAX              = 1024      # decode at least 1 in SAMPLE_MAX unchanged polls
+
+""" State machine events """
+PE_FSM_States = {
+    PE_INIT                     : 'PE_INIT',
+    PE_SOFT_RESET               : 'PE_SOFT_RESET',
+    PE_HARD_RESET               : 'PE_HARD_RESET',
+    PE_SEND_SOFT_RESET          : 'PE_SEND_SOFT_RESET',
+    PE_C_BIST                   : 'PE_C_BIST',
+    PE_SNK_STARTUP              : 'PE_SNK_STARTUP',
+    PE_SNK_DISCOVERY            : 'PE_SNK_DISCOVERY',
+    PE_SNK_WAIT_FOR_CAPABILITIES: 'PE_SNK_WAIT_FOR_CAPABILITIES',
+    PE_SNK_EVALUATE_CAPABILITIES: 'PE_SNK_EVALUATE_CAPABILITIES',
+    PE_SNK_SELECT_CAPABILITIES  : 'PE_SNK_SELECT_CAPABILITIES',
+    PE_SNK_TRANSITION_SINK      : 'PE_SNK_TRANSITION_SINK',
+    PE_SNK_READY                : 'PE_SNK_READY',
+    PE_SNK_READY_SENDING        : 'PE_SNK_READY_SENDING',
+    PE_HARD_RESET_SHUTDOWN      : 'PE_HARD_RESET_SHUTDOWN',
+    PE_HARD_RESET_RECOVERY      : 'PE_HARD_RESET_RECOVERY',
+    PE_ERRORRECOVERY            : 'PE_ERRORRECOVERY'
+}
+
+TYPEC_FSM_States = {
+    UNATTACHED_SNK              : 'UNATTACHED_SNK',
+    ATTACHWAIT_SNK              : 'ATTACHWAIT_SNK',
+    ATTACHED_SNK                : 'ATTACHED_SNK',
+    DEBUGACCESSORY_SNK          : 'DEBUGACCESSORY_SNK',
+    TYPEC_ERRORRECOVERY         : 'TYPEC_ERRORRECOVERY'
+}
+
+CC_States = {
+    0x0: 'Open',
+    0x1: 'Default',
+    0x2: 'Power1_5',
+    0x3: 'Power3_0'
+}
+
+def pe_state_name(value):
+    return PE_FSM_States.get(value, 'reserved ' + hex(value))
+
+def typec_state_name(value):
+    return TYPEC_FSM_States.get(value & 0x1f, 'reserved ' + hex(value & 0x1f))
+
+def cc_state_name(value):
+    if value & LOOKING_4_CONNECTION:
+        return 'LOOKING'
+
+    if value & CONNECT_RESULT:
+        return 'PRESENT_RD CC1_' + CC_States[value & 0x3] + ' CC2_' + CC_States[(value >> 2) & 0x3]
+
+    return 'NOT_LOOKING'
+
+# registers of which only the transitions can be shown, with the function to name the state
+STATE_REGISTERS = {
+    PE_FSM          : pe_state_name,
+    TYPEC_STATUS    : typec_state_name,
+    CC_STATUS       : cc_state_name
+}
+
+# registers that can trigger, next to the state registers
+TRIGGER_REGISTERS = (PRT_STATUS, TYPEC_MONITORING_STATUS_0, TYPEC_MONITORING_STATUS_1)
+
+EVENT_REGISTERS = frozenset(tuple(STATE_REGISTERS) + TRIGGER_REGISTERS)
+
+def format_time(seconds):
+    """ readable duration """
+    if seconds is None:
+        return '-'
+    if seconds >= 1:
+        return '{:.3f} s'.format(seconds)
+    if seconds >= 0.001:
+        return '{:.3f} ms'.format(seconds * 1000)
+    return '{:.1f} us'.format(seconds * 1000000)
+
+class StateEvents:
+    """ keeps the last known policy-engine, Type-C and CC state and reports the transitions """
+
+    def __init__(self):
+        self.states = {}        # register : (state name, time state was entered)
+        self.vbus_ready = None  # last VBUS_READY from TYPEC_MONITORING_STATUS_1
+
+    def update(self, register, value, time):
+        """ returns (previous state or None, new state, dwell in previous state or None) on change, else None """
+        name = STATE_REGISTERS[register](value)
+        last = self.states.get(register)
+
+        if last is not None and last[0] == name:
+            return None
+
+        self.states[register] = (name, time)
+
+        if last is None:
+            return (None, name, None)
+
+        return (last[0], name, float(time - last[1]))
+
+    def state_trigger(self, register, name, trigger):
+        """ the trigger condition a new state meets (None : no trigger) """
+        if trigger in (TRIGGER_HARD_RESET, TRIGGER_ANY):
+            if register == PE_FSM and name in ('PE_HARD_RESET', 'PE_HARD_RESET_SHUTDOWN', 'PE_HARD_RESET_RECOVERY'):
+                return TRIGGER_HARD_RESET
+
+        if trigger in (TRIGGER_ERROR_RECOVERY, TRIGGER_ANY):
+            if name in ('PE_ERRORRECOVERY', 'TYPEC_ERRORRECOVERY'):
+                return TRIGGER_ERROR_RECOVERY
+
+        return None
+
+    def other_trigger(self, register, value, trigger):
+        """ check a trigger register value, returns description when the trigger condition is met """
+        if register == TYPEC_MONITORING_STATUS_1:
+            was_ready = self.vbus_ready
+            self.vbus_ready = (value & VBUS_READY) != 0
+
+            if trigger in (TRIGGER_VBUS_LOSS, TRIGGER_ANY) and was_ready == True and not self.vbus_ready:
+                return 'TYPEC_MONITORING_STATUS_1: VBUS Disconnected'
+
+        elif register == TYPEC_MONITORING_STATUS_0:
+            if trigger in (TRIGGER_VBUS_LOSS, TRIGGER_ANY) and value & VBUS_LOW_STATUS:
+                return 'TYPEC_MONITORING_STATUS_0: VBUS_LOW_STATUS: ERR'
+
+        elif register == PRT_STATUS:
+            if trigger in (TRIGGER_HARD_RESET, TRIGGER_ANY) and value & PRL_HW_RST_RECEIVED:
+                return 'PRT_STATUS: PRL_HW_RST_RECEIVED'
+
+        return None
+
+""" NVM operation timing """
+NVM_REGISTERS = frozenset((FTP_CTRL_0, FTP_CTRL_1))
+
+# upper limit (seconds) of the histogram buckets, last bucket is everything above
+NVM_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+class DurationStats:
+    """ count, mean, max and histogram of durations by name """
+
+    def __init__(self, title, buckets):
+        self.title = title
+        self.buckets = buckets
+        self.stats = {}             # name : [count, total, max, bucket counts]
+
+    def __len__(self):
+        return len(self.stats)
+
+    def add(self, name, duration):
+        stat = self.stats.get(name)
+
+        if stat is None:
+            stat = [0, 0.0, 0.0, [0] * (len(self.buckets) + 1)]
+            self.stats[name] = stat
+
+        stat[0] += 1
+        stat[1] += duration
+        stat[2] = max(stat[2], duration)
+
+        bucket = 0
+        while bucket < len(self.buckets) and duration > self.buckets[bucket]:
+            bucket += 1
+        stat[3][bucket] += 1
+
+    def report(self):
+        """ histogram per name as text lines """
+        lines = ["{:<28} {:>6} {:>12} {:>12}  ".format(self.title, "count", "mean", "max") +
+                 " ".join("{:>8}".format("<" + format_time(b).replace(" ", "")) for b in self.buckets) + "     more"]
+
+        for name in sorted(self.stats):
+            count, total, longest, buckets = self.stats[name]
+            lines.append("{:<28} {:>6} {:>12} {:>12}  ".format(name, count, format_time(total / count), format_time(longest)) +
+                         " ".join("{:>8}".format(n) for n in buckets))
+
+        return lines
+
+class NvmTimer:
+    """
+    Times the NVM (FTP) operations end to end: from the CTRL_1 opcode write and CTRL_0 write with
+    FTP_CUST_REQ set, until a read of CTRL_0 shows FTP_CUST_REQ cleared. A burst from CTRL_0 also holds
+    CTRL_1, each byte is taken by its register address.
+    """
+
+    def __init__(self):
+        self.opcode = None          # last opcode written in CTRL_1
+        self.opcode_time = None     # time of the CTRL_1 write
+        self.running = None         # (opcode, start time, sector) of the operation in progress
+        self.stats = DurationStats("NVM operation", NVM_BUCKETS)
+
+    def update(self, register, is_read, values, start, end):
+        """
+        values : data bytes of the transaction, from register on
+
+        returns (opcode name, sector, duration) when an operation is done, else None
+        """
+        if register == FTP_CTRL_1:
+            value, opcode = None, values[0]
+        else:
+            value, opcode = values[0], values[1] if len(values) > 1 else None
+
+        # the opcode written in the same burst belongs to the request in CTRL_0
+        if opcode is not None and not is_read:
+            self.opcode = opcode & 0x7
+            self.opcode_time = start
+
+        if value is None:
+            return None
+
+        req = (value >> FTP_CUST_REQ) & 0x01
+
+        if not is_read:
+            if req:
+                begin = self.opcode_time if self.opcode_time is not None else start
+                self.running = (self.opcode, begin, value & 0x7)
+                self.opcode_time = None
+            return None
+
+        if req or self.running is None:
+            return None
+
+        opcode, begin, sector = self.running
+        self.running = None
+
+        name = Dec_control1_opcode.get(opcode, "unknown")
+        duration = float(end - begin)
+        self.stats.add(name, duration)
+
+        return (name, Dec_control0_sect.get(sector, "Sector?"), duration)
+
+    def report(self):
+        """ duration histogram per opcode as text lines """
+        return self.stats.report()
+
+""" Renegotiation timing """
+# sink PDO writes, soft reset (TX_HEADER_LOW + PD_COMMAND_CTRL), PE_FSM and the RDO of the new contract
+RENEGOTIATION_REGISTERS = frozenset((DPM_SNK_PDO1_0, DPM_SNK_PDO2_0, DPM_SNK_PDO3_0, DPM_PDO_NUMB, TX_HEADER_LOW,
+                                     PD_COMMAND_CTRL, PE_FSM, RDO_REG_STATUS_0))
+
+SOFT_RESET_HEADER   = 0x0D      # TX_HEADER_LOW : soft reset message
+SOFT_RESET_COMMAND  = 0x26      # PD_COMMAND_CTRL : send the message
+
+RENEGOTIATION_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class RenegotiationTracker:
+    """
+    Follows a renegotiation: the sink PDO / DPM_PDO_NUMB writes, the soft reset (TX_HEADER_LOW 0x0D and
+    PD_COMMAND_CTRL 0x26), PE_FSM leaving and reaching PE_SNK_READY again and the first RDO_REG_STATUS_0
+    read after that (the new contract). Times are taken from the PD_COMMAND_CTRL write.
+
+    An attempt fails on a hard reset or error recovery state, a capability mismatch in the new RDO, or when
+    the next soft reset is sent before PE_SNK_READY was reached.
+    """
+
+    def __init__(self):
+        self.prepared = None        # time of the first PDO write of the next attempt
+        self.header = False         # TX_HEADER_LOW holds the soft reset header
+        self.attempt = None         # [soft reset time, prepared, left PE_SNK_READY, PE_SNK_READY time]
+        self.contract = None        # last RDO value
+        self.stats = DurationStats("renegotiation", RENEGOTIATION_BUCKETS)
+
+    def update(self, register, is_read, value, start, end):
+        """
+        value : data bytes of the transaction
+
+        returns None, or when an attempt is done (failure reason or None, ready latency, contract latency, RDO)
+        """
+        if not is_read:
+            if register == PD_COMMAND_CTRL:
+                if value[0] != SOFT_RESET_COMMAND or not self.header:
+                    return None
+
+                done = None
+                if self.attempt is not None:
+                    done = self.fail('no PE_SNK_READY', start)
+
+                self.attempt = [start, self.prepared, False, None]
+                self.prepared = None
+                return done
+
+            if register == TX_HEADER_LOW:
+                self.header = value[0] == SOFT_RESET_HEADER
+            elif register != PE_FSM and register != RDO_REG_STATUS_0 and self.prepared is None:
+                self.prepared = start
+
+            return None
+
+        if register == RDO_REG_STATUS_0:
+            if len(value) < 4:
+                return None
+
+            rdo = int.from_bytes(value[:4], 'little')
+            self.contract = rdo
+
+            if self.attempt is None or self.attempt[3] is None:
+                return None
+
+            if (rdo >> RDO_CapaMismatch) & 0x01:
+                return self.fail('capability mismatch', end, rdo)
+
+            begin, prepared, left, ready = self.attempt
+            self.attempt = None
+            self.stats.add('new contract', float(end - begin))
+
+            return (None, float(ready - begin), float(end - begin), rdo)
+
+        if register != PE_FSM or self.attempt is None:
+            return None
+
+        state = value[0]
+
+        if state in (PE_HARD_RESET, PE_HARD_RESET_SHUTDOWN, PE_HARD_RESET_RECOVERY):
+            return self.fail('hard reset', end)
+
+        if state == PE_ERRORRECOVERY:
+            return self.fail('error recovery', end)
+
+        if state != PE_SNK_READY:
+            self.attempt[2] = True
+
+        elif self.attempt[2] and self.attempt[3] is None:
+            self.attempt[3] = end
+            self.stats.add('PE_SNK_READY', float(end - self.attempt[0]))
+
+        return None
+
+    def fail(self, reason, time, rdo=None):
+        begin, prepared, left, ready = self.attempt
+        self.attempt = None
+        self.stats.add('failed: ' + reason, float(time - begin))
+
+        return (reason, None if ready is None else float(ready - begin), float(time - begin), rdo)
+
+    def report(self):
+        """ latency histogram per outcome as text lines """
+        return self.stats.report()
+
+""" Sink capabilities """
+# The three sink PDOs (DPM_SNK_PDO1 - 3, 4 bytes each from 0x85) and DPM_PDO_NUMB are kept as one packed
+# structure, updated by register address from every write and read, also partial and interleaved ones. A
+# frame is shown only when the effective capability set (the first DPM_PDO_NUMB PDOs) changes.
+SINK_PDO_FIRST      = 0x85
+SINK_PDO_SIZE       = 12
+SINK_PDO_NUMB_KNOWN = 1 << SINK_PDO_SIZE     # bit in SinkCapabilities.known
+SINK_CAPABILITY_REGISTERS = frozenset([DPM_PDO_NUMB] + [hex(register) for register in range(SINK_PDO_FIRST, SINK_PDO_FIRST + SINK_PDO_SIZE)])
+
+PDO_SUPPLY_TYPES = ("fixed", "battery", "variable", "augmented")
+
+# fixed supply PDO flags (bit, name), only used in PDO1
+PDO_FLAGS = (
+    (29, "dual role power"),
+    (28, "higher capability"),
+    (27, "unconstrained power"),
+    (26, "USB communications capable"),
+    (25, "dual role data")
+)
+
+FAST_ROLE_SWAP_CURRENTS = ("not supported", "default USB power", "1.5 A @ 5 V", "3.0 A @ 5 V")
+
+def format_power(voltage, current, units):
+    """ voltage and current in the selected units """
+    if units == UNITS_MV_MA:
+        return str(round(voltage * 1000)) + " mV " + str(round(current * 1000)) + " mA"
+
+    return str(voltage) + " V " + str(current) + " A"
+
+def describe_sink_pdo(pdo, units):
+    """ the fields of a sink PDO as text """
+    supply = pdo >> 30
+
+    if supply != 0:
+        return PDO_SUPPLY_TYPES[supply] + " supply " + hex(pdo)
+
+    text = format_power(((pdo >> 10) & 0x3ff) / 20, (pdo & 0x3ff) * 0.01, units)
+    flags = [name for bit, name in PDO_FLAGS if (pdo >> bit) & 0x01]
+
+    fast_role_swap = (pdo >> 23) & 0x03
+    if fast_role_swap:
+        flags.append("fast role swap " + FAST_ROLE_SWAP_CURRENTS[fast_role_swap])
+
+    if flags:
+        text += " (" + ", ".join(flags) + ")"
+
+    return text
+
+class SinkCapabilities:
+    """ sink PDOs and DPM_PDO_NUMB of a device, packed """
+
+    def __init__(self):
+        self.pdos = bytearray(SINK_PDO_SIZE)
+        self.numb = 0
+        self.known = 0              # bit mask of the PDO bytes (and DPM_PDO_NUMB) seen
+        self.effective = None       # bytes of the effective capability set : DPM_PDO_NUMB + its PDOs
+        self.writes = 0             # transactions since the last change
+        self.changes = 0
+
+    def update(self, register, values):
+        """
+        values : data bytes of the transaction
+
+        returns None, or (previous effective set or None, new effective set) when it changed
+        """
+        self.writes += 1
+
+        if register == DPM_PDO_NUMB:
+            self.numb = min(values[0] & 0x07, 3)
+            self.known |= SINK_PDO_NUMB_KNOWN
+        else:
+            offset = int(register, 16) - SINK_PDO_FIRST
+            values = values[:SINK_PDO_SIZE - offset]
+
+            # rewrite of the same value
+            if self.pdos[offset:offset + len(values)] == values and self.known & SINK_PDO_NUMB_KNOWN:
+                self.known |= ((1 << len(values)) - 1) << offset
+                return None
+
+            self.pdos[offset:offset + len(values)] = values
+            self.known |= ((1 << len(values)) - 1) << offset
+
+        needed = SINK_PDO_NUMB_KNOWN | ((1 << (4 * self.numb)) - 1)
+
+        if self.known & needed != needed:
+            return None
+
+        effective = bytes([self.numb]) + bytes(self.pdos[:4 * self.numb])
+
+        if effective == self.effective:
+            return None
+
+        previous = self.effective
+        self.effective = effective
+        self.changes += 1
+        self.writes = 0
+
+        return previous, effective
+
+def sink_pdo_values(effective):
+    """ the PDO values of an effective capability set """
+    return [int.from_bytes(effective[1 + 4 * num:5 + 4 * num], 'little') for num in range(effective[0])]
+
+""" Bus anomalies """
+ANOMALY_ALPHA       = 1 / 32    # weight of a new sample in the running mean and variance
+ANOMALY_WARMUP      = 16        # samples before a register is checked
+ANOMALY_RELEARN     = 4         # anomalies in a row after which the new period is learned
+ANOMALY_FLOOR       = 0.05      # minimum deviation, part of the mean (perfectly regular polling)
+
+class RunningStats:
+    """ exponentially weighted mean and variance, constant memory """
+
+    __slots__ = ("count", "mean", "var")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def add(self, value):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += ANOMALY_ALPHA * delta
+            self.var = (1 - ANOMALY_ALPHA) * (self.var + ANOMALY_ALPHA * delta * delta)
+
+        self.count += 1
+
+    def score(self, value):
+        """ deviation from the mean in standard deviations """
+        return (value - self.mean) / max(self.var ** 0.5, self.mean * ANOMALY_FLOOR, 1e-9)
+
+class AnomalyDetector:
+    """
+    Learns the polling period and the transaction duration of each register online and reports the
+    polling gaps (MCU loop or bus stalled), polling bursts, long transactions (clock stretching, stuck SDA)
+    and transactions with error frames. Memory per register is constant.
+    """
+
+    def __init__(self, sigma):
+        self.sigma = sigma
+        self.periods = {}           # register : [RunningStats, last read time, anomalies in a row]
+        self.durations = {}         # (register, read, length) : RunningStats
+        self.counts = {}            # kind : anomalies found
+
+    def update(self, register, is_read, start, end, errors, length):
+        """ returns list of (kind, description) """
+        found = self.check(register, is_read, start, end, errors, length)
+
+        for kind, description in found:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+        return found
+
+    def check(self, register, is_read, start, end, errors, length):
+        found = []
+        name = STUSB_Registers.get(register, "unknown: ") if register is not None else ""
+
+        if len(errors) > 0:
+            if max(errors) >= length:
+                found.append(("error", name + "incomplete transaction, error after byte " + str(length)))
+            else:
+                found.append(("error", name + "error frame at byte " + str(min(errors))))
+            return found
+
+        if register is None:
+            return found
+
+        duration = float(end - start)
+        stats = self.durations.get((register, is_read, length))
+
+        if stats is None:
+            stats = self.durations[(register, is_read, length)] = RunningStats()
+
+        if stats.count >= ANOMALY_WARMUP and stats.score(duration) > self.sigma:
+            found.append(("long", name + "transaction took " + format_time(duration) + ", expected " + format_time(stats.mean)))
+        else:
+            stats.add(duration)
+
+        # the polling period, of the register reads
+        if not is_read:
+            return found
+
+        period = self.periods.get(register)
+
+        if period is None:
+            self.periods[register] = [RunningStats(), float(start), 0]
+            return found
+
+        stats = period[0]
+        interval = float(start) - period[1]
+        period[1] = float(start)
+
+        if stats.count >= ANOMALY_WARMUP:
+            score = stats.score(interval)
+
+            if abs(score) > self.sigma:
+                found.append(("gap" if score > 0 else "burst", name + ("polling gap " if score > 0 else "polling burst ") +
+                              format_time(interval) + ", expected " + format_time(stats.mean)))
+                period[2] += 1
+
+                # a new polling rate after ANOMALY_RELEARN anomalies in a row
+                if period[2] >= ANOMALY_RELEARN:
+                    period[0] = RunningStats()
+                    period[2] = 0
+
+                return found
+
+        period[2] = 0
+        stats.add(interval)
+        return found
+
+""" Sampled decoding """
+class PollSampler:
+    """
+    Decides which register reads are decoded when sampling
+
+    Every transaction is counted per register. A read that returns another value than the previous read
+    of the register is always decoded, of the unchanged reads only 1 in n. n adapts to the load: the decode
+    time of each second of capture is compared with the budget, n doubles when over and halves when below
+    half of the budget.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget        # decode time (seconds) per second of capture
+        self.n = 1
+        self.counts = {}            # register : transactions
+        self.last = {}              # register : last value read
+        self.unchanged = {}         # register : unchanged reads since the last change
+        self.skipped = {}           # register : reads skipped since the last decoded read
+        self.skipped_total = {}     # register : reads skipped
+        self.window = None          # capture time the current second started
+        self.spent = 0.0            # decode time in the current second
+
+    def count(self, register):
+        self.counts[register] = self.counts.get(register, 0) + 1
+
+    def take(self, register, values):
+        """ True when the read is decoded """
+        if self.last.get(register) != values:
+            self.last[register] = values
+            self.unchanged[register] = 0
+            return True
+
+        self.unchanged[register] += 1
+
+        if self.unchanged[register] % self.n == 0:
+            return True
+
+        self.skipped[register] = self.skipped.get(register, 0) + 1
+        self.skipped_total[register] = self.skipped_total.get(register, 0) + 1
+        return False
+
+    def account(self, start, spent):
+        """ add decode time of a transaction, adapt n after each second of capture """
+        start = float(start)
+
+        if self.window is None:
+            self.window = start
+
+        self.spent += spent
+
+        if start - self.window >= 1.0:
+            load = self.spent / (start - self.window)
+
+            if load > self.budget:
+                self.n = min(self.n * 2, SAMPLE_MAX)
+            elif load < self.budget / 2 and self.n > 1:
+                self.n //= 2
+
+            self.window = start
+            self.spent = 0.0
+
+def frame_list(out):
+    """ output of an emit as list """
+    if out is None:
+        return []
+
+    if isinstance(out, list):
+        return out
+
+    return [out]
+
+def frame_output(frames):
+    """ list of frames as output of an emit : None, a frame or a list """
+    if len(frames) == 0:
+        return None
+
+    if len(frames) == 1:
+        return frames[0]
+
+    return frames
+
+""" Label pool """
+# Logic 2 keeps the data of every frame. The labels (register, address and byte values, descriptions) come
+# from one pool and the frames of the same payload (same register, same value) share one data dict, so a
+# long capture does not hold a copy per frame. Shared data dicts must not be changed: copy them first (see
+# own_data). SHARED_FRAME_DATA = False gives every frame its own data dict (see bench_memory.py).
+SHARED_FRAME_DATA = True
+FRAME_POOL_SIZE = 65536
+
+HEX_LABELS = tuple(sys.intern(hex(value)) for value in range(256))
+ADDRESS_LABELS = HEX_LABELS[:128]
+_frame_data_pool = {}
+
+def address_label(address):
+    """ the address as shown in the frames """
+    if address is None:
+        return "error"
+
+    return ADDRESS_LABELS[address]
+
+def label(text):
+    """ the pooled copy of a label that is built per frame """
+    if SHARED_FRAME_DATA:
+        return sys.intern(text)
+
+    return text
+
+def shared_data(data):
+    """ the pooled data dict with the same content, the labels interned """
+    if not SHARED_FRAME_DATA:
+        return data
+
+    key = tuple(data.items())
+    pooled = _frame_data_pool.get(key)
+
+    if pooled is None:
+        if len(_frame_data_pool) >= FRAME_POOL_SIZE:
+            _frame_data_pool.clear()
+
+        pooled = {name: sys.intern(value) if type(value) is str else value for name, value in key}
+        _frame_data_pool[key] = pooled
+
+    return pooled
+
+def own_data(frame):
+    """ give a frame its own data dict, before it is changed """
+    if SHARED_FRAME_DATA:
+        frame.data = dict(frame.data)
+
+""" Register spec """
+# Single byte registers are described as data: the fields with mask, shift and the text to show. At import
+# every spec is compiled into its own decoder function (see compile_decoder). A new register only needs an
+# entry in REGISTER_SPEC. The 32 bit registers (sink PDO, RDO) keep their decoder in Hla.
+
+ACCESS_RW = 'read / write'
+ACCESS_RO = 'read only'
+ACCESS_RC = 'read and clear'
+
+# where the text of a field goes
+TO_ACTION       = 'action'          # comma separated action
+TO_DESCRIPTION  = 'description'     # comma separated description
+TO_TEXT         = 'text'            # appended to the register name
+
+def field_flag(mask, on=None, off=None, when=0):
+    """ show on when any bit of mask is set, else off (None : nothing) """
+    return ('flag', mask, on, off, when)
+
+def field_enum(mask, shift, names, default=None, to=TO_ACTION, when=0):
+    """ show the name of the value (data_byte >> shift) & mask, default if unknown (None : nothing) """
+    return ('enum', mask, shift, names, default, to, when)
+
+def field_value(mask, shift, label, when=0):
+    """ show the label and the value (data_byte >> shift) & mask """
+    return ('value', mask, shift, label, when)
+
+REGISTER_SPEC = {
+    ALERT_STATUS_1: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(PRT_STATUS_AL, "PRT_STATUS_AL"),
+            field_flag(CC_HW_FAULT_STATUS_AL, "CC_HW_FAULT_STATUS_AL"),
+            field_flag(TYPEC_MONITORING_STATUS_AL, "TYPEC_MONITORING_STATUS_AL"),
+            field_flag(PORT_STATUS_AL, "PORT_STATUS_AL"))
+    },
+    ALERT_STATUS_1_MASK: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(PRT_STATUS_AL, "PRT_STATUS_AL: MASKED", "PRT_STATUS_AL: UNMASKED"),
+            field_flag(CC_HW_FAULT_STATUS_AL, "CC_HW_FAULT_STATUS_AL: MASKED", "CC_HW_FAULT_STATUS_AL: UNMASKED"),
+            field_flag(TYPEC_MONITORING_STATUS_AL, "TYPEC_MONITORING_STATUS_AL: MASKED", "TYPEC_MONITORING_STATUS_AL: UNMASKED"),
+            field_flag(PORT_STATUS_AL, "PORT_STATUS_AL: MASKED", "PORT_STATUS_AL: UNMASKED"))
+    },
+    PORT_STATUS_1: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_enum(0x7, 5, {NONE_ATT: "NONE_ATT", SNK_ATT: "SNK_ATT", DBG_ATT: "DBG_ATT"}),
+            field_flag(POWER_MODE, "Device sinking power"),
+            field_flag(DATA_MODE, "UFP"),
+            field_flag(ATTACH, "Attached", "Unattached"))
+    },
+    TYPEC_MONITORING_STATUS_0: {
+        "access": ACCESS_RC,
+        "fields": (
+            field_flag(VBUS_VALID_SNK_TRANS, "VBUS_VALID_SNK_TRANS"),
+            field_flag(VBUS_VSAFE0V_TRANS, "VBUS_VSAFE0V_TRANS"),
+            field_flag(VBUS_READY_TRANS, "VBUS_READY_TRANS"),
+            field_flag(VBUS_LOW_STATUS, "VBUS_LOW_STATUS: ERR", "VBUS_LOW_STATUS: OK"),
+            field_flag(VBUS_HIGH_STATUS, "VBUS_HIGH_STATUS: ERR", "VBUS_HIGH_STATUS: OK"))
+    },
+    TYPEC_MONITORING_STATUS_1: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(VBUS_READY, "VBUS Connected", "VBUS Disconnected"),
+            field_flag(VBUS_VSAFE0V, "VBUS < 0.8V", "VBUS > 0.8V"),
+            field_flag(VBUS_VALID_SNK, "VBUS V > SNK_DISC_THRESHOLD", "VBUS V < SNK_DISC_THRESHOLD"))
+    },
+    CC_STATUS: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(LOOKING_4_CONNECTION, "Try connecting", "Not connecting"),
+            field_flag(CONNECT_RESULT, "PRESENT_RD"),
+            field_enum(0x3, 2, {SNK_CC2_Default: "SNK_CC2_Default", SNK_CC2_Power1_5: "SNK_CC2_Power1_5",
+                                SNK_CC2_Power3_0: "SNK_CC2_Power3_0"}, when=CONNECT_RESULT),
+            field_enum(0x3, 0, {SNK_CC1_Default: "SNK_CC1_Default", SNK_CC1_Power1_5: "SNK_CC1_Power1_5",
+                                SNK_CC1_Power3_0: "SNK_CC1_Power3_0"}, when=CONNECT_RESULT))
+    },
+    CC_HW_FAULT_STATUS_0: {
+        "access": ACCESS_RC,
+        "fields": (
+            field_flag(VPU_VALID_TRANS, "VPU_VALID_TRANS"),
+            field_flag(VPU_OVP_FAULT_TRANS, "VPU_OVP_FAULT_TRANS"))
+    },
+    CC_HW_FAULT_STATUS_1: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(VPU_OVP_FAULT, "(FAULT) Overvoltage", "(NO_FAULT) No overvoltage"),
+            field_flag(VPU_VALID, "(VALID) CC voltage", "(NO_VALID) CC voltage"),
+            field_flag(VBUS_DISCH_FAULT, "VBUS discharge issue", "No VBUS discharge issue"))
+    },
+    PD_TYPEC_STATUS: {
+        "access": ACCESS_RC,
+        "fields": (
+            field_enum(0xff, 0, {PD_CLEAR: "PD_CLEAR", PD_HARD_RESET_COMPLETE_ACK: "PD_HARD_RESET_COMPLETE_ACK",
+                                 PD_HARD_RESET_RECEIVED_ACK: "PD_HARD_RESET_RECEIVED_ACK",
+                                 PD_HARD_RESET_SEND_ACK: "PD_HARD_RESET_SEND_ACK"}, "reserved"),)
+    },
+    TYPEC_STATUS: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(REVERSE, "CC2 is attached", "CC1 is attached"),
+            field_enum(0x1f, 0, TYPEC_FSM_States))
+    },
+    PRT_STATUS: {
+        "access": ACCESS_RC,
+        "fields": (
+            field_flag(PRL_HW_RST_RECEIVED, "PRL_HW_RST_RECEIVED"),
+            field_flag(PRL_MSG_RECEIVED, "PRL_MSG_RECEIVED"),
+            field_flag(PRL_BIST_RECEIVED, "PRL_BIST_RECEIVED")),
+        "none": "reserved"
+    },
+    PD_COMMAND_CTRL: {
+        "access": ACCESS_RC,
+        "fields": (
+            field_enum(0xff, 0, {0x26: "Send command"}, "Unknown", TO_TEXT),)
+    },
+    MONITORING_CTRL_0: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(VBUS_SNK_DISC_THRESHOLD, "VBUS threshold at 1.9 V", "VBUS threshold at 3.5 V"),
+            field_flag(MONITORING_INT_THRES_BYP, "EXT_COMP", "INT_COMP"),
+            field_flag(EXT_VBUS_HIGH, "HIGH_VBUS_ABOVE", "HIGH_VBUS_VALID"),
+            field_flag(EXT_VBUS_LOW, "LOW_VBUS_BELOW", "LOW_VBUS_VALID"))
+    },
+    MONITORING_CTRL_2: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_value(0xf, 0, "OVP level"),
+            field_value(0xf, 4, "UVP level"))
+    },
+    RESET_CTRL: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(0x01, "Software reset enabled", "Software reset disabled"),)
+    },
+    VBUS_DISCHARGE_TIME_CTRL: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_value(0xf, 0, "DISCHARGE_TIME_TRANSITION:"),
+            field_value(0xf, 4, "DISCHARGE_TIME_TO_0V:"))
+    },
+    VBUS_DISCHARGE_CTRL: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(0x80, "VBUS_DISCHARGE: enabled", "VBUS_DISCHARGE: disabled"),
+            field_flag(0x40, "VSRC_DISCHARGE: enabled", "VSRC_DISCHARGE: disabled"))
+    },
+    VBUS_CTRL: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_flag(0x02, "Force the VBUS EN SNK pin", "Disable VBUS_EN_SNK"),)
+    },
+    PE_FSM: {
+        "access": ACCESS_RO,
+        "fields": (
+            field_enum(0xff, 0, PE_FSM_States, "reserved", TO_DESCRIPTION),)
+    },
+    GPIO_SW_GPIO: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(0x01, "SW_GPIO: enabled", "SW_GPIO: disabled"),)
+    },
+    TX_HEADER_LOW: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_enum(0xff, 0, {0x0d: "Soft Reset"}, "Unknown", TO_TEXT),)
+    },
+    DPM_PDO_NUMB: {
+        "access": ACCESS_RW,
+        "fields": (),
+        "data": 0x07
+    },
+    FTP_CUST_PASSWORD_REG: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_enum(0xff, 0, {int(FTP_CUST_PASSWORD, 16): "set"}, "clear"),)
+    },
+    FTP_CTRL_0: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_flag(1 << FTP_CUST_RST_N, None, "Reset"),
+            field_flag(1 << FTP_CUST_PWR, "FTP_CUST_PWR"),
+            field_flag(1 << FTP_CUST_RST_N, "FTP_CUST_RST_N"),
+            field_flag(1 << FTP_CUST_REQ, "FTP_CUST_REQ"),
+            field_enum(0x7, 0, Dec_control0_sect, "Sector?"))
+    },
+    FTP_CTRL_1: {
+        "access": ACCESS_RW,
+        "fields": (
+            field_enum(0x7, 0, Dec_control1_opcode, "Opcode?"),
+            field_enum(0x1f, 3, Dec_control1_sect, "Sector?"))
+    }
+}
+
+def field_expr(mask, shift):
+    """ source of (data_byte >> shift) & mask """
+    expr = "data_byte" if shift == 0 else "(data_byte >> " + str(shift) + ")"
+
+    if (0xff >> shift) & ~mask == 0:
+        return expr
+
+    return expr + " & " + hex(mask)
+
+def compile_decoder(register, spec):
+    """
+    generate the decoder function of a register from its spec
+
+    The fields are unrolled into straight line code with the texts and name tables as constants, the actions
+    are joined into one add_action.
+    """
+    name = STUSB_Registers[register].strip(": ")
+    consts = {"HEX_LABELS": HEX_LABELS}
+    lines = ["def decode_" + name + "(self, data_byte):",
+             "    self.add_description(" + repr(STUSB_Registers[register]) + ")",
+             "    act = []"]
+
+    for field in spec["fields"]:
+        indent = "    "
+
+        if field[-1]:
+            lines.append(indent + "if data_byte & " + hex(field[-1]) + ":")
+            indent += "    "
+
+        if field[0] == 'flag':
+            kind, mask, on, off, when = field
+
+            if on is not None and off is not None:
+                lines.append(indent + "act.append(" + repr(on) + " if data_byte & " + hex(mask) + " else " + repr(off) + ")")
+            elif on is not None:
+                lines.append(indent + "if data_byte & " + hex(mask) + ": act.append(" + repr(on) + ")")
+            elif off is not None:
+                lines.append(indent + "if not data_byte & " + hex(mask) + ": act.append(" + repr(off) + ")")
+
+        elif field[0] == 'enum':
+            kind, mask, shift, names, default, to, when = field
+            table = "names_" + str(len(consts))
+            consts[table] = names
+            lookup = table + ".get(" + field_expr(mask, shift) + ", " + repr(default) + ")"
+
+            if default is None:
+                lines.append(indent + "text = " + lookup)
+                lines.append(indent + "if text is not None:")
+                indent += "    "
+                lookup = "text"
+
+            if to == TO_DESCRIPTION:
+                lines.append(indent + "self.add_description(" + lookup + ")")
+            elif to == TO_TEXT:
+                lines.append(indent + "self.temp_frame.data['description'] += " + lookup)
+            else:
+                lines.append(indent + "act.append(" + lookup + ")")
+
+        elif field[0] == 'value':
+            kind, mask, shift, label, when = field
+            lines.append(indent + "act.append(" + repr(label) + ")")
+            lines.append(indent + "act.append(str(" + field_expr(mask, shift) + "))")
+
+    if "none" in spec:
+        lines.append("    if not act: act.append(" + repr(spec["none"]) + ")")
+
+    lines.append("    if act: self.add_action(', '.join(act))")
+    lines.append("    self.temp_frame.data['data'] += HEX_LABELS[" + field_expr(spec.get("data", 0xff), 0) + "]")
+
+    exec(compile("\n".join(lines), "<spec " + name + ">", "exec"), consts)
+    decoder = consts["decode_" + name]
+    decoder.__doc__ = name + " (" + spec["access"] + "), generated from REGISTER_SPEC"
+    decoder.source = "\n".join(lines)
+    return decoder
+
+# register : decoder function (self, data_byte), the 32 bit registers are added after Hla
+# The spec decoders are compiled when the register is first decoded, not at import (Logic 2 imports the
+# analyzer each time it is added), see register_decoder.
+REGISTER_DECODERS = {}
+
+def register_decoder(register):
+    """ decoder function of a register, None if there is no decoder """
+    decoder = REGISTER_DECODERS.get(register)
+
+    if decoder is None and register in REGISTER_SPEC:
+        decoder = compile_decoder(register, REGISTER_SPEC[register])
+        REGISTER_DECODERS[register] = decoder
+
+    return decoder
+
+""" Render cache """
+# Rendered transactions are kept on module level, so they survive the new Hla instance that Logic 2 creates
+# after a setting change. The key holds the raw transaction, the reader state at start and the value of the
+# settings that apply to the register. Repeated polls of the same register are rendered only once as well.
+RENDER_CACHE_SIZE = 65536
+_render_cache = {}
+
+IDLE_STATE = (False, None, 0, 0)    # Maybe_reading, request_register_type, snk_count, snk_data
+
+# the registers decoded over 4 data bytes (snk_count / snk_data)
+WIDE_REGISTERS = frozenset((DPM_SNK_PDO1_0, DPM_SNK_PDO2_0, DPM_SNK_PDO3_0, RDO_REG_STATUS_0))
+
+""" Device contexts """
+# Up to 4 STUSB4500 on one bus (address straps 0x28 - 0x2B). Each device has its own decoder context: the
+# reader state (read request pending, PDO/RDO accumulation), the sampler and the state / NVM shadows. The
+# contexts are kept in a list indexed by the 7 bit address. A register pointer write held for its read
+# (combined reads, sampling) is kept for the bus: it is output before a transaction of another device, so
+# the frames stay in time order.
+class DeviceContext:
+    """ decoder state of one device on the bus """
+
+    __slots__ = ("state", "events", "nvm", "renegotiation", "capabilities", "anomalies", "sampler")
+
+    def __init__(self):
+        self.state = IDLE_STATE
+        self.events = None
+        self.nvm = None
+        self.renegotiation = None
+        self.capabilities = None
+        self.anomalies = None
+        self.sampler = None
+
+def transaction_register(payload, state):
+    """ the register a raw transaction is about (None : no register) """
+    # responds on a read request
+    if state[0] == True:
+        return state[1]
+
+    if len(payload) > 0:
+        return HEX_LABELS[payload[0]]
+
+    return None
+
+def transaction_values(payload, state):
+    """ the data bytes of a raw transaction after the register pointer """
+    # responds on a read request
+    if state[0] == True:
+        return payload
+
+    return payload[1:]
+
+def transaction_access(tr):
+    """
+    register, data bytes and read (True) / write (False) of a raw transaction
+
+    Uses the R/W bit of the address when known, else it is assumed as the decoder does.
+    """
+    start, end, address, payload, errors, state, read_pos = tr
+
+    if read_pos is None:
+        return transaction_register(payload, state), transaction_values(payload, state), state[0] == True
+
+    # write
+    if read_pos < 0:
+        if len(payload) == 0:
+            return None, payload, False
+        return HEX_LABELS[payload[0]], payload[1:], False
+
+    # register pointer write and repeated start read
+    if read_pos > 0:
+        return HEX_LABELS[payload[0]], payload[read_pos:], True
+
+    # read from the last register pointer
+    if state[0] == True:
+        return state[1], payload, True
+
+    return None, payload, True
+
 # High level analyzers must subclass the HighLevelAnalyzer class.
 class Hla(HighLevelAnalyzer):
 
+    register_filter = StringSetting(label='Show registers (e.g. 0x29, PE_FSM) empty = all')
+    power_units = ChoicesSetting([UNITS_V_A, UNITS_MV_MA], label='PDO / RDO units')
+    state_display = ChoicesSetting([STATES_EVERY_POLL, STATES_TRANSITIONS], label='PE_FSM / TYPEC_STATUS / CC_STATUS')
+    read_display = ChoicesSetting([READS_SEPARATE, READS_COMBINED], label='Register read')
+    nvm_timing = ChoicesSetting([NVM_TIMING_OFF, NVM_TIMING_ALL, NVM_TIMING_SLOW], label='NVM operation timing')
+    nvm_slow_ms = NumberSetting(label='NVM slow operation (ms, 0 = ' + str(NVM_SLOW_DEFAULT_MS) + ')', min_value=0, max_value=100000)
+    renegotiation_timing = ChoicesSetting([RENEGOTIATION_OFF, RENEGOTIATION_ALL, RENEGOTIATION_FAILED], label='Renegotiation timing')
+    sink_capabilities = ChoicesSetting([SINK_CAPABILITIES_OFF, SINK_CAPABILITIES_ON], label='Sink capabilities')
+    anomalies = ChoicesSetting([ANOMALIES_OFF, ANOMALIES_ON], label='Bus anomalies')
+    anomaly_sigma = NumberSetting(label='Bus anomaly threshold (standard deviations, 0 = ' + str(ANOMALY_SIGMA_DEFAULT) + ')', min_value=0, max_value=100)
+    sampling = ChoicesSetting([SAMPLING_OFF, SAMPLING_ADAPTIVE], label='Sample unchanged register reads')
+    sample_budget_ms = NumberSetting(label='Sampling budget (ms decode per s of capture, 0 = ' + str(SAMPLE_BUDGET_DEFAULT_MS) + ')', min_value=0, max_value=1000)
+    trigger = ChoicesSetting([TRIGGER_NONE, TRIGGER_HARD_RESET, TRIGGER_ERROR_RECOVERY, TRIGGER_VBUS_LOSS, TRIGGER_ANY], label='Trigger on')
+
     # An optional list of types this analyzer produces, providing a way to customize the way frames are displayed in Logic 2.
     result_types = {
             "ping": {
@@ -288,6 +1439,33 @@ class Hla(HighLevelAnalyzer):
             },
             "resp": {
                 'format': '{{data.description}} data[{{data.count}}]: [ {{data.data}} ]'
+            },
+            "combined": {
+                'format': '{{data.description}} {{data.action}} [ {{data.data}} ] ({{data.latency}})'
+            },
+            "nvm": {
+                'format': '{{data.description}} took {{data.duration}}'
+            },
+            "nvm_slow": {
+                'format': 'SLOW {{data.description}} took {{data.duration}}'
+            },
+            "renegotiation": {
+                'format': '{{data.description}}: PE_SNK_READY after {{data.ready}}, contract after {{data.duration}}'
+            },
+            "renegotiation_failed": {
+                'format': 'FAILED {{data.description}} after {{data.duration}}'
+            },
+            "capabilities": {
+                'format': '{{data.description}} (was {{data.previous}})'
+            },
+            "anomaly": {
+                'format': 'ANOMALY {{data.kind}}: {{data.description}}'
+            },
+            "transition": {
+                'format': '{{data.description}} (was {{data.dwell}})'
+            },
+            "trigger": {
+                'format': 'TRIGGER {{data.trigger}}: {{data.description}} (was {{data.dwell}})'
             }
     }
 
@@ -300,888 +1478,830 @@ class Hla(HighLevelAnalyzer):
     snk_count = 0               # needed to decode the PDO/RDO info
     snk_data = 0                # needed to decode the PDO/RDO info
 
+    tr_start = None             # start time of the transaction being collected
+    tr_address = None           # (last) address byte of the transaction
+    tr_payload = None           # data bytes of the transaction
+    tr_errors = ()              # position in tr_payload where an error frame was received
+    tr_read = None              # position in tr_payload where reading starts, -1 : write, None : not known
+    transaction_log = None      # list : keep the raw transactions (offline mode)
+
     def __init__(self):
         '''
         Initialize HLA.
 
         Settings can be accessed using the same name used above.
         '''
-        pass
+        self.render_keys = {}   # register : value of the settings that apply to it
+        self.events = None      # StateEvents, created on the first state / trigger register
+        self.nvm = None         # NvmTimer, created on the first NVM operation
+        self.renegotiation = None   # RenegotiationTracker, created on the first renegotiation register
+        self.capabilities = None    # SinkCapabilities, created on the first sink PDO / DPM_PDO_NUMB access
+        self.anomaly_detector = None    # AnomalyDetector, created on the first transaction when enabled
+        self.pending_read = None    # (tr, rendered) register pointer write waiting for the read (combined reads)
+        self.sampler = None     # PollSampler, created on the first transaction when sampling
+        self.sample_held = None # (tr, rendered) register pointer write waiting for the read (sampling)
+        self.device = None      # address of the device the state above belongs to
+        self.devices = [None] * 128 # DeviceContext of the other devices, by address
+        self.show_registers = self.parse_filter(self.register_filter)
 
     def decode(self, frame: AnalyzerFrame):
         '''
         Process a frame from the input analyzer, and optionally return a single `AnalyzerFrame` or a list of `AnalyzerFrame`s.
 
         The type and data values in `frame` will depend on the input analyzer.
+
+        The frames are collected into a raw transaction (start, end, address, data bytes, error positions,
+        reader state, read position). At stop the transaction is rendered into the output frame.
         '''
-        # set our frame to an error frame, which will eventually get over-written as we get data.
-        if self.temp_frame is None:
-            self.temp_frame = AnalyzerFrame("hi2c", frame.start_time, frame.end_time, {
-                    "address": "error",
-                    "description" :"",
-                    "data" : "",
-                    "action" :"",
-                    "count": 0
-                }
-            )
+        tr = self.collect(frame)
 
-        if frame.type == "error":
-            self.temp_frame.data["description"] = "error"
+        if tr is not None:
+            return self.emit(tr)
 
-        if frame.type == "address":
-            address_byte = frame.data["address"][0]
-            self.temp_frame.data["address"] = hex(address_byte)
+    def collect(self, frame):
+        """ add a frame to the current transaction, returns the raw transaction at stop """
 
-        if frame.type == "data":
-            self.data_byte = frame.data["data"][0]
+        # start a new transaction
+        if self.tr_start is None:
+            self.tr_start = frame.start_time
+            self.tr_address = None
+            self.tr_payload = bytearray()
+            self.tr_errors = ()
+            self.tr_read = None
 
-            # if waiting on responds from an assumed read request
-            if self.Maybe_reading == True:
-                # restore the saved register to (potentially) decode the responds
-                self.register_type = self.request_register_type
+        if frame.type == "error":
+            self.tr_errors += (len(self.tr_payload),)
 
-            # no register known yet
-            if self.register_type == None:
-                self.register_type = hex(self.data_byte)
+        if frame.type == "address":
+            self.tr_address = frame.data["address"][0]
 
-            # select decoder for register (if available)
-            elif self.register_type == FTP_CUST_PASSWORD_REG:
-                self.decode_passwd(self.data_byte)
+            # R/W bit, a read after data is a repeated start (register pointer write followed by read)
+            if frame.data.get("read") == True:
+                if self.tr_read is None or self.tr_read < 0:
+                    self.tr_read = len(self.tr_payload)
 
-            elif self.register_type == FTP_CTRL_0:
-                self.decode_control0(self.data_byte)
+            elif frame.data.get("read") == False and self.tr_read is None:
+                self.tr_read = -1
 
-            elif self.register_type == FTP_CTRL_1:
-                self.decode_control1(self.data_byte)
+        if frame.type == "data":
+            self.tr_payload.append(frame.data["data"][0])
 
-            elif self.register_type == DPM_PDO_NUMB:
-                self.decode_DPM_PDO_NUMB(self.data_byte)
+        if frame.type == "stop":
+            if self.tr_address is not None and self.tr_address != self.device:
+                self.select_device(self.tr_address)
 
-            elif self.register_type == DPM_SNK_PDO1_0:
-                self.decode_snk0(self.data_byte)
+            tr = (self.tr_start, frame.end_time, self.tr_address, bytes(self.tr_payload), self.tr_errors, self.get_state(), self.tr_read)
+            self.tr_start = None
 
-            elif self.register_type == DPM_SNK_PDO2_0:
-                self.decode_snk0(self.data_byte)
+            if self.transaction_log is not None:
+                self.transaction_log.append(tr)
 
-            elif self.register_type == DPM_SNK_PDO3_0:
-                self.decode_snk0(self.data_byte)
+            return tr
 
-            elif self.register_type == PD_COMMAND_CTRL:
-                self.decode_PD_COMMAND_CTRL(self.data_byte)
+        return None
 
-            elif self.register_type == TX_HEADER_LOW:
-                self.decode_TX_HEADER_LOW(self.data_byte)
+    def select_device(self, address):
+        """ make the decoder context of the device at address the current one """
+        if self.device is not None:
+            context = self.devices[self.device]
 
-            elif self.register_type == ALERT_STATUS_1_MASK:
-                self.decode_alert_mask(self.data_byte)
+            if context is None:
+                context = self.devices[self.device] = DeviceContext()
 
-            elif self.register_type == ALERT_STATUS_1:
-                self.decode_ALERT_STATUS_1(self.data_byte)
+            context.state = self.get_state()
+            context.events = self.events
+            context.nvm = self.nvm
+            context.renegotiation = self.renegotiation
+            context.capabilities = self.capabilities
+            context.anomalies = self.anomaly_detector
+            context.sampler = self.sampler
 
-            elif self.register_type == TYPEC_MONITORING_STATUS_0:
-                self.decode_TYPEC_MONITORING_STATUS_0(self.data_byte)
+            context = self.devices[address & 0x7f]
 
-            elif self.register_type == TYPEC_MONITORING_STATUS_1:
-                self.decode_TYPEC_MONITORING_STATUS_1(self.data_byte)
+            if context is None:
+                context = self.devices[address & 0x7f] = DeviceContext()
 
-            elif self.register_type == CC_HW_FAULT_STATUS_0:
-                self.decode_CC_HW_FAULT_STATUS_0(self.data_byte)
+            self.set_state(context.state)
+            self.events = context.events
+            self.nvm = context.nvm
+            self.renegotiation = context.renegotiation
+            self.capabilities = context.capabilities
+            self.anomaly_detector = context.anomalies
+            self.sampler = context.sampler
 
-            elif self.register_type == CC_HW_FAULT_STATUS_1:
-                self.decode_CC_HW_FAULT_STATUS_1(self.data_byte)
+        # the first device takes the current state
+        self.device = address & 0x7f
 
-            elif self.register_type == CC_STATUS:
-                self.decode_CC_STATUS(self.data_byte)
+    def device_contexts(self):
+        """ address : DeviceContext of all devices seen """
+        if self.device is not None:
+            self.select_device(self.device)
 
-            elif self.register_type == PD_TYPEC_STATUS:
-                self.decode_PD_TYPEC_STATUS(self.data_byte)
+        return {address: context for address, context in enumerate(self.devices) if context is not None}
 
-            elif self.register_type == PRT_STATUS:
-                self.decode_PRT_STATUS(self.data_byte)
+    def get_state(self):
+        """ reader state that is carried from one transaction to the next """
+        if self.Maybe_reading == False and self.snk_count == 0:
+            return IDLE_STATE
 
-            elif self.register_type == MONITORING_CTRL_0:
-                self.decode_MONITORING_CTRL_0(self.data_byte)
+        if self.Maybe_reading == False:
+            return (False, None, self.snk_count, self.snk_data)
 
-            elif self.register_type == MONITORING_CTRL_2:
-                self.decode_MONITORING_CTRL_2(self.data_byte)
+        return (True, self.request_register_type, self.snk_count, self.snk_data)
 
-            elif self.register_type == RESET_CTRL:
-                self.decode_RESET_CTRL(self.data_byte)
+    def set_state(self, state):
+        """ restore the reader state """
+        self.Maybe_reading, self.request_register_type, self.snk_count, self.snk_data = state
 
-            elif self.register_type == VBUS_DISCHARGE_TIME_CTRL:
-                self.decode_VBUS_DISCHARGE_TIME_CTRL(self.data_byte)
+    def render(self, tr):
+        """
+        Render a raw transaction, or take the result from the render cache.
 
-            elif self.register_type == VBUS_DISCHARGE_CTRL:
-                self.decode_VBUS_DISCHARGE_CTRL(self.data_byte)
+        returns (frame type, frame data, reader state after, register)
+        """
+        start, end, address, payload, errors, state, read_pos = tr
+        register = transaction_register(payload, state)
 
-            elif self.register_type == GPIO_SW_GPIO:
-                self.decode_GPIO_SW_GPIO(self.data_byte)
+        if address is not None and address != self.device:
+            self.select_device(address)
 
-            elif self.register_type == PORT_STATUS_1:
-                self.decode_PORT_STATUS_1(self.data_byte)
+        key = (address, payload, errors, state, self.settings_key(register))
 
-            elif self.register_type == TYPEC_STATUS:
-                self.decode_TYPEC_STATUS(self.data_byte)
+        rendered = _render_cache.get(key)
 
-            elif self.register_type == VBUS_CTRL:
-                self.decode_VBUS_CTRL(self.data_byte)
+        if rendered is None:
+            rendered = self.render_transaction(address, payload, errors, state) + (register,)
 
-            elif self.register_type == PE_FSM:
-                self.decode_PE_FSM(self.data_byte)
+            if len(_render_cache) >= RENDER_CACHE_SIZE:
+                _render_cache.clear()
 
-            elif self.register_type == RDO_REG_STATUS_0:
-                self.decode_RDO_REG_STATUS_0(self.data_byte)
+            _render_cache[key] = rendered
 
+        self.set_state(rendered[2])
 
-            # oh oh no decoder available for this register
-            # either not created (yet) or not enough information to create decoder
-            # for now supplying the raw data
-            else:
-                self.add_databyte()
+        return rendered
 
-        if frame.type == "stop":
-            self.temp_frame.end_time = frame.end_time
+    def render_transaction(self, address, payload, errors, state):
+        """ run the register decoders on a transaction, returns frame type, frame data and reader state after """
+        self.set_state(state)
 
-            # if we had a read request before (single register) assume this is a responds on the read request
-            if self.Maybe_reading == True:
-                desc = self.temp_frame.data["description"]
-                self.temp_frame.data["description"] = ""
-                self.add_description("Responds:")
-                self.add_description(desc)
-                self.Maybe_reading = False
+        # set our frame to an error frame, which will eventually get over-written as we get data.
+        self.temp_frame = AnalyzerFrame("hi2c", None, None, {
+                "address": "error",
+                "description" :"",
+                "data" : "",
+                "action" :"",
+                "count": 0
+            }
+        )
 
-                new_frame = self.temp_frame
+        if address is not None:
+            self.temp_frame.data["address"] = ADDRESS_LABELS[address]
 
-            # No data received in this frame
-            elif self.data_unknown == True:
+        for pos in range(len(payload)):
 
-                # if only the address was received. assume a 'I2C-ping' to test the device is there
-                if self.register_type == None:
+            if pos in errors:
+                self.temp_frame.data["description"] = "error"
 
-                    new_frame = AnalyzerFrame("ping", self.temp_frame.start_time, frame.end_time, {
-                    "address": self.temp_frame.data["address"],
-                        }
-                    )
-
-                # if only ONE byte assume this is a register read request
-                else:
-                    self.add_description("Obtain ")
-                    self.add_register(self.register_type)
-                    self.request_register_type = self.register_type
-                    self.Maybe_reading = True
-
-                    new_frame = AnalyzerFrame("read", self.temp_frame.start_time, frame.end_time, {
-                        "address": self.temp_frame.data["address"],
-                        "description" : self.temp_frame.data["description"]
-                        }
-                )
-            # this is a "normal" write to a register
-            else:
-                new_frame = self.temp_frame
-                self.Maybe_reading = False
+            self.data_byte = payload[pos]
+            self.decode_data()
 
-            # reset different variables
-            self.data_unknown = True
-            self.temp_frame = None
-            self.register_type = None
+        if len(payload) in errors:
+            self.temp_frame.data["description"] = "error"
 
-            return new_frame
+        # if we had a read request before (single register) assume this is a responds on the read request
+        if self.Maybe_reading == True:
+            desc = self.temp_frame.data["description"]
+            self.temp_frame.data["description"] = ""
+            self.add_description("Responds:")
+            self.add_description(desc)
+            self.Maybe_reading = False
 
-    def add_databyte(self):
-        """ Just add data byte """
-        self.temp_frame.data["count"] += 1
-        if len(self.temp_frame.data["data"]) > 0:
-            self.temp_frame.data["data"] += ", "
-        self.temp_frame.data["data"] += hex(self.data_byte)
-        self.temp_frame.data["description"] += "data only"
+            frame_type = self.temp_frame.type
+            frame_data = self.temp_frame.data
 
-    def add_action(self,act):
-        """ add comma separated action """
-        if len(self.temp_frame.data["action"]) > 0:
-            self.temp_frame.data["action"] += ", "
-        self.temp_frame.data["action"] += act
+        # No data received in this frame
+        elif self.data_unknown == True:
 
-    def add_description(self,act):
-        """ add comma separated description """
-        if len(self.temp_frame.data["description"]) > 0:
-            self.temp_frame.data["description"] += ", "
-        self.temp_frame.data["description"] += act
-        self.data_unknown = False
+            # if only the address was received. assume a 'I2C-ping' to test the device is there
+            if self.register_type == None:
 
-    def add_register(self,act):
-        """ Add a register to description """
-        if act in STUSB_Registers:
-            reg = STUSB_Registers[act]
-            self.add_description(reg)
-        else:
-            self.add_description("unknown")
+                frame_type = "ping"
+                frame_data = {
+                    "address": self.temp_frame.data["address"],
+                }
 
-    def decode_RDO_REG_STATUS_0(self,data_byte):
-        """ requested data object '''
-        RDO_MaxCurrent        = 0       #  // 10 Bits 9..0
-        RDO_OperatingCurrent  = 10      #  // 10 bits 19..10;
-        RDO_reserved_22_20    = 20      #
-        RDO_UnchunkedMess_sup = 23
-        RDO_UsbSuspend        = 24
-        RDO_UsbComCap         = 25
-        RDO_CapaMismatch      = 26
-        RDO_GiveBack          = 27
-        RDO_Object_Pos        = 28      # Bits 30..28 (3-bit)
-        RDO_reserved_31       = 31      # Bits 31
-        """
-        # get 4 data byte (MSB first)
-        if self.snk_count < 4:
-            tmp = data_byte
-            tmp = (tmp << (8 * self.snk_count))
-            self.snk_data = self.snk_data + tmp
-            self.snk_count += 1
+            # if only ONE byte assume this is a register read request
+            else:
+                self.add_description("Obtain ")
+                self.add_register(self.register_type)
+                self.request_register_type = self.register_type
+                self.Maybe_reading = True
 
-        if self.snk_count == 4:
+                frame_type = "read"
+                frame_data = {
+                    "address": self.temp_frame.data["address"],
+                    "description" : self.temp_frame.data["description"]
+                }
 
-            self.add_register(self.register_type)
+        # this is a "normal" write to a register
+        else:
+            frame_type = self.temp_frame.type
+            frame_data = self.temp_frame.data
+            self.Maybe_reading = False
 
-            # bottom 10 bits is current
-            current = (self.snk_data & 0x3ff) * 0.01
+        # a 32 bit register is read or written in one transaction, a partial one is not carried into the next
+        self.snk_count = 0
+        self.snk_data = 0
 
-            # top 10 bits voltage
-            voltage = ((self.snk_data >> RDO_OperatingCurrent) & 0x3ff) / 20
+        # reset different variables
+        self.data_unknown = True
+        self.temp_frame = None
+        self.register_type = None
 
-            self.temp_frame.data["description"] += "voltage: "
-            self.temp_frame.data["description"] += str(voltage)
-            self.temp_frame.data["description"] += ", current: "
-            self.temp_frame.data["description"] += str(current)
-            self.temp_frame.data["count"] += 4
-            self.temp_frame.data["data"] += hex(self.snk_data)
+        return (frame_type, shared_data(frame_data), self.get_state())
 
-            # 3 bits
-            self.add_action(" Object_Pos: ")
-            val = (self.snk_data >> RDO_Object_Pos) & 0x07
-            self.temp_frame.data["action"] += str(val)
-            #self.temp_frame.data["data"] += hex(val)
+    def make_frame(self, tr, rendered):
+        """ create the output frame for a rendered transaction, the data is shared (see Label pool) """
+        if SHARED_FRAME_DATA:
+            return AnalyzerFrame(rendered[0], tr[0], tr[1], rendered[1])
 
-            self.add_action("UnchunkedMess_sup: ")
-            val = (self.snk_data >> RDO_UnchunkedMess_sup) & 0x01
-            self.temp_frame.data["action"] +=(str(val))
+        return AnalyzerFrame(rendered[0], tr[0], tr[1], dict(rendered[1]))
 
-            self.add_action("UsbSuspend: ")
-            val = (self.snk_data >> RDO_UsbSuspend) & 0x01
-            self.temp_frame.data["action"] +=(str(val))
+    def is_shown(self, register):
+        """ apply the register filter """
+        return self.show_registers is None or register in self.show_registers
 
-            self.add_action("UsbComCap: ")
-            val = (self.snk_data >> RDO_UsbComCap) & 0x01
-            self.temp_frame.data["action"] +=(str(val))
+    def emit(self, tr, rendered=None):
+        """
+        Output for a transaction: sampling, register filter, state transitions and triggers
 
-            self.add_action("CapaMismatch: ")
-            val = (self.snk_data >> RDO_CapaMismatch) & 0x01
-            self.temp_frame.data["action"] +=(str(val))
+        rendered : the rendered transaction, None renders it here (when sampling, only when it is decoded)
 
-            self.add_action("GiveBack: ")
-            val = (self.snk_data >> RDO_GiveBack) & 0x01
-            self.temp_frame.data["action"] +=(str(val))
+        returns None, a frame or a list of frames
+        """
+        # pointer write held for the read of another device
+        if self.pending_read is not None or self.sample_held is not None:
+            held = self.pending_read or self.sample_held
 
-            self.snk_count = 0
-            self.snk_data = 0
+            if held[0][2] != tr[2]:
+                return frame_output(self.flush_held() + frame_list(self.emit(tr, rendered)))
 
-    def decode_control0(self, data_byte):
-        """ decode control 0 register: NVM """
-        self.add_register(self.register_type)
+        if self.sampling != SAMPLING_OFF:
+            out = self.sample(tr, rendered)
+        else:
+            out = self.emit_reads(tr, rendered if rendered is not None else self.render(tr))
 
-        if not data_byte & 0x40:
-            self.add_action("Reset")
+        if self.anomalies == ANOMALIES_OFF:
+            return out
 
-        if (data_byte >> FTP_CUST_PWR) & 0x01:
-            self.add_action("FTP_CUST_PWR")
+        frames = self.anomaly_events(tr)
 
-        if (data_byte >> FTP_CUST_RST_N) & 0x01:
-            self.add_action("FTP_CUST_RST_N")
+        if len(frames) == 0:
+            return out
 
-        if (data_byte >> FTP_CUST_REQ) & 0x01:
-            self.add_action("FTP_CUST_REQ")
+        return frame_list(out) + frames if out is not None else (frames[0] if len(frames) == 1 else frames)
 
-        sector = data_byte & 0x7
+    def flush_held(self):
+        """ the register pointer writes held for a read as plain frames, with the context of their device """
+        held = self.sample_held or self.pending_read
+        address = held[0][2]
+        device = self.device
 
-        if sector in Dec_control0_sect:
-            sec = Dec_control0_sect[sector]
-            self.add_action(sec)
-        else:
-            self.add_action("Sector?")
+        if address is not None and device is not None and address != device:
+            self.select_device(address)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        frames = []
 
-    def decode_control1(self, data_byte):
-        """ decode control 1 register: NVM """
-        self.add_register(self.register_type)
+        if self.sample_held is not None:
+            tr, rendered = self.sample_held
+            self.sample_held = None
+            frames += frame_list(self.emit_reads(tr, rendered))
 
-        opcode = data_byte & 0x7
+        if self.pending_read is not None:
+            tr, rendered = self.pending_read
+            self.pending_read = None
+            frames += frame_list(self.emit_frames(tr, rendered))
 
-        if opcode in Dec_control1_opcode:
-            act = Dec_control1_opcode[opcode]
-            self.add_action(act)
-        else:
-            self.add_action("Opcode?")
+        if address is not None and device is not None and address != device:
+            self.select_device(device)
 
-        sector = (data_byte >> 3) & 0x1f
+        return frames
 
-        if sector in Dec_control1_sect:
-            sec = Dec_control1_sect[sector]
-            self.add_action(sec)
-        else:
-            self.add_action("Sector?")
+    def anomaly_events(self, tr):
+        """ anomaly frames of a transaction, every transaction is checked (also the sampled and filtered) """
+        start, end, address, payload, errors, state, read_pos = tr
+        register, values, is_read = transaction_access(tr)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if self.anomaly_detector is None:
+            sigma = self.anomaly_sigma if self.anomaly_sigma else ANOMALY_SIGMA_DEFAULT
+            self.anomaly_detector = AnomalyDetector(sigma)
 
-    def decode_DPM_PDO_NUMB (self, data_byte):
-        """ current PDO """
-        self.add_register(self.register_type)
-        self.temp_frame.data["data"] += hex(data_byte & 0x07)
+        return [AnalyzerFrame("anomaly", start, end, {
+            "address": address_label(address),
+            "kind": kind,
+            "description": description
+        }) for kind, description in self.anomaly_detector.update(register, is_read, start, end, errors, len(payload))]
 
-    def decode_PE_FSM (self, data_byte):
+    def sample(self, tr, rendered=None):
         """
-        read only
-        #PE_FSM_STATE: Policy engine layer FSM state
-        PE_INIT                         = 0x0
-        PE_SOFT_RESET                   = 0x1
-        PE_HARD_RESET                   = 0x2
-        PE_SEND_SOFT_RESET              = 0x3
-        PE_C_BIST                       = 0x4
-        PE_SNK_STARTUP                  = 0x12
-        PE_SNK_DISCOVERY                = 0x13
-        PE_SNK_WAIT_FOR_CAPABILITIES    = 0x14
-        PE_SNK_EVALUATE_CAPABILITIES    = 0x15
-        PE_SNK_SELECT_CAPABILITIES      = 0x16
-        PE_SNK_TRANSITION_SINK          = 0x17
-        PE_SNK_READY                    = 0x18
-        PE_SNK_READY_SENDING            = 0x19
-        PE_HARD_RESET_SHUTDOWN          = 0x1a
-        PE_HARD_RESET_RECOVERY          = 0x1b
-        PE_ERRORRECOVERY                = 0x40
+        count the transaction and decide on the raw bytes whether it is decoded, the output of the sampled
+        transactions. The time to render and emit is charged to the budget.
         """
-        self.add_register(self.register_type)
-
-        if data_byte == PE_INIT:
-            self.add_description("PE_INIT")
-        elif data_byte == PE_SOFT_RESET:
-            self.add_description("PE_SOFT_RESET")
-        elif data_byte == PE_HARD_RESET:
-            self.add_description("PE_HARD_RESET")
-        elif data_byte == PE_SEND_SOFT_RESET:
-            self.add_description("PE_SEND_SOFT_RESET")
-        elif data_byte == PE_C_BIST:
-            self.add_description("PE_C_BIST")
-        elif data_byte == PE_SNK_STARTUP:
-            self.add_description("PE_SNK_STARTUP")
-        elif data_byte == PE_SNK_DISCOVERY:
-            self.add_description("PE_SNK_DISCOVERY")
-        elif data_byte == PE_SNK_WAIT_FOR_CAPABILITIES:
-            self.add_description("PE_SNK_WAIT_FOR_CAPABILITIES")
-        elif data_byte == PE_SNK_EVALUATE_CAPABILITIES:
-            self.add_description("PE_SNK_EVALUATE_CAPABILITIES")
-        elif data_byte == PE_SNK_SELECT_CAPABILITIES:
-            self.add_description("PE_SNK_SELECT_CAPABILITIES")
-        elif data_byte == PE_SNK_TRANSITION_SINK:
-            self.add_description("PE_SNK_TRANSITION_SINK")
-        elif data_byte == PE_SNK_READY:
-            self.add_description("PE_SNK_READY")
-        elif data_byte == PE_SNK_READY_SENDING:
-            self.add_description("PE_SNK_READY_SENDING")
-        elif data_byte == PE_HARD_RESET_SHUTDOWN:
-            self.add_description("PE_HARD_RESET_SHUTDOWN")
-        elif data_byte == PE_ERRORRECOVERY:
-            self.add_description("PE_ERRORRECOVERY")
-        else:
-            self.add_description("reserved")
+        if self.sampler is None:
+            budget = self.sample_budget_ms if self.sample_budget_ms else SAMPLE_BUDGET_DEFAULT_MS
+            self.sampler = PollSampler(budget / 1000)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        begin = time.perf_counter()
+        register = transaction_register(tr[3], tr[5])
+        self.sampler.count(register)
+        out = self.sample_frames(tr, rendered, register)
+        self.sampler.account(tr[0], time.perf_counter() - begin)
+        return out
 
-    def decode_PD_COMMAND_CTRL(self, data_byte):
+    def sample_frames(self, tr, rendered, register):
+        """ hold back the unchanged register reads that are not sampled, they are not rendered """
+        access, values, is_read = transaction_access(tr)
 
-        self.add_register(self.register_type)
+        # unchanged read that is skipped : only the trackers see it (e.g. the RDO read that ends a renegotiation)
+        if is_read and len(values) > 0 and not self.sampler.take(access, values):
+            self.sample_held = None
 
-        if data_byte == 0x26:
-            self.temp_frame.data["description"] += "Send command"
-        else:
-            self.temp_frame.data["description"] += "Unknown"
+            if rendered is None and not self.skip_render(tr):
+                self.render(tr)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            if self.tracked(tr, register):
+                return frame_output(self.event_frames(tr, register))
 
-    def decode_TX_HEADER_LOW(self, data_byte):
+            return None
 
-        self.add_register(self.register_type)
+        if rendered is None:
+            rendered = self.render(tr)
 
-        if data_byte == 0x0D:
-            self.temp_frame.data["description"] += "Soft Reset"
-        else:
-            self.temp_frame.data["description"] += "Unknown"
-
-        self.temp_frame.data["data"] += hex(data_byte)
+        held = self.sample_held
+        self.sample_held = None
 
-    def decode_CC_HW_FAULT_STATUS_0(self, data_byte):
-        """
-        VPU_VALID_TRANS     = 0x10
-        VPU_OVP_FAULT_TRANS = 0x20
-        """
-        self.add_register(self.register_type)
+        # register pointer write, the read tells whether this poll is shown
+        if rendered[0] == "read":
+            self.sample_held = (tr, rendered)
+            return self.emit_reads(*held) if held is not None else None
 
-        if (data_byte & VPU_VALID_TRANS):
-            self.add_action("VPU_VALID_TRANS")
+        frames = frame_list(self.emit_reads(*held)) if held is not None else []
+        out = frame_list(self.emit_reads(tr, rendered))
 
-        if (data_byte & VPU_OVP_FAULT_TRANS):
-            self.add_action("VPU_OVP_FAULT_TRANS")
+        if is_read and len(values) > 0:
+            for frame in out:
+                if frame.end_time == tr[1] and frame.type in ("resp", "hi2c", "combined"):
+                    own_data(frame)
+                    frame.data["transactions"] = self.sampler.counts[register]
+                    frame.data["skipped"] = self.sampler.skipped.pop(access, 0)
+                    frame.data["sampled"] = label("1/" + str(self.sampler.n))
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        return frame_output(frames + out)
 
-    def decode_CC_HW_FAULT_STATUS_1(self,data_byte):
+    def skip_render(self, tr):
         """
-        read only
+        set the reader state after a plain register read without rendering it
 
-        VPU_OVP_FAULT               = 0x80  # 0: (NO_FAULT) No overvoltage condition 1: (FAULT) Overvoltage condition has occurred on CC
-        VPU_VALID                   = 0x40  # 0: (NO_VALID) CC pins pull-up voltage is below 1: (VALID) CC pins pull-up voltage is above UVLO threshold of 2.8 V
-        VBUS_DISCH_FAULT            = 0x10  # 0: (NO_FAULT) No VBUS discharge issue  1: (FAULT) VBUS discharge issue has occurred
+        returns False when the state after the read is not known without rendering
         """
+        start, end, address, payload, errors, state, read_pos = tr
 
-        self.add_register(self.register_type)
+        # a read on a register pointer write, from the start of the register
+        if state[0] != True or state[2] != 0 or (read_pos is not None and read_pos != 0):
+            return False
 
-        if (data_byte & VPU_OVP_FAULT):
-            self.add_action("(FAULT) Overvoltage")
-        else:
-            self.add_action("(NO_FAULT) No overvoltage")
+        # the 32 bit registers are read in 4 bytes
+        if state[1] in WIDE_REGISTERS and len(payload) % 4 != 0:
+            return False
 
-        if (data_byte & VPU_VALID):
-            self.add_action("(VALID) CC voltage")
-        else:
-            self.add_action("(NO_VALID) CC voltage")
+        if address is not None and address != self.device:
+            self.select_device(address)
 
-        if (data_byte & VBUS_DISCH_FAULT):
-            self.add_action("VBUS discharge issue")
-        else:
-            self.add_action("No VBUS discharge issue")
+        self.set_state(IDLE_STATE)
+        return True
 
-        self.temp_frame.data["data"] += hex(data_byte)
+    def emit_reads(self, tr, rendered):
+        """ output of a transaction, register pointer write and read combined when selected """
+        if self.read_display == READS_COMBINED:
 
-    def decode_MONITORING_CTRL_2(self, data_byte):
+            # register pointer write, wait for the read
+            if rendered[0] == "read":
+                self.pending_read = (tr, rendered)
+                return None
 
-        self.add_register(self.register_type)
+            # read after a register pointer write, or with repeated start
+            if self.pending_read is not None or (tr[6] is not None and tr[6] > 0):
+                return self.combine_read(tr, rendered)
 
-        lev = data_byte & 0xf
-        self.add_action("OVP level")
-        self.add_action(str(lev))
+        return self.emit_frames(tr, rendered)
 
-        lev = (data_byte >> 4) & 0xf
-        self.add_action("UVP level")
-        self.add_action(str(lev))
+    def combine_read(self, tr, rendered):
+        """ one frame for a register read: pointer write + read, or repeated start sequence """
+        pointer = self.pending_read
+        self.pending_read = None
 
-        self.temp_frame.data["data"] += hex(data_byte)
-
-    def decode_VBUS_DISCHARGE_TIME_CTRL(self, data_byte):
-
-        self.add_register(self.register_type)
-
-        lev = data_byte & 0xf
-        self.temp_frame.data["action"] += "DISCHARGE_TIME_TRANSITION:"
-        #self.add_action("DISCHARGE_TIME_TRANSITION:")
-        self.add_action(str(lev))
+        if pointer is None:
+            start = tr[0]
+        else:
+            start = pointer[0][0]
 
-        lev = (data_byte >> 4) & 0xf
-        self.temp_frame.data["action"] += ", DISCHARGE_TIME_TO_0V:"
-        #self.add_action("DISCHARGE_TIME_TO_0V:")
-        self.add_action(str(lev))
+        out = self.emit_frames(tr, rendered)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if isinstance(out, list):
+            frames = out
+        elif out is not None:
+            frames = [out]
+        else:
+            return None
 
-    def decode_passwd(self, data_byte):
+        for frame in frames:
+            if frame.type == rendered[0] and frame.start_time == tr[0]:
+                desc = frame.data["description"]
 
-        self.add_register(self.register_type)
+                if desc.startswith("Responds:"):
+                    desc = desc[len("Responds:"):].lstrip(", ")
 
-        if hex(self.data_byte) == FTP_CUST_PASSWORD:
-            self.add_action("set")
-        else:
-            self.add_action("clear")
+                # responds of registers without decoder do not hold the register name
+                name = STUSB_Registers.get(rendered[3], "unknown: ")
+                if name not in desc:
+                    desc = name + desc
 
-        self.temp_frame.data["data"] += hex(data_byte)
+                own_data(frame)
+                frame.type = "combined"
+                frame.start_time = start
+                frame.data["description"] = label("Read, " + desc)
+                frame.data["latency"] = label(format_time(float(tr[1] - start)))
+                break
 
-    def decode_RESET_CTRL(self, data_byte):
+        return out
 
-        self.add_register(self.register_type)
+    def emit_frames(self, tr, rendered):
+        """ output frames for a rendered transaction """
+        register = rendered[3]
 
-        if data_byte & 0x01:
-            self.add_action("Software reset enabled")
-        else:
-            self.add_action("Software reset disabled")
+        if not self.tracked(tr, register):
+            if self.is_shown(register):
+                return self.make_frame(tr, rendered)
+            return None
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        frames = self.event_frames(tr, register)
 
-    def decode_VBUS_CTRL(self, data_byte):
+        if self.state_display != STATES_TRANSITIONS or register not in STATE_REGISTERS:
+            if self.is_shown(register):
+                frames.insert(0, self.make_frame(tr, rendered))
 
-        self.add_register(self.register_type)
+        elif not self.is_shown(register):
+            frames = [f for f in frames if f.type in ("trigger", "renegotiation", "renegotiation_failed", "capabilities")]
 
-        if data_byte & 0x02:
-            self.add_action("Force the VBUS EN SNK pin")
-        else:
-            self.add_action("Disable VBUS_EN_SNK")
+        if len(frames) == 0:
+            return None
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if len(frames) == 1:
+            return frames[0]
 
+        return frames
 
-    def decode_VBUS_DISCHARGE_CTRL (self, data_byte):
+    def tracked(self, tr, register):
+        """ True when a tracker (state / trigger, NVM, renegotiation, sink capabilities) follows the transaction """
+        return (register in EVENT_REGISTERS or
+                (self.nvm_timing != NVM_TIMING_OFF and transaction_access(tr)[0] in NVM_REGISTERS) or
+                (self.renegotiation_timing != RENEGOTIATION_OFF and register in RENEGOTIATION_REGISTERS) or
+                (self.sink_capabilities != SINK_CAPABILITIES_OFF and register in SINK_CAPABILITY_REGISTERS))
 
-        self.add_register(self.register_type)
+    def event_frames(self, tr, register):
+        """ update the trackers with a transaction, returns their frames (not the frame of the transaction) """
+        if register in EVENT_REGISTERS:
+            frames = self.state_events(tr, register)
 
-        if data_byte & 0x80:
-            self.add_action("VBUS_DISCHARGE: enabled")
-        else:
-            self.add_action("VBUS_DISCHARGE: disabled")
+        elif self.nvm_timing != NVM_TIMING_OFF and transaction_access(tr)[0] in NVM_REGISTERS:
+            frames = self.nvm_events(tr)
 
-        if data_byte & 0x40:
-            self.add_action("VSRC_DISCHARGE: enabled")
         else:
-            self.add_action("VSRC_DISCHARGE: disabled")
+            frames = []
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if self.renegotiation_timing != RENEGOTIATION_OFF and register in RENEGOTIATION_REGISTERS:
+            frames += self.renegotiation_events(tr)
 
+        if self.sink_capabilities != SINK_CAPABILITIES_OFF and register in SINK_CAPABILITY_REGISTERS:
+            frames += self.capability_events(tr)
 
-    def decode_GPIO_SW_GPIO(self, data_byte):
+        return frames
 
-        self.add_register(self.register_type)
+    def nvm_events(self, tr):
+        """ time the NVM operations, frame when an operation is done """
+        start, end, address, payload, errors, state, read_pos = tr
+        register, values, is_read = transaction_access(tr)
 
-        if data_byte & 0x01:
-            self.add_action("SW_GPIO: enabled")
-        else:
-            self.add_action("SW_GPIO: disabled")
+        if len(values) == 0:
+            return []
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if self.nvm is None:
+            self.nvm = NvmTimer()
 
+        done = self.nvm.update(register, is_read, values, start, end)
 
-    def decode_MONITORING_CTRL_0(self, data_byte):
-        """
-        VBUS_SNK_DISC_THRESHOLD  = 0x8
-        MONITORING_INT_THRES_BYP = 0x4
-        EXT_VBUS_HIGH = 0x2
-        EXT_VBUS_LOW  = 0x1
+        if done is None:
+            return []
 
-        """
-        self.add_register(self.register_type)
-
-        if data_byte & VBUS_SNK_DISC_THRESHOLD:
-            self.add_action("VBUS threshold at 1.9 V")
-        else:
-            self.add_action("VBUS threshold at 3.5 V")
+        name, sector, duration = done
 
-        if data_byte & MONITORING_INT_THRES_BYP:
-            self.add_action("EXT_COMP")
+        if self.nvm_slow_ms is not None and self.nvm_slow_ms > 0:
+            slow = duration * 1000 > self.nvm_slow_ms
         else:
-            self.add_action("INT_COMP")
+            slow = duration * 1000 > NVM_SLOW_DEFAULT_MS
 
-        if data_byte & EXT_VBUS_HIGH:
-            self.add_action("HIGH_VBUS_ABOVE")
-        else:
-            self.add_action("HIGH_VBUS_VALID")
+        if not slow and self.nvm_timing == NVM_TIMING_SLOW:
+            return []
 
-        if data_byte & EXT_VBUS_LOW:
-            self.add_action("LOW_VBUS_BELOW")
-        else:
-            self.add_action("LOW_VBUS_VALID)")
+        return [AnalyzerFrame("nvm_slow" if slow else "nvm", start, end, {
+            "address": address_label(address),
+            "description": "NVM " + name + " " + sector,
+            "duration": format_time(duration)
+        })]
 
+    def renegotiation_events(self, tr):
+        """ frame when a renegotiation attempt is done """
+        start, end, address, payload, errors, state, read_pos = tr
+        register, values, is_read = transaction_access(tr)
 
+        if len(values) == 0:
+            return []
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        if self.renegotiation is None:
+            self.renegotiation = RenegotiationTracker()
 
-    def decode_TYPEC_STATUS(self, data_byte):
-        """
-        read only
-
-        REVERSE                 = 0x80  # 0: (STRAIGHT_CC1) CC1 is attached, 1: (TWISTED_CC2) CC2 is attached
-        #TYPEC_FSM_STATE: Indicates Type-C FSM state & 0x1f
-        UNATTACHED_SNK          = 0x0
-        ATTACHWAIT_SNK          = 0x1
-        ATTACHED_SNK            = 0x2
-        DEBUGACCESSORY_SNK      = 0x3
-        TRY_SRC                 = 0xc0
-        UNATTACHED_ACCESSORY    = 0xd0
-        ATTACHWAIT_ACCESSORY    = 0xe0
-        TYPEC_ERRORRECOVERY     = 0x13
-        """
-        self.add_register(self.register_type)
+        done = self.renegotiation.update(register, is_read, values, start, end)
 
-        if data_byte & REVERSE:
-            self.add_action("CC2 is attached")
-        else:
-            self.add_action("CC1 is attached")
+        if done is None:
+            return []
 
-        state = data_byte & 0x1f
+        reason, ready, duration, rdo = done
 
-        if state == UNATTACHED_SNK:
-            self.add_action("UNATTACHED_SNK")
+        if reason is None and self.renegotiation_timing == RENEGOTIATION_FAILED:
+            return []
 
-        elif state == ATTACHWAIT_SNK:
-            self.add_action("ATTACHWAIT_SNK")
+        if reason is None:
+            description = "Renegotiation, RDO object position " + str((rdo >> RDO_Object_Pos) & 0x07)
+        else:
+            description = "Renegotiation: " + reason
 
-        elif state == ATTACHED_SNK:
-            self.add_action("ATTACHED_SNK")
+        return [AnalyzerFrame("renegotiation" if reason is None else "renegotiation_failed", start, end, {
+            "address": address_label(address),
+            "description": description,
+            "ready": format_time(ready),
+            "duration": format_time(duration)
+        })]
 
-        elif state == DEBUGACCESSORY_SNK:
-            self.add_action("DEBUGACCESSORY_SNK")
+    def capability_events(self, tr):
+        """ frame when the effective sink capability set changes """
+        start, end, address, payload, errors, state, read_pos = tr
+        register, values, is_read = transaction_access(tr)
 
-        elif state == TRY_SRC:
-            self.add_action("TRY_SRC")
+        if len(values) == 0 or register not in SINK_CAPABILITY_REGISTERS:
+            return []
 
-        elif state == UNATTACHED_ACCESSORY:
-            self.add_action("UNATTACHED_ACCESSORY")
+        if self.capabilities is None:
+            self.capabilities = SinkCapabilities()
 
-        elif state == ATTACHWAIT_ACCESSORY:
-            self.add_action("ATTACHWAIT_ACCESSORY")
+        writes = self.capabilities.writes
+        change = self.capabilities.update(register, values)
 
-        elif state == TYPEC_ERRORRECOVERY:
-            self.add_action("TYPEC_ERRORRECOVERY")
+        if change is None:
+            return []
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        previous, effective = change
 
-    def decode_PORT_STATUS_1(self, data_byte):
-        """
-        read only
+        return [AnalyzerFrame("capabilities", start, end, {
+            "address": address_label(address),
+            "description": self.describe_capabilities(effective),
+            "previous": "unknown" if previous is None else self.describe_capabilities(previous),
+            "transactions": writes + 1
+        })]
 
-        # ATTACHED_DEVICE: ( >> 5 & 0x3)
-        NONE_ATT = 0x0
-        SNK_ATT  = 0x1
-        DBG_ATT  = 0x3
+    def describe_capabilities(self, effective):
+        """ an effective sink capability set as text """
+        pdos = sink_pdo_values(effective)
 
-        POWER_MODE = 0x8   # 0: device is sinking power 1 : reserved
-        DATA_MODE  = 0x4   # 0: UFP, 1 reserved
-        ATTACH     = 0x2   # 0: unattached, 1 : attached
-        """
-        self.add_register(self.register_type)
+        return "Sink capabilities: " + str(len(pdos)) + " PDO" + "".join(
+            ", PDO" + str(num + 1) + " " + describe_sink_pdo(pdo, self.power_units) for num, pdo in enumerate(pdos))
 
-        dev = data_byte >> 5
+    def state_events(self, tr, register):
+        """ transition and trigger frames for a transaction on a state or trigger register """
+        start, end, address, payload, errors, state, read_pos = tr
+        frames = []
 
-        if dev == NONE_ATT:
-            self.add_action("NONE_ATT")
+        # value read from the register (response or repeated start read)
+        values = transaction_values(payload, state)
 
-        elif dev == SNK_ATT:
-            self.add_action("SNK_ATT")
+        if len(values) == 0:
+            return frames
 
-        elif dev == DBG_ATT:
-            self.add_action("DBG_ATT")
+        value = values[0]
 
-        if data_byte & POWER_MODE:
-            self.add_action("Device sinking power")
+        if self.events is None:
+            self.events = StateEvents()
 
-        if data_byte & DATA_MODE:
-            self.add_action("UFP")
+        address = address_label(address)
 
-        if data_byte & ATTACH:
-            self.add_action("Attached")
-        else:
-            self.add_action("Unattached")
+        if register in STATE_REGISTERS:
+            change = self.events.update(register, value, start)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            if change is None:
+                return frames
 
-    def decode_PRT_STATUS(self,data_byte):
-        """
-        PRL_HW_RST_RECEIVED = 0x01
-        PRL_MSG_RECEIVED    = 0x04
-        PRL_BIST_RECEIVED   = 0x10
-        """
-        self.add_register(self.register_type)
+            previous, name, dwell = change
+            trigger = self.events.state_trigger(register, name, self.trigger)
 
-        if data_byte & PRL_HW_RST_RECEIVED:
-            self.add_action("PRL_HW_RST_RECEIVED")
+            if trigger is None and self.state_display != STATES_TRANSITIONS:
+                return frames
 
-        elif data_byte & PRL_MSG_RECEIVED:
-            self.add_action("PRL_MSG_RECEIVED")
+            if previous is None:
+                previous = "unknown"
 
-        elif data_byte & PRL_BIST_RECEIVED:
-            self.add_action("PRL_BIST_RECEIVED")
+            frames.append(AnalyzerFrame("transition" if trigger is None else "trigger", start, end, {
+                "address": address,
+                "description": label(STUSB_Registers[register] + previous + " -> " + name),
+                "dwell": label(format_time(dwell)),
+                "trigger": trigger if trigger is not None else ""
+            }))
 
         else:
-            self.add_action("reserved")
+            desc = self.events.other_trigger(register, value, self.trigger)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            if desc is not None:
+                frames.append(AnalyzerFrame("trigger", start, end, {
+                    "address": address,
+                    "description": desc,
+                    "dwell": "-",
+                    "trigger": self.trigger
+                }))
 
+        return frames
 
-    def decode_PD_TYPEC_STATUS(self,data_byte):
-        """
-        PD_CLEAR                    = 0x00
-        PD_HARD_RESET_COMPLETE_ACK  = 0x08
-        PD_HARD_RESET_RECEIVED_ACK  = 0x0e
-        PD_HARD_RESET_SEND_ACK      = 0x0f
-        """
-
-        self.add_register(self.register_type)
+    def settings_key(self, register):
+        """ the value of the settings that change the decoded output of a register """
+        key = self.render_keys.get(register)
 
-        if data_byte == PD_CLEAR:
-            self.add_action("PD_CLEAR")
+        if key is None:
+            key = tuple(getattr(self, name) for name, regs in SETTING_REGISTERS.items() if regs is None or register in regs)
+            self.render_keys[register] = key
 
-        elif data_byte == PD_HARD_RESET_COMPLETE_ACK:
-            self.add_action("PD_HARD_RESET_COMPLETE_ACK")
+        return key
 
-        elif data_byte == PD_HARD_RESET_RECEIVED_ACK:
-            self.add_action("PD_HARD_RESET_RECEIVED_ACK")
+    def parse_filter(self, text):
+        """ register filter setting to set of registers (None : show all) """
+        if not isinstance(text, str) or len(text.strip()) == 0:
+            return None
 
-        elif data_byte == PD_HARD_RESET_SEND_ACK:
-            self.add_action("PD_HARD_RESET_SEND_ACK")
+        names = {}
+        for reg in STUSB_Registers:
+            names[STUSB_Registers[reg].strip(': ').upper()] = reg
 
-        else:
-            self.add_action("reserved")
+        shown = set()
 
-        self.temp_frame.data["data"] += hex(data_byte)
+        for item in text.replace(';', ',').split(','):
+            item = item.strip()
 
-    def decode_CC_STATUS(self, data_byte):
-        """
-            LOOKING_4_CONNECTION        = 0x20  # 0: (NOT_LOOKING) 1: Looking
-            CONNECT_RESULT              = 0x10  # 0: reserved  1: (PRESENT_RD) The device is presenting Rd.
-            #CC2_STATE: (available when CONNECT_result =1) >> 2 & 0x3
-            #This field returns 00b if (LOOKING_4_CONNECTION=1)
-            SNK_CC2_Default             = 0x1   # (Above minimum vRd-Connect)
-            SNK_CC2_Power1_5            = 0x2   # (Above minimum vRd-Connect)
-            SNK_CC2_Power3_0            = 0x3   # (Above minimum vRd-Connect)
-            #CC1_STATE: (available when CONNECT_result =1) & 0x3
-            #This field returns 00b if (LOOKING_4_CONNECTION=1)
-            SNK_CC1_Default             = 0x1   # (Above minimum vRd-Connect)
-            SNK_CC1_Power1_5            = 0x2   # (Above minimum vRd-Connect)
-            SNK_CC1_Power3_0            = 0x3   # (Above minimum vRd-Connect)
-        """
-        self.add_register(self.register_type)
+            if item.upper() in names:
+                shown.add(names[item.upper()])
+            elif len(item) > 0:
+                try:
+                    shown.add(hex(int(item, 0)))
+                except ValueError:
+                    pass
 
-        if (data_byte & LOOKING_4_CONNECTION):
-            self.add_action("Try connecting")
-        else:
-            self.add_action("Not connecting")
-
-        if (data_byte & CONNECT_RESULT):
-            self.add_action("PRESENT_RD")
-
-            cc2 = (data_byte >> 2) & 0x3
-            if (cc2 == SNK_CC2_Default):
-                self.add_action("SNK_CC2_Default")
-            elif (cc2 == SNK_CC2_Power1_5):
-                self.add_action("SNK_CC2_Power1_5")
-            elif (cc2 == SNK_CC2_Power3_0):
-                self.add_action("SNK_CC2_Power3_0")
-
-            cc1 = data_byte & 0x3
-            if (cc1 == SNK_CC1_Default):
-                self.add_action("SNK_CC1_Default")
-            elif (cc1 == SNK_CC1_Power1_5):
-                self.add_action("SNK_CC1_Power1_5")
-            elif (cc1 == SNK_CC1_Power3_0):
-                self.add_action("SNK_CC1_Power3_0")
-
-        self.temp_frame.data["data"] += hex(data_byte)
-
-    def decode_TYPEC_MONITORING_STATUS_1(self, data_byte):
-        """
-        Read only
+        return shown
 
-        TYPEC_MONITORING_STATUS_1
-        VBUS_READY                  = 0x08  # 0: VBUS disconnected 1: VBUS connected
-        VBUS_VSAFE0V                = 0x04  # 0: VBUS > 0.8V, 1: < 0.8V
-        VBUS_VALID_SNK              = 0x02  # 0: VBUS < 1.9 V or 3.5 V  1: VBUS > 1.9 V or 3.5 V (depending of VBUS_SNK_DISC_THRESHOLD value)
-        """
-        self.add_register(self.register_type)
+    def decode_data(self):
+        """ handle the next data byte of a transaction """
 
-        if (data_byte & VBUS_READY):
-            self.add_action("VBUS Connected")
-        else:
-            self.add_action("VBUS Disconnected")
+        # if waiting on responds from an assumed read request
+        if self.Maybe_reading == True:
+            # restore the saved register to (potentially) decode the responds
+            self.register_type = self.request_register_type
 
-        if (data_byte & VBUS_VSAFE0V):
-            self.add_action("VBUS < 0.8V")
-        else:
-            self.add_action("VBUS > 0.8V")
+        # no register known yet
+        if self.register_type == None:
+            self.register_type = HEX_LABELS[self.data_byte]
 
-        if (data_byte & VBUS_VALID_SNK):
-            self.add_action("VBUS V > SNK_DISC_THRESHOLD")
+        # select decoder for register (if available)
         else:
-            self.add_action("VBUS V < SNK_DISC_THRESHOLD")
+            decoder = register_decoder(self.register_type)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            if decoder is not None:
+                decoder(self, self.data_byte)
 
-    def decode_TYPEC_MONITORING_STATUS_0(self, data_byte):
-        """
-        VBUS_VALID_SNK_TRANS    = 0x02
-        VBUS_VSAFE0V_TRANS      = 0x04
-        VBUS_READY_TRANS        = 0x08
-        VBUS_LOW_STATUS         = 0x10
-        VBUS_HIGH_STATUS        = 0x20
-        """
-        self.add_register(self.register_type)
+            # oh oh no decoder available for this register
+            # either not created (yet) or not enough information to create decoder
+            # for now supplying the raw data
+            else:
+                self.add_databyte()
 
-        if (data_byte & VBUS_VALID_SNK_TRANS):
-            self.add_action("VBUS_VALID_SNK_TRANS")
+    def add_databyte(self):
+        """ Just add data byte """
+        self.temp_frame.data["count"] += 1
+        if len(self.temp_frame.data["data"]) > 0:
+            self.temp_frame.data["data"] += ", "
+        self.temp_frame.data["data"] += HEX_LABELS[self.data_byte]
+        self.temp_frame.data["description"] += "data only"
 
-        if (data_byte & VBUS_VSAFE0V_TRANS):
-            self.add_action("VBUS_VSAFE0V_TRANS")
+    def add_action(self,act):
+        """ add comma separated action """
+        if len(self.temp_frame.data["action"]) > 0:
+            self.temp_frame.data["action"] += ", "
+        self.temp_frame.data["action"] += act
 
-        if (data_byte & VBUS_READY_TRANS):
-            self.add_action("VBUS_READY_TRANS")
+    def add_description(self,act):
+        """ add comma separated description """
+        if len(self.temp_frame.data["description"]) > 0:
+            self.temp_frame.data["description"] += ", "
+        self.temp_frame.data["description"] += act
+        self.data_unknown = False
 
-        if (data_byte & VBUS_LOW_STATUS):
-            self.add_action("VBUS_LOW_STATUS: ERR")
+    def add_register(self,act):
+        """ Add a register to description """
+        if act in STUSB_Registers:
+            reg = STUSB_Registers[act]
+            self.add_description(reg)
         else:
-            self.add_action("VBUS_LOW_STATUS: OK")
+            self.add_description("unknown")
 
-        if (data_byte & VBUS_HIGH_STATUS):
-            self.add_action("VBUS_HIGH_STATUS: ERR")
+    def add_power(self, voltage, current):
+        """ add voltage and current to description in the selected units """
+        if self.power_units == UNITS_MV_MA:
+            self.temp_frame.data["description"] += "voltage: "
+            self.temp_frame.data["description"] += str(round(voltage * 1000)) + " mV"
+            self.temp_frame.data["description"] += ", current: "
+            self.temp_frame.data["description"] += str(round(current * 1000)) + " mA"
         else:
-            self.add_action("VBUS_HIGH_STATUS: OK")
-
-        self.temp_frame.data["data"] += hex(data_byte)
-
-    def decode_ALERT_STATUS_1(self, data_byte):
-        """
-        Read only
+            self.temp_frame.data["description"] += "voltage: "
+            self.temp_frame.data["description"] += str(voltage)
+            self.temp_frame.data["description"] += ", current: "
+            self.temp_frame.data["description"] += str(current)
 
-        PRT_STATUS_AL              = 0x1
-        CC_HW_FAULT_STATUS_AL      = 0x10
-        TYPEC_MONITORING_STATUS_AL = 0x20
-        PORT_STATUS_AL             = 0x40
+    def decode_RDO_REG_STATUS_0(self,data_byte):
+        """ requested data object '''
+        RDO_MaxCurrent        = 0       #  // 10 Bits 9..0
+        RDO_OperatingCurrent  = 10      #  // 10 bits 19..10;
+        RDO_reserved_22_20    = 20      #
+        RDO_UnchunkedMess_sup = 23
+        RDO_UsbSuspend        = 24
+        RDO_UsbComCap         = 25
+        RDO_CapaMismatch      = 26
+        RDO_GiveBack          = 27
+        RDO_Object_Pos        = 28      # Bits 30..28 (3-bit)
+        RDO_reserved_31       = 31      # Bits 31
         """
+        # get 4 data byte (MSB first)
+        if self.snk_count < 4:
+            tmp = data_byte
+            tmp = (tmp << (8 * self.snk_count))
+            self.snk_data = self.snk_data + tmp
+            self.snk_count += 1
 
-        self.add_register(self.register_type)
+        if self.snk_count == 4:
 
-        if (data_byte & PRT_STATUS_AL):
-            self.add_action("PRT_STATUS_AL")
+            self.add_register(self.register_type)
 
-        if (data_byte & CC_HW_FAULT_STATUS_AL):
-            self.add_action("CC_HW_FAULT_STATUS_AL")
+            # bottom 10 bits is current
+            current = (self.snk_data & 0x3ff) * 0.01
 
-        if (data_byte & TYPEC_MONITORING_STATUS_AL):
-            self.add_action("TYPEC_MONITORING_STATUS_AL")
+            # top 10 bits voltage
+            voltage = ((self.snk_data >> RDO_OperatingCurrent) & 0x3ff) / 20
 
-        if (data_byte & PORT_STATUS_AL):
-            self.add_action("PORT_STATUS_AL")
+            self.add_power(voltage, current)
+            self.temp_frame.data["count"] += 4
+            self.temp_frame.data["data"] += hex(self.snk_data)
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            # 3 bits
+            self.add_action(" Object_Pos: ")
+            val = (self.snk_data >> RDO_Object_Pos) & 0x07
+            self.temp_frame.data["action"] += str(val)
+            #self.temp_frame.data["data"] += hex(val)
 
-    def decode_alert_mask(self, data_byte):
-        """
-        PRT_STATUS_AL = 0x1
-        CC_HW_FAULT_STATUS_AL = 0x10
-        TYPEC_MONITORING_STATUS_AL = 0x20
-        PORT_STATUS_AL= 0x40
-        """
-        self.add_register(self.register_type)
+            self.add_action("UnchunkedMess_sup: ")
+            val = (self.snk_data >> RDO_UnchunkedMess_sup) & 0x01
+            self.temp_frame.data["action"] +=(str(val))
 
-        if (data_byte & PRT_STATUS_AL):
-            self.add_action("PRT_STATUS_AL: MASKED")
-        else:
-            self.add_action("PRT_STATUS_AL: UNMASKED")
+            self.add_action("UsbSuspend: ")
+            val = (self.snk_data >> RDO_UsbSuspend) & 0x01
+            self.temp_frame.data["action"] +=(str(val))
 
-        if (data_byte & CC_HW_FAULT_STATUS_AL):
-            self.add_action("CC_HW_FAULT_STATUS_AL: MASKED")
-        else:
-            self.add_action("CC_HW_FAULT_STATUS_AL: UNMASKED")
+            self.add_action("UsbComCap: ")
+            val = (self.snk_data >> RDO_UsbComCap) & 0x01
+            self.temp_frame.data["action"] +=(str(val))
 
-        if (data_byte & TYPEC_MONITORING_STATUS_AL):
-            self.add_action("TYPEC_MONITORING_STATUS_AL: MASKED")
-        else:
-            self.add_action("TYPEC_MONITORING_STATUS_AL: UNMASKED")
+            self.add_action("CapaMismatch: ")
+            val = (self.snk_data >> RDO_CapaMismatch) & 0x01
+            self.temp_frame.data["action"] +=(str(val))
 
-        if (data_byte & PORT_STATUS_AL):
-            self.add_action("PORT_STATUS_AL: MASKED")
-        else:
-            self.add_action("PORT_STATUS_AL: UNMASKED")
+            self.add_action("GiveBack: ")
+            val = (self.snk_data >> RDO_GiveBack) & 0x01
+            self.temp_frame.data["action"] +=(str(val))
 
-        self.temp_frame.data["data"] += hex(data_byte)
+            self.snk_count = 0
+            self.snk_data = 0
 
     def decode_snk0(self, data_byte):
         """decode sink PDO """
@@ -1203,13 +2323,17 @@ class Hla(HighLevelAnalyzer):
             # top 10 bits voltage
             voltage = ((self.snk_data >> 10) & 0x3ff) / 20
 
-            self.temp_frame.data["description"] += "voltage: "
-            self.temp_frame.data["description"] += str(voltage)
-            self.temp_frame.data["description"] += ", current: "
-            self.temp_frame.data["description"] += str(current)
+            self.add_power(voltage, current)
             self.temp_frame.data["count"] += 4
             self.temp_frame.data["data"] += hex(self.snk_data)
 
             self.snk_count = 0
             self.snk_data = 0
 
+# the 32 bit registers, decoded over 4 data bytes
+REGISTER_DECODERS.update({
+    DPM_SNK_PDO1_0  : Hla.decode_snk0,
+    DPM_SNK_PDO2_0  : Hla.decode_snk0,
+    DPM_SNK_PDO3_0  : Hla.decode_snk0,
+    RDO_REG_STATUS_0: Hla.decode_RDO_REG_STATUS_0
+})
@@ -0,0 +1,337 @@
+'''
+Batch decoding of a directory with STUSB4500 I2C captures
+
+Every capture export (Logic 2 I2C table export, CSV) in the directory is decoded in a process pool, one Hla
+per file. Each worker returns a summary of the file: error counts and, for each device address on the bus,
+negotiated RDO, sink PDO writes, NVM operations and alert latencies. The summaries are merged into one report.
+
+The files are handed out largest first, so the long files do not end up at the end of the run. A file that
+cannot be decoded is listed with its error in the report, the other files are still decoded and the exit
+status is 1.
+
+usage : python batch.py capture_dir [--jobs 8] [--pattern "*.csv"] [--json report.json] [-s name=value]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import transaction_access, address_label, Dec_control1_opcode
+from offline import make_hla, read_export, parse_settings
+
+# alert bit in ALERT_STATUS_1 : status register that is read to handle (and clear) it
+Alert_registers = {
+    stusb.PRT_STATUS_AL             : stusb.PRT_STATUS,
+    stusb.CC_HW_FAULT_STATUS_AL     : stusb.CC_HW_FAULT_STATUS_0,
+    stusb.TYPEC_MONITORING_STATUS_AL: stusb.TYPEC_MONITORING_STATUS_0,
+    stusb.PORT_STATUS_AL            : '0xd'
+}
+
+SNK_PDO_REGISTERS = (stusb.DPM_SNK_PDO1_0, stusb.DPM_SNK_PDO2_0, stusb.DPM_SNK_PDO3_0)
+
+def power(value):
+    """ voltage and current as the PDO / RDO decoders show them """
+    return ((value >> 10) & 0x3ff) / 20, round((value & 0x3ff) * 0.01, 2)
+
+class DeviceSummary:
+    """ statistics of one device address in a capture """
+
+    def __init__(self):
+        self.rdo = None
+        self.rdo_changes = 0
+        self.pdo_writes = []
+        self.pdo_numb = []
+        self.nvm = {}               # opcode : count
+        self.nvm_unlocks = 0
+        self.alert_pending = {}     # status register : time the alert was seen
+        self.alert_count = 0
+        self.alert_total = 0.0
+        self.alert_max = 0.0
+
+    def add(self, register, values, is_read, start):
+        """ add a register access of a transaction on this device """
+
+        if register == stusb.RDO_REG_STATUS_0 and len(values) >= 4:
+            rdo = int.from_bytes(values[:4], 'little')
+
+            if rdo != self.rdo:
+                if self.rdo is not None:
+                    self.rdo_changes += 1
+                self.rdo = rdo
+
+        elif is_read:
+            if register == stusb.ALERT_STATUS_1:
+                for bit in Alert_registers:
+                    if values[0] & bit:
+                        self.alert_pending.setdefault(Alert_registers[bit], start)
+
+            elif register in self.alert_pending:
+                latency = float(start - self.alert_pending.pop(register))
+                self.alert_count += 1
+                self.alert_total += latency
+                self.alert_max = max(self.alert_max, latency)
+
+        elif register in SNK_PDO_REGISTERS and len(values) >= 4:
+            voltage, current = power(int.from_bytes(values[:4], 'little'))
+            self.pdo_writes.append((stusb.STUSB_Registers[register].strip(': '), voltage, current))
+
+        elif register == stusb.DPM_PDO_NUMB:
+            self.pdo_numb.append(values[0] & 0x07)
+
+        elif register == stusb.FTP_CTRL_1 or (register == stusb.FTP_CTRL_0 and len(values) > 1):
+            # a burst from CTRL_0 also writes the CTRL_1 opcode
+            name = Dec_control1_opcode[values[0 if register == stusb.FTP_CTRL_1 else 1] & 0x07]
+            self.nvm[name] = self.nvm.get(name, 0) + 1
+
+        elif register == stusb.FTP_CUST_PASSWORD_REG:
+            if hex(values[0]) == stusb.FTP_CUST_PASSWORD:
+                self.nvm_unlocks += 1
+
+    def result(self):
+        result = {
+            "rdo": None,
+            "rdo_changes": self.rdo_changes,
+            "pdo_writes": self.pdo_writes,
+            "pdo_numb": self.pdo_numb,
+            "nvm": self.nvm,
+            "nvm_unlocks": self.nvm_unlocks,
+            "alert_latency": {
+                "count": self.alert_count,
+                "mean": self.alert_total / self.alert_count if self.alert_count else None,
+                "max": self.alert_max if self.alert_count else None
+            }
+        }
+
+        if self.rdo is not None:
+            voltage, current = power(self.rdo)
+            result["rdo"] = {
+                "value": hex(self.rdo),
+                "voltage": voltage,
+                "current": current,
+                "object_pos": (self.rdo >> stusb.RDO_Object_Pos) & 0x07,
+                "capa_mismatch": (self.rdo >> stusb.RDO_CapaMismatch) & 0x01
+            }
+
+        return result
+
+class Summary:
+    """ statistics of one capture, the register statistics per device address """
+
+    def __init__(self, file_name):
+        self.file = file_name
+        self.size = os.path.getsize(file_name)
+        self.transactions = 0
+        self.pings = 0
+        self.error_transactions = 0
+        self.error_frames = 0
+        self.devices = {}           # address label : DeviceSummary
+        self.device = None          # device of a transaction without address (as the decoder does)
+        self.decode_time = 0.0
+
+    def add(self, tr, rendered):
+        """ add a decoded transaction """
+        start, end, address, payload, errors, state, read_pos = tr
+        self.transactions += 1
+
+        if len(errors) > 0:
+            self.error_transactions += 1
+            self.error_frames += len(errors)
+
+        if rendered[0] == "ping":
+            self.pings += 1
+            return
+
+        register, values, is_read = transaction_access(tr)
+
+        if len(values) == 0:
+            return
+
+        if address is not None:
+            self.device = address_label(address)
+
+        if self.device not in self.devices:
+            self.devices[self.device] = DeviceSummary()
+
+        self.devices[self.device].add(register, values, is_read, start)
+
+    def result(self):
+        return {
+            "file": self.file,
+            "size": self.size,
+            "transactions": self.transactions,
+            "pings": self.pings,
+            "error_transactions": self.error_transactions,
+            "error_frames": self.error_frames,
+            "devices": {device: summary.result() for device, summary in sorted(self.devices.items())},
+            "decode_time": self.decode_time
+        }
+
+def summarize_file(file_name, settings):
+    """ worker : decode one capture and return its summary """
+    begin = time.perf_counter()
+    summary = Summary(file_name)
+    hla = make_hla(settings)
+
+    with open(file_name, newline='') as file:
+        for frame in read_export(file):
+            tr = hla.collect(frame)
+
+            if tr is not None:
+                summary.add(tr, hla.render(tr))
+
+    summary.decode_time = time.perf_counter() - begin
+    return summary.result()
+
+def aggregate(results, failed=()):
+    """ merge the file summaries, failed : [{"file": name, "error": description}] """
+    total = {
+        "files": len(results),
+        "failed": list(failed),
+        "transactions": 0,
+        "error_transactions": 0,
+        "error_frames": 0,
+        "files_with_errors": [],
+        "contracts": {},
+        "pdo_writes": 0,
+        "nvm": {},
+        "alert_latency": {"count": 0, "mean": None, "max": None},
+        "decode_time": 0.0
+    }
+    alert_total = 0.0
+
+    for res in results:
+        total["transactions"] += res["transactions"]
+        total["error_transactions"] += res["error_transactions"]
+        total["error_frames"] += res["error_frames"]
+        total["decode_time"] += res["decode_time"]
+
+        if res["error_transactions"] > 0:
+            total["files_with_errors"].append(res["file"])
+
+        # contract, PDO writes, NVM and alerts per device
+        for dev in res["devices"].values():
+            total["pdo_writes"] += len(dev["pdo_writes"])
+
+            if dev["rdo"] is not None:
+                contract = "{} V / {} A".format(dev["rdo"]["voltage"], dev["rdo"]["current"])
+            else:
+                contract = "none"
+            total["contracts"][contract] = total["contracts"].get(contract, 0) + 1
+
+            for name, count in dev["nvm"].items():
+                total["nvm"][name] = total["nvm"].get(name, 0) + count
+
+            lat = dev["alert_latency"]
+            if lat["count"] > 0:
+                total["alert_latency"]["count"] += lat["count"]
+                alert_total += lat["mean"] * lat["count"]
+
+                if total["alert_latency"]["max"] is None or lat["max"] > total["alert_latency"]["max"]:
+                    total["alert_latency"]["max"] = lat["max"]
+
+    if total["alert_latency"]["count"] > 0:
+        total["alert_latency"]["mean"] = alert_total / total["alert_latency"]["count"]
+
+    return total
+
+def run_batch(directory, pattern="*.csv", jobs=None, settings=None, progress=None):
+    """ decode all captures in directory, returns (file summaries, aggregate) """
+    files = glob.glob(os.path.join(directory, pattern))
+
+    # largest first for a good load balance
+    files.sort(key=os.path.getsize, reverse=True)
+
+    results = []
+    failed = []
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(summarize_file, name, settings or {}): name for name in files}
+
+        for future in concurrent.futures.as_completed(futures):
+            # a failing file is recorded, the others are still decoded
+            try:
+                results.append(future.result())
+            except Exception as error:
+                failed.append({"file": futures[future], "error": "{}: {}".format(type(error).__name__, error)})
+
+            if progress is not None:
+                progress(len(results) + len(failed), len(files), futures[future])
+
+    results.sort(key=lambda res: res["file"])
+    failed.sort(key=lambda res: res["file"])
+    return results, aggregate(results, failed)
+
+def show_progress(done, total, file_name):
+    print("\r[{:>5}/{:<5}] {:<60.60}".format(done, total, os.path.basename(file_name)), end="", file=sys.stderr)
+
+    if done == total:
+        print(file=sys.stderr)
+
+def print_report(results, total, file=sys.stdout):
+    print("{:<40} {:>12} {:>7} {:>7} {:>18} {:>5} {:>5} {:>12}".format(
+        "file", "transactions", "errors", "device", "RDO", "PDO w", "NVM", "alert max"), file=file)
+
+    for res in results:
+        name = os.path.basename(res["file"])
+        print("{:<40.40} {:>12} {:>7}".format(name, res["transactions"], res["error_transactions"]), end="", file=file)
+
+        if len(res["devices"]) == 0:
+            print(file=file)
+
+        # one line per device, the file columns only on the first
+        for num, (device, dev) in enumerate(res["devices"].items()):
+            rdo = "-" if dev["rdo"] is None else "{} V / {} A".format(dev["rdo"]["voltage"], dev["rdo"]["current"])
+            lat = stusb.format_time(dev["alert_latency"]["max"])
+
+            if num > 0:
+                print("{:<40} {:>12} {:>7}".format("", "", ""), end="", file=file)
+
+            print(" {:>7} {:>18} {:>5} {:>5} {:>12}".format(device, rdo, len(dev["pdo_writes"]),
+                  sum(dev["nvm"].values()), lat), file=file)
+
+    for res in total["failed"]:
+        print("{:<40.40} failed: {}".format(os.path.basename(res["file"]), res["error"]), file=file)
+
+    print(file=file)
+    print("files          :", total["files"], "decoded,", len(total["failed"]), "failed", file=file)
+    print("transactions   :", total["transactions"], file=file)
+    print("errors         :", total["error_transactions"], "transactions,", total["error_frames"], "error frames in",
+          len(total["files_with_errors"]), "files", file=file)
+    print("contracts      :", ", ".join("{} x{}".format(c, n) for c, n in sorted(total["contracts"].items())), file=file)
+    print("PDO writes     :", total["pdo_writes"], file=file)
+    print("NVM operations :", ", ".join("{} x{}".format(c, n) for c, n in sorted(total["nvm"].items())) or "none", file=file)
+    print("alert latency  : mean", stusb.format_time(total["alert_latency"]["mean"]),
+          "max", stusb.format_time(total["alert_latency"]["max"]), file=file)
+    print("decode time    : {:.2f} s (CPU, all workers)".format(total["decode_time"]), file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode a directory of STUSB4500 I2C captures")
+    parser.add_argument("directory", help="directory with Logic 2 I2C table exports")
+    parser.add_argument("--pattern", default="*.csv", help="file pattern (default *.csv)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--json", help="write summaries and aggregate to this file")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress display")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    results, total = run_batch(args.directory, args.pattern, args.jobs, parse_settings(args.setting),
+                               None if args.quiet else show_progress)
+
+    print_report(results, total)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"files": results, "aggregate": total}, file, indent=1)
+
+    if len(total["failed"]) > 0:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
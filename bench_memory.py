@@ -0,0 +1,89 @@
+'''
+Frame payload memory benchmark of the analyzer
+
+Logic 2 keeps every frame the analyzer returns. This decodes a capture (or a simulated one) twice, with
+every frame holding its own data dict (as before the label pool) and with the shared data dicts and pooled
+labels, and reports the bytes of frame payload per transaction: the data dicts, their keys and values,
+each object counted once however many frames refer to it.
+
+usage : python bench_memory.py [capture.csv ...] [--script "poll:2,renegotiate,poll:1,nvm,poll:2"] [-s name=value]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import sys
+import time
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import frame_list
+from offline import OfflineDecoder, read_export, parse_settings
+from simulator import simulate, analyzer_frames
+
+def payload_bytes(frames):
+    """ bytes of the frame data of the frames, each object counted once """
+    seen = set()
+    total = 0
+
+    for frame in frames:
+        data = frame.data
+
+        if id(data) in seen:
+            continue
+
+        seen.add(id(data))
+        total += sys.getsizeof(data)
+
+        for key, value in data.items():
+            for obj in (key, value):
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+
+    return total
+
+def measure(frames, settings, shared):
+    """ (transactions, frames, payload bytes, decode seconds) """
+    stusb.SHARED_FRAME_DATA = shared
+    stusb._render_cache.clear()
+    stusb._frame_data_pool.clear()
+
+    decoder = OfflineDecoder(**settings)
+    begin = time.perf_counter()
+    decoder.decode(frames)
+    seconds = time.perf_counter() - begin
+
+    out = [frame for result in decoder.frames for frame in frame_list(result)]
+    return len(decoder.transactions), len(out), payload_bytes(out), seconds
+
+def report(name, frames, settings):
+    results = {shared: measure(frames, settings, shared) for shared in (False, True)}
+    print(name)
+
+    for shared, (transactions, count, size, seconds) in results.items():
+        print("  {:<8} {:>9} transactions {:>9} frames {:>12} payload bytes {:>8.1f} bytes / transaction {:>8.3f} s".format(
+              "shared" if shared else "copied", transactions, count, size, size / max(transactions, 1), seconds))
+
+    before, after = results[False][2], results[True][2]
+    print("  payload memory {:.2f} %".format(100.0 * after / before if before else 0.0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frame payload memory per transaction, copied and shared frame data")
+    parser.add_argument("capture", nargs="*", help="I2C analyzer table exports (CSV) from Logic 2")
+    parser.add_argument("--script", default="poll:2,renegotiate,poll:1,nvm,poll:2",
+                        help="simulator script when no capture is given")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    settings = parse_settings(args.setting)
+
+    for file_name in args.capture:
+        with open(file_name, newline='') as file:
+            report(file_name, list(read_export(file)), settings)
+
+    if len(args.capture) == 0:
+        frames = [frame for step in simulate(args.script) for frame in analyzer_frames(step)]
+        report("simulated " + args.script, frames, settings)
+
+if __name__ == '__main__':
+    main()
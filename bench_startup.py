@@ -0,0 +1,85 @@
+'''
+Startup benchmark of the analyzer
+
+Logic 2 imports HighLevelAnalyzer.py and creates a new Hla each time the analyzer is added or a setting
+changes, so the import, the construction and the first decoded transaction are on the user's path. Each
+run is a fresh interpreter (no warm module or decoder cache), the median of the runs is reported and
+compared with the budget.
+
+usage : python bench_startup.py [--runs 20] [--budget-ms 50] [-s name=value]
+
+exit status 1 when the median import + first frame time is over the budget
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# runs in the fresh interpreter, prints the times (seconds) as JSON
+CHILD = '''
+import json, sys, time
+begin = time.perf_counter()
+import HighLevelAnalyzer
+imported = time.perf_counter()
+from offline import make_hla
+from HighLevelAnalyzer import AnalyzerFrame
+settings = json.loads(sys.argv[1])
+made = time.perf_counter()
+hla = make_hla(settings)
+created = time.perf_counter()
+frames = [
+    AnalyzerFrame("start", 0.0, 0.0),
+    AnalyzerFrame("address", 0.0, 0.0, {"address": bytes([0x28]), "read": False}),
+    AnalyzerFrame("data", 0.0, 0.0, {"data": bytes([0x29])}),
+    AnalyzerFrame("stop", 0.0, 0.0),
+    AnalyzerFrame("start", 0.0, 0.0),
+    AnalyzerFrame("address", 0.0, 0.0, {"address": bytes([0x28]), "read": True}),
+    AnalyzerFrame("data", 0.0, 0.0, {"data": bytes([0x18])}),
+    AnalyzerFrame("stop", 0.0, 0.0)
+]
+first = None
+for frame in frames:
+    if hla.decode(frame) is not None and first is None:
+        first = time.perf_counter()
+done = time.perf_counter()
+print(json.dumps({"import": imported - begin, "init": created - made, "first_frame": first - created,
+                  "transaction": done - created}))
+'''
+
+def run_once(settings):
+    out = subprocess.run([sys.executable, "-c", CHILD, json.dumps(settings)], cwd=HERE,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+def main(argv=None):
+    from offline import parse_settings
+
+    parser = argparse.ArgumentParser(description="Import and first frame time of the analyzer")
+    parser.add_argument("--runs", type=int, default=20, help="fresh interpreters to run (default 20)")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="budget for import + first frame (default 50 ms)")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    settings = parse_settings(args.setting)
+    runs = [run_once(settings) for num in range(args.runs)]
+
+    for name in ("import", "init", "first_frame", "transaction"):
+        times = [run[name] * 1000 for run in runs]
+        print("{:<12} median {:8.3f} ms   max {:8.3f} ms".format(name, statistics.median(times), max(times)))
+
+    total = statistics.median((run["import"] + run["init"] + run["first_frame"]) * 1000 for run in runs)
+    print("{:<12} median {:8.3f} ms   budget {:.1f} ms".format("startup", total, args.budget_ms))
+
+    if total > args.budget_ms:
+        print("over budget", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
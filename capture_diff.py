@@ -0,0 +1,452 @@
+'''
+Register level comparison of two STUSB4500 I2C captures
+
+Both captures are decoded with the analyzer and reduced to a sequence of (register, read / write, data
+bytes). Each distinct transaction gets a number (hash table shared by both captures), the two number
+sequences are aligned with the Myers diff (linear space, divide and conquer). Reported are:
+ * the first divergence, with the transactions around it
+ * the PDO, RDO, DPM_PDO_NUMB and NVM sector values that differ between the captures
+ * the timing differences between matching transactions, per register
+
+The register pointer writes of reads and the address are not part of the comparison, so two boards with
+another I2C address compare equal. When the captures are too different (more than --max-edits changes in a
+part of the alignment), that part is split in the middle: the alignment is then no longer minimal, but the
+time stays in bounds for millions of transactions.
+
+usage : python capture_diff.py good.csv bad.csv [--context 3] [--max-edits 200] [--json diff.json]
+
+exit status 1 when the captures differ
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import array
+import json
+import sys
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import STUSB_Registers, transaction_access, Dec_control0_sect
+from offline import make_hla, read_export, parse_settings
+from batch import power, SNK_PDO_REGISTERS
+
+class Capture:
+    """ normalized transactions of one capture, with the PDO / RDO / NVM values seen """
+
+    def __init__(self, file_name, keys, names):
+        self.file = file_name
+        self.keys = keys                # (register, read, data bytes) : number, shared by both captures
+        self.names = names              # number : (register, read, data bytes)
+        self.ids = array.array('l')
+        self.times = array.array('d')
+        self.values = {}                # value name : {value : count}, in the order first seen
+        self.sector = 0                 # NVM sector in FTP_CTRL_0
+        self.opcode = None              # NVM opcode in FTP_CTRL_1
+        self.buffer = None              # RW_BUFFER write, waiting for the Write_to_PL request
+
+    def add(self, tr):
+        """ add a raw transaction """
+        register, values, is_read = transaction_access(tr)
+
+        # ping or register pointer write of a read
+        if register is None or len(values) == 0:
+            return
+
+        key = (register, is_read, bytes(values))
+        num = self.keys.get(key)
+
+        if num is None:
+            num = self.keys[key] = len(self.names)
+            self.names.append(key)
+
+        self.ids.append(num)
+        self.times.append(float(tr[0]))
+        self.add_values(register, values, is_read)
+
+    def add_value(self, name, value):
+        seen = self.values.setdefault(name, {})
+        seen[value] = seen.get(value, 0) + 1
+
+    def add_values(self, register, values, is_read):
+        direction = " read" if is_read else " write"
+
+        if register == stusb.RDO_REG_STATUS_0 and len(values) >= 4:
+            self.add_value("RDO" + direction, format_pdo(values))
+
+        elif register in SNK_PDO_REGISTERS and len(values) >= 4:
+            self.add_value(register_name(register)[:-2] + direction, format_pdo(values))
+
+        elif register == stusb.DPM_PDO_NUMB:
+            self.add_value("DPM_PDO_NUMB" + direction, values[0] & 0x07)
+
+        elif register == stusb.FTP_CTRL_1 and not is_read:
+            self.opcode = values[0] & 0x07
+
+        elif register == stusb.FTP_CTRL_0 and not is_read:
+            # a burst from CTRL_0 also writes the CTRL_1 opcode, it belongs to the request
+            if len(values) > 1:
+                self.opcode = values[1] & 0x07
+
+            self.sector = values[0] & 0x07
+
+            # the sector of a write is known with the request
+            if self.buffer is not None and self.opcode == 0b001 and values[0] & (1 << stusb.FTP_CUST_REQ):
+                self.add_value(nvm_name(self.sector) + " write", self.buffer)
+                self.buffer = None
+
+        elif register == stusb.RW_BUFFER:
+            if is_read:
+                self.add_value(nvm_name(self.sector) + " read", format_bytes(values))
+            else:
+                self.buffer = format_bytes(values)
+
+def register_name(register):
+    return STUSB_Registers.get(register, str(register) + ": ").strip(": ")
+
+def nvm_name(sector):
+    return "NVM " + Dec_control0_sect.get(sector, "SECTOR " + str(sector))
+
+def format_bytes(values):
+    return " ".join("{:02x}".format(value) for value in values)
+
+def format_delta(seconds):
+    """ readable time difference """
+    if seconds < 0:
+        return "-" + stusb.format_time(-seconds)
+    return stusb.format_time(seconds)
+
+def format_pdo(values):
+    voltage, current = power(int.from_bytes(values[:4], 'little'))
+    return "{} V / {} A (0x{:08x})".format(voltage, current, int.from_bytes(values[:4], 'little'))
+
+def load_capture(file_name, keys, names, settings=None):
+    capture = Capture(file_name, keys, names)
+    hla = make_hla(settings or {})
+
+    with open(file_name, newline='') as file:
+        for frame in read_export(file):
+            tr = hla.collect(frame)
+
+            if tr is not None:
+                hla.render(tr)
+                capture.add(tr)
+
+    return capture
+
+""" Myers diff (linear space) """
+def midpoint(a, b, left, top, right, bottom, max_edits):
+    """
+    middle snake of the box, ((x, y), (x, y)) start and end
+
+    When the box needs more than max_edits, the centre of the box is returned as empty snake.
+    """
+    width = right - left
+    height = bottom - top
+    size = width + height
+
+    if size == 0:
+        return None
+
+    delta = width - height
+    odd = delta & 1
+    dmax = (size + 1) // 2
+
+    vf = [0] * (2 * dmax + 1)
+    vb = [0] * (2 * dmax + 1)
+    vf[1] = left
+    vb[1] = bottom
+
+    for d in range(dmax + 1):
+        if d > max_edits:
+            centre = ((left + right) // 2, (top + bottom) // 2)
+            return centre, centre
+
+        # forward
+        for k in range(d, -d - 1, -2):
+            c = k - delta
+
+            if k == -d or (k != d and vf[k - 1] < vf[k + 1]):
+                px = x = vf[k + 1]
+            else:
+                px = vf[k - 1]
+                x = px + 1
+
+            y = top + (x - left) - k
+            py = y if (d == 0 or x != px) else y - 1
+
+            while x < right and y < bottom and a[x] == b[y]:
+                x += 1
+                y += 1
+
+            vf[k] = x
+
+            if odd and -(d - 1) <= c <= d - 1 and y >= vb[c]:
+                return (px, py), (x, y)
+
+        # backward
+        for c in range(d, -d - 1, -2):
+            k = c + delta
+
+            if c == -d or (c != d and vb[c - 1] > vb[c + 1]):
+                py = y = vb[c + 1]
+            else:
+                py = vb[c - 1]
+                y = py - 1
+
+            x = left + (y - top) + k
+            px = x if (d == 0 or y != py) else x + 1
+
+            while x > left and y > top and a[x - 1] == b[y - 1]:
+                x -= 1
+                y -= 1
+
+            vb[c] = y
+
+            if not odd and -d <= k <= d and x <= vf[k]:
+                return (x, y), (px, py)
+
+def find_path(a, b, left, top, right, bottom, max_edits):
+    """ points of the edit path through the box """
+    snake = midpoint(a, b, left, top, right, bottom, max_edits)
+
+    if snake is None:
+        return None
+
+    start, finish = snake
+    head = find_path(a, b, left, top, start[0], start[1], max_edits) or [start]
+    tail = find_path(a, b, finish[0], finish[1], right, bottom, max_edits) or [finish]
+
+    return head + tail
+
+def diff(a, b, max_edits=200):
+    """ opcodes ('equal' / 'replace', i1, i2, j1, j2) as difflib, a and b are sequences of numbers """
+    # common begin and end outside of the alignment
+    first = 0
+    end = min(len(a), len(b))
+    while first < end and a[first] == b[first]:
+        first += 1
+
+    last_a, last_b = len(a), len(b)
+    while last_a > first and last_b > first and a[last_a - 1] == b[last_b - 1]:
+        last_a -= 1
+        last_b -= 1
+
+    path = find_path(a, b, first, first, last_a, last_b, max_edits) or [(first, first)]
+    path = [(0, 0)] + path + [(len(a), len(b))]
+
+    ops = []
+    pending = None          # start (i, j) of the changes since the last equal transaction
+
+    def add_equal(i1, i2, j1, j2):
+        if ops and ops[-1][0] == "equal" and ops[-1][2] == i1 and ops[-1][4] == j1:
+            ops[-1] = ("equal", ops[-1][1], i2, ops[-1][3], j2)
+        else:
+            ops.append(("equal", i1, i2, j1, j2))
+
+    for (x, y), (x2, y2) in zip(path, path[1:]):
+        while x < x2 or y < y2:
+            if x < x2 and y < y2 and a[x] == b[y]:
+                if pending is not None:
+                    ops.append(("replace", pending[0], x, pending[1], y))
+                    pending = None
+
+                run = 0
+                while x + run < x2 and y + run < y2 and a[x + run] == b[y + run]:
+                    run += 1
+
+                add_equal(x, x + run, y, y + run)
+                x += run
+                y += run
+                continue
+
+            if pending is None:
+                pending = (x, y)
+
+            if x2 - x >= y2 - y and x < x2:
+                x += 1
+            else:
+                y += 1
+
+    if pending is not None:
+        ops.append(("replace", pending[0], len(a), pending[1], len(b)))
+
+    return ops
+
+""" comparison """
+class Timing:
+    """ interval difference (b - a) between matching transactions of a register """
+
+    __slots__ = ("count", "total", "largest", "at")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.largest = 0.0
+        self.at = None
+
+    def add(self, delta, time):
+        self.count += 1
+        self.total += delta
+
+        if abs(delta) > abs(self.largest):
+            self.largest = delta
+            self.at = time
+
+class CaptureDiff:
+    """ compare two captures """
+
+    def __init__(self, file_a, file_b, settings=None, max_edits=200):
+        keys = {}
+        names = []
+        self.a = load_capture(file_a, keys, names, settings)
+        self.b = load_capture(file_b, keys, names, settings)
+        self.names = names
+        self.ops = diff(self.a.ids, self.b.ids, max_edits)
+
+    def describe(self, num):
+        register, is_read, values = self.names[num]
+        return "{:<28} {:<5} {}".format(register_name(register), "read" if is_read else "write", format_bytes(values))
+
+    def counts(self):
+        equal = sum(i2 - i1 for tag, i1, i2, j1, j2 in self.ops if tag == "equal")
+        return {"a": len(self.a.ids), "b": len(self.b.ids), "equal": equal,
+                "only_a": len(self.a.ids) - equal, "only_b": len(self.b.ids) - equal}
+
+    def first_divergence(self, context=3):
+        """ None when equal, else dictionary with the position and the transactions around it """
+        for tag, i1, i2, j1, j2 in self.ops:
+            if tag == "equal":
+                continue
+
+            return {
+                "a_index": i1, "b_index": j1,
+                "a_time": self.a.times[i1] if i1 < len(self.a.ids) else None,
+                "b_time": self.b.times[j1] if j1 < len(self.b.ids) else None,
+                "before": [self.describe(self.a.ids[i]) for i in range(max(i1 - context, 0), i1)],
+                "a": [self.describe(self.a.ids[i]) for i in range(i1, min(i2, i1 + context))],
+                "b": [self.describe(self.b.ids[j]) for j in range(j1, min(j2, j1 + context))]
+            }
+
+        return None
+
+    def value_differences(self):
+        """ value name : (values only in a, values only in b) for the PDO / RDO / NVM values that differ """
+        result = {}
+
+        for name in list(self.a.values) + [name for name in self.b.values if name not in self.a.values]:
+            seen_a = self.a.values.get(name, {})
+            seen_b = self.b.values.get(name, {})
+            only_a = [value for value in seen_a if value not in seen_b]
+            only_b = [value for value in seen_b if value not in seen_a]
+
+            if only_a or only_b:
+                result[name] = (only_a, only_b)
+
+        return result
+
+    def timing(self):
+        """ register : Timing of the matching transactions, and the offset (b - a) of the first and last match """
+        registers = {}
+        offsets = None
+        times_a, times_b = self.a.times, self.b.times
+        previous = None
+
+        for tag, i1, i2, j1, j2 in self.ops:
+            if tag != "equal":
+                previous = None
+                continue
+
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                if previous is not None:
+                    delta = (times_b[j] - times_b[previous[1]]) - (times_a[i] - times_a[previous[0]])
+                    register = self.names[self.a.ids[i]][0]
+
+                    if register not in registers:
+                        registers[register] = Timing()
+                    registers[register].add(delta, times_a[i])
+
+                previous = (i, j)
+
+            if offsets is None:
+                offsets = [times_b[j1] - times_a[i1], None]
+            offsets[1] = times_b[j2 - 1] - times_a[i2 - 1]
+
+        return registers, offsets
+
+    def result(self, context=3):
+        registers, offsets = self.timing()
+
+        return {
+            "a": self.a.file,
+            "b": self.b.file,
+            "transactions": self.counts(),
+            "first_divergence": self.first_divergence(context),
+            "values": self.value_differences(),
+            "offset": offsets,
+            "timing": {register_name(register): {"matches": timing.count, "mean": timing.total / timing.count,
+                                                 "largest": timing.largest, "at": timing.at}
+                       for register, timing in registers.items()}
+        }
+
+def print_report(result, top=10, file=sys.stdout):
+    counts = result["transactions"]
+    print("transactions     : {} {}, {} {}".format(counts["a"], result["a"], counts["b"], result["b"]), file=file)
+    print("matching         : {}, only in a {}, only in b {}".format(counts["equal"], counts["only_a"], counts["only_b"]), file=file)
+
+    first = result["first_divergence"]
+    if first is None:
+        print("no divergence", file=file)
+    else:
+        print("first divergence : a #{} ({:.6f} s), b #{} ({:.6f} s)".format(first["a_index"], first["a_time"] or 0,
+              first["b_index"], first["b_time"] or 0), file=file)
+        for line in first["before"]:
+            print("    " + line, file=file)
+        for line in first["a"]:
+            print("  a " + line, file=file)
+        for line in first["b"]:
+            print("  b " + line, file=file)
+
+    if len(result["values"]) > 0:
+        print("values", file=file)
+        for name, (only_a, only_b) in result["values"].items():
+            print("  {:<24} a: {}".format(name, ", ".join(str(value) for value in only_a) or "-"), file=file)
+            print("  {:<24} b: {}".format("", ", ".join(str(value) for value in only_b) or "-"), file=file)
+
+    if result["offset"] is not None:
+        print("offset b - a     : {} at the first match, {} at the last".format(
+              format_delta(result["offset"][0]), format_delta(result["offset"][1])), file=file)
+
+    timing = sorted(result["timing"].items(), key=lambda item: -abs(item[1]["largest"]))
+    if len(timing) > 0:
+        print("interval difference b - a of matching transactions", file=file)
+        for name, item in timing[:top]:
+            print("  {:<28} {:>8} matches  mean {:>12}  largest {:>12}{}".format(name, item["matches"],
+                  format_delta(item["mean"]), format_delta(item["largest"]),
+                  "" if item["at"] is None else " at {:.6f} s".format(item["at"])), file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two STUSB4500 captures at register level")
+    parser.add_argument("a", help="I2C analyzer table export (CSV) of the known good board")
+    parser.add_argument("b", help="I2C analyzer table export (CSV) to compare")
+    parser.add_argument("--context", type=int, default=3, help="transactions shown at the first divergence (default 3)")
+    parser.add_argument("--max-edits", type=int, default=200, help="changes searched for in a part before it is split (default 200)")
+    parser.add_argument("--top", type=int, default=10, help="registers shown with timing differences (default 10)")
+    parser.add_argument("--json", help="write the comparison as JSON")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    compare = CaptureDiff(args.a, args.b, parse_settings(args.setting), max(args.max_edits, 1))
+    result = compare.result(args.context)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=1)
+
+    print_report(result, args.top)
+
+    counts = result["transactions"]
+    if result["first_divergence"] is not None or counts["a"] != counts["b"]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,505 @@
+'''
+Equivalence and fuzzing harness for the decode engines
+
+Every decode path must give the same frames as Hla.decode, frame by frame. This runs the reference
+(Hla.decode) and the other engines side by side on recorded captures (corpus) and on random frame
+sequences, and compares the output field by field. A failing random case is shrunk to a minimal frame
+sequence that still shows the difference. The throughput of each engine is reported from the same run.
+
+Engines:
+ * reference : Hla.decode, frame by frame
+ * offline   : OfflineDecoder (collect / render / emit)
+ * rerender  : OfflineDecoder decoded with other settings, then change_settings() back
+ * pipeline  : PipelineDecoder (threads, chunks)
+
+Every output is also checked to be in time order (Logic 2 needs the frames in increasing time), and the
+regression cases (REGRESSIONS) run on each invocation. The engines share collect / render and the render
+cache with the reference, so the reference output itself is checked as well: against known frame data
+(EXPECTED) and against the golden files, captures with their frozen decoded frames (golden/golden.json,
+JSON Lines as offline.py writes them). After an intended output change, --update-golden writes the
+expected files again (check the diff before committing them).
+
+The random sequences have random registers and data, bursts of up to 12 bytes, repeated starts, more than
+one device address, error frames and missing stop frames. The render cache is cleared before each engine,
+so each engine decodes for itself. Sampling depends on the decode time and is not compared.
+
+usage : python equivalence.py [corpus.csv ...] [--cases 1000] [--length 200] [--seed 1] [--random-settings]
+                              [--engines offline,rerender,pipeline] [--golden golden] [--update-golden] [-s name=value]
+
+exit status 1 when an engine differs from the reference, or the reference from the golden output
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import Hla, AnalyzerFrame, ChoicesSetting, STUSB_Registers, frame_list
+from offline import make_hla, read_export, parse_settings, OfflineDecoder, PipelineDecoder, Sink, JsonLinesSink
+
+# settings that are not compared (output depends on the decode time)
+UNCOMPARED_SETTINGS = ('sampling', 'sample_budget_ms')
+
+REGISTERS = [int(register, 16) for register in STUSB_Registers]
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+GOLDEN_MANIFEST = "golden.json"     # [{"capture": csv file, "settings": {...}, "expected": jsonl file}, ...]
+
+""" engines """
+def run_reference(frames, settings):
+    hla = make_hla(settings)
+    out = []
+
+    for frame in frames:
+        result = hla.decode(frame)
+
+        if result is not None:
+            out += frame_list(result)
+
+    return out
+
+def run_offline(frames, settings):
+    decoder = OfflineDecoder(**settings)
+    decoder.decode(frames)
+    return list(decoder.output())
+
+def other_settings(settings):
+    """ other value for each choices setting, to decode with before change_settings() """
+    other = dict(settings)
+
+    for name, value in vars(Hla).items():
+        if isinstance(value, ChoicesSetting) and name not in UNCOMPARED_SETTINGS:
+            current = settings.get(name, value.default)
+            other[name] = value.choices[(value.choices.index(current) + 1) % len(value.choices)]
+
+    return other
+
+def run_rerender(frames, settings):
+    decoder = OfflineDecoder(**other_settings(settings))
+    decoder.decode(frames)
+    decoder.change_settings(**{name: settings.get(name, getattr(Hla, name).default) for name in other_settings(settings)})
+    return list(decoder.output())
+
+class ListSink(Sink):
+    """ keeps the frames """
+
+    def __init__(self):
+        super().__init__(4096)
+        self.frames = []
+
+    def write_batch(self, frames):
+        self.frames += frames
+
+def run_pipeline(frames, settings):
+    decoder = PipelineDecoder(4, **settings)
+    sink = ListSink()
+    decoder.decode(frames, [sink])
+    sink.close()
+    return sink.frames
+
+ENGINES = {
+    "offline": run_offline,
+    "rerender": run_rerender,
+    "pipeline": run_pipeline
+}
+
+""" regression cases """
+def transaction_frames(transactions):
+    """ frames of (time, address, read, data bytes) transactions """
+    frames = []
+
+    for start, address, read, data in transactions:
+        frames.append(AnalyzerFrame("start", start, start))
+        frames.append(AnalyzerFrame("address", start, start, {"address": bytes([address]), "read": read}))
+        frames += [AnalyzerFrame("data", start, start, {"data": bytes([value])}) for value in data]
+        frames.append(AnalyzerFrame("stop", start, start + 0.00001))
+
+    return frames
+
+# a pointer write of one device, a write of another device, then the read of the first device : the held
+# pointer write must not come out after the write of the other device
+TWO_DEVICES = transaction_frames([(0.00001, 0x28, False, b'\x11'), (0.00005, 0x29, False, b'\x51\x0d'),
+                                  (0.00009, 0x28, True, b'\x04')])
+
+# name, frames, settings
+REGRESSIONS = [
+    ("two devices, combined read", TWO_DEVICES, {"read_display": stusb.READS_COMBINED}),
+    ("two devices, sampling", TWO_DEVICES, {"sampling": stusb.SAMPLING_ADAPTIVE}),
+]
+
+# name, frames, settings, ((frame index, data field, expected value), ...)
+EXPECTED = [
+    # a truncated RDO read (2 bytes) must not shift the bytes of the next RDO read
+    ("truncated RDO read", transaction_frames([(0.00001, 0x28, False, b'\x91'), (0.00003, 0x28, True, b'\xff\xff'),
+                                               (0.00005, 0x28, False, b'\x91'), (0.00009, 0x28, True, b'\x2c\xb1\x04\x13')]),
+     {}, ((3, "data", "0x1304b12c"),)),
+    # one burst from FTP_CTRL_0 (request, sector 1) that also writes the FTP_CTRL_1 opcode (Erase_sector)
+    ("NVM burst CTRL_0 / CTRL_1", transaction_frames([(0.00001, 0x28, False, b'\x96\xd1\x05'),
+                                                      (0.00005, 0x28, False, b'\x96'), (0.00102, 0x28, True, b'\xc1')]),
+     {"nvm_timing": "all operations"}, ((3, "description", "NVM Erase_sector SECTOR_NVM_1"),)),
+]
+
+def check_expected(frames, expected):
+    """ None when the frames hold the expected values, else (frame index, description) """
+    if isinstance(frames, Exception):
+        return 0, "exception: {!r}".format(frames)
+
+    for index, field, value in expected:
+        if index >= len(frames):
+            return index, "{} frames, expected frame {}".format(len(frames), index)
+
+        if frames[index].data.get(field) != value:
+            return index, "data.{}: {!r}, expected {!r}".format(field, frames[index].data.get(field), value)
+
+    return None
+
+""" random frame sequences """
+def random_frames(rnd, length):
+    """ length transactions of random frames """
+    frames = []
+    now = 0.0
+    addresses = rnd.choice(((0x28,), (0x28,), (0x28, 0x29), (0x28, 0x29, 0x2a, 0x2b)))
+
+    def add(frame_type, data=None):
+        nonlocal now
+        frames.append(AnalyzerFrame(frame_type, now, now + 0.00001, data or {}))
+        now += 0.00001
+
+    for num in range(length):
+        now += rnd.random() * 0.001
+        add("start")
+
+        address = rnd.choice(addresses)
+        read = rnd.random() < 0.5
+
+        if rnd.random() < 0.97:
+            add("address", {"address": bytes([address]), "read": read})
+
+        burst = rnd.choice((0, 1, 1, 1, 2, 2, 4, 5, 8, 12))
+
+        for pos in range(burst):
+            if rnd.random() < 0.02:
+                add("error")
+
+            # repeated start : register pointer, then read
+            if pos == 1 and not read and rnd.random() < 0.1:
+                add("start")
+                add("address", {"address": bytes([address]), "read": True})
+
+            if pos == 0 and rnd.random() < 0.9:
+                value = rnd.choice(REGISTERS)
+            elif rnd.random() < 0.3:
+                value = rnd.choice((stusb.PE_SNK_READY, stusb.PE_HARD_RESET, stusb.PE_ERRORRECOVERY, 0x26, 0x0d, 0x10, 0x00))
+            else:
+                value = rnd.randrange(256)
+
+            add("data", {"data": bytes([value])})
+
+        if rnd.random() < 0.02:
+            add("error")
+
+        if rnd.random() < 0.98:
+            add("stop")
+
+    return frames
+
+def random_settings(rnd):
+    settings = {}
+
+    for name, value in vars(Hla).items():
+        if isinstance(value, ChoicesSetting) and name not in UNCOMPARED_SETTINGS:
+            settings[name] = rnd.choice(value.choices)
+
+    if rnd.random() < 0.3:
+        settings["register_filter"] = ", ".join(rnd.sample(list(STUSB_Registers), 3))
+
+    return settings
+
+""" comparison """
+def frame_fields(frame):
+    return {"type": frame.type, "start_time": frame.start_time, "end_time": frame.end_time, "data": frame.data}
+
+def compare(expected, actual):
+    """ None when equal, else (frame index, description of the first difference) """
+    for num, (one, other) in enumerate(zip(expected, actual)):
+        if one.type != other.type or one.start_time != other.start_time or one.end_time != other.end_time or one.data != other.data:
+            one, other = frame_fields(one), frame_fields(other)
+            fields = []
+
+            for name in ("type", "start_time", "end_time"):
+                if one[name] != other[name]:
+                    fields.append("{}: {!r} != {!r}".format(name, one[name], other[name]))
+
+            for key in sorted(set(one["data"]) | set(other["data"])):
+                if one["data"].get(key) != other["data"].get(key):
+                    fields.append("data.{}: {!r} != {!r}".format(key, one["data"].get(key), other["data"].get(key)))
+
+            return num, "; ".join(fields)
+
+    if len(expected) != len(actual):
+        return min(len(expected), len(actual)), "{} frames != {} frames".format(len(expected), len(actual))
+
+    return None
+
+def time_order(frames):
+    """ None when the frames are in time order, else (frame index, description) """
+    for num in range(1, len(frames)):
+        if frames[num].start_time < frames[num - 1].start_time:
+            return num, "out of time order: {} frame at {} after {} frame at {}".format(
+                frames[num].type, frames[num].start_time, frames[num - 1].type, frames[num - 1].start_time)
+
+    return None
+
+def run_engine(engine, frames, settings):
+    """ output frames of an engine, or the exception it raised """
+    stusb._render_cache.clear()
+
+    try:
+        return engine(frames, settings)
+    except Exception as error:
+        return error
+
+def check(expected, actual):
+    """ compare, an exception is a difference """
+    if isinstance(expected, Exception) or isinstance(actual, Exception):
+        if type(expected) == type(actual) and str(expected) == str(actual):
+            return None
+        return 0, "exception: {!r} != {!r}".format(*(value if isinstance(value, Exception) else "frames"
+                                                     for value in (expected, actual)))
+
+    return compare(expected, actual)
+
+def differs(engine, frames, settings):
+    return check(run_engine(run_reference, frames, settings), run_engine(engine, frames, settings)) is not None
+
+def reference_fails(frames, settings):
+    """ the reference raises or gives frames out of time order """
+    out = run_engine(run_reference, frames, settings)
+    return isinstance(out, Exception) or time_order(out) is not None
+
+def shrink(fails, frames, budget=2000):
+    """
+    smaller frame sequence that still fails (removes ever smaller blocks of frames)
+
+    fails : function of a frame sequence, True when it still shows the problem
+    """
+    size = len(frames) // 2
+
+    while size >= 1 and budget > 0:
+        pos = 0
+        removed = False
+
+        while pos < len(frames) and budget > 0:
+            candidate = frames[:pos] + frames[pos + size:]
+            budget -= 1
+
+            if len(candidate) > 0 and fails(candidate):
+                frames = candidate
+                removed = True
+            else:
+                pos += size
+
+        if not removed:
+            size //= 2
+
+    return frames
+
+""" golden output """
+def golden_lines(frames):
+    """ decoded frames as JSON Lines, as offline.py -o writes them """
+    out = io.StringIO()
+    sink = JsonLinesSink(out)
+    sink.write(frames)
+    sink.close()
+    return out.getvalue().splitlines()
+
+def read_golden(directory):
+    """ (capture, settings, expected file) of the golden cases """
+    with open(os.path.join(directory, GOLDEN_MANIFEST)) as file:
+        return [(os.path.join(directory, case["capture"]), case["settings"], os.path.join(directory, case["expected"]))
+                for case in json.load(file)]
+
+def check_golden(directory, update=False):
+    """ decode the golden captures with the reference, returns [(name, settings, frames, difference)] """
+    failures = []
+
+    for capture, settings, expected_file in read_golden(directory):
+        with open(capture, newline='') as file:
+            frames = list(read_export(file))
+
+        out = run_engine(run_reference, frames, settings)
+        name = "golden " + os.path.basename(expected_file)
+
+        if isinstance(out, Exception):
+            failures.append((name, settings, frames, (0, "exception: {!r}".format(out))))
+            continue
+
+        lines = golden_lines(out)
+
+        if update:
+            with open(expected_file, "w") as file:
+                file.write("\n".join(lines) + "\n")
+            continue
+
+        with open(expected_file) as file:
+            expected = file.read().splitlines()
+
+        for num, (line, other) in enumerate(zip(expected, lines)):
+            if line != other:
+                failures.append((name, settings, frames, (num, "expected {} got {}".format(line, other))))
+                break
+        else:
+            if len(expected) != len(lines):
+                failures.append((name, settings, frames, (min(len(expected), len(lines)),
+                                 "{} frames expected, {} frames".format(len(expected), len(lines)))))
+
+    return failures
+
+def format_frame(frame):
+    return "{:>12.6f} {:<8} {}".format(float(frame.start_time), frame.type,
+                                       " ".join("{}={}".format(key, value.hex() if isinstance(value, bytes) else value)
+                                                for key, value in frame.data.items()))
+
+class Harness:
+    """ run the engines against the reference, keep time and differences """
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.time = {name: 0.0 for name in ["reference"] + list(engines)}
+        self.frames = 0
+        self.cases = 0
+        self.failures = []          # (engine name, case name, settings, frames, difference)
+
+    def run(self, name, frames, settings):
+        """ returns False when an engine differs """
+        self.cases += 1
+        self.frames += len(frames)
+
+        begin = time.perf_counter()
+        expected = run_engine(run_reference, frames, settings)
+        self.time["reference"] += time.perf_counter() - begin
+
+        if isinstance(expected, Exception):
+            self.failures.append(("reference", name, settings, frames, (0, "exception: {!r}".format(expected))))
+            return False
+
+        ok = True
+        order = time_order(expected)
+
+        if order is not None:
+            self.failures.append(("reference", name, settings, frames, order))
+            ok = False
+
+        for engine_name, engine in self.engines.items():
+            begin = time.perf_counter()
+            actual = run_engine(engine, frames, settings)
+            self.time[engine_name] += time.perf_counter() - begin
+
+            difference = check(expected, actual)
+
+            if difference is not None:
+                self.failures.append((engine_name, name, settings, frames, difference))
+                ok = False
+
+        return ok
+
+    def report(self, file=sys.stdout):
+        print("{} cases, {} frames".format(self.cases, self.frames), file=file)
+
+        for name, seconds in self.time.items():
+            print("  {:<10} {:8.3f} s {:>12.0f} frames/s".format(name, seconds, self.frames / seconds if seconds > 0 else 0), file=file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the decode engines with Hla.decode")
+    parser.add_argument("corpus", nargs="*", help="I2C analyzer table exports (CSV) to compare on")
+    parser.add_argument("--cases", type=int, default=1000, help="random frame sequences (default 1000)")
+    parser.add_argument("--length", type=int, default=200, help="transactions per random sequence (default 200)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default 1)")
+    parser.add_argument("--random-settings", action="store_true", help="random analyzer settings for each random sequence")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="engines to compare (default " + ",".join(ENGINES) + ")")
+    parser.add_argument("--shrink", type=int, default=2000, help="decode runs to shrink a failing case (default 2000)")
+    parser.add_argument("--golden", default=GOLDEN_DIR, help="directory with the golden captures and output (default golden)")
+    parser.add_argument("--update-golden", action="store_true", help="write the golden output again from the reference")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    if args.update_golden:
+        failures = check_golden(args.golden, update=True)
+
+        for name, case_settings, frames, (index, difference) in failures:
+            print("{}: {}".format(name, difference))
+
+        print("golden output written to", args.golden)
+        sys.exit(1 if failures else 0)
+
+    settings = parse_settings(args.setting)
+
+    for name in UNCOMPARED_SETTINGS:
+        if name in settings:
+            print("setting", name, "is not compared", file=sys.stderr)
+            del settings[name]
+
+    engines = {}
+    for name in args.engines.split(","):
+        if name.strip() not in ENGINES:
+            raise SystemExit("unknown engine: " + name)
+        engines[name.strip()] = ENGINES[name.strip()]
+
+    harness = Harness(engines)
+
+    for name, frames, case_settings in REGRESSIONS:
+        harness.run(name, frames, dict(settings, **case_settings))
+
+    for name, frames, case_settings, expected in EXPECTED:
+        difference = check_expected(run_engine(run_reference, frames, case_settings), expected)
+
+        if difference is not None:
+            harness.failures.append(("reference", name, case_settings, frames, difference))
+
+    if os.path.exists(os.path.join(args.golden, GOLDEN_MANIFEST)):
+        for name, case_settings, frames, difference in check_golden(args.golden):
+            harness.failures.append(("reference", name, case_settings, frames, difference))
+
+    for file_name in args.corpus:
+        with open(file_name, newline='') as file:
+            harness.run(file_name, list(read_export(file)), settings)
+
+    rnd = random.Random(args.seed)
+
+    for num in range(args.cases):
+        case_settings = dict(settings, **random_settings(rnd)) if args.random_settings else settings
+        harness.run("random " + str(num), random_frames(rnd, args.length), case_settings)
+
+    harness.report()
+
+    shown = set()
+
+    for engine_name, name, case_settings, frames, (index, difference) in harness.failures:
+        print("\n{} differs on {}, frame {}: {}".format(engine_name, name, index, difference))
+
+        if name.startswith("random") and engine_name not in shown:
+            shown.add(engine_name)
+
+            # the reference itself fails (raises, time order) : shrink on that, not on a difference
+            if engine_name == "reference":
+                fails = lambda candidate: reference_fails(candidate, case_settings)
+            else:
+                fails = lambda candidate: differs(engines[engine_name], candidate, case_settings)
+
+            frames = shrink(fails, frames, args.shrink)
+            print("minimal case ({} frames), settings {}".format(len(frames), case_settings))
+            for frame in frames:
+                print("  " + format_frame(frame))
+
+    if len(harness.failures) > 0:
+        print("\n{} differences".format(len(harness.failures)))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+'''
+Flight recorder for long STUSB4500 I2C captures
+
+Only the transactions around a fault are written in detail: the last --history transactions before the
+fault and the transactions in the --post-ms window after it (a new fault extends the window). All other
+transactions are summarized in one "summary" frame per gap (time span and count per register). Every
+transaction is decoded in order, so the state, NVM, renegotiation and other trackers see them all; the
+frames are kept in a ring buffer that is allocated once and dropped when they are not shown, so memory and
+output stay flat on a 24 hour capture.
+
+Faults (on the change from no fault) :
+ * PE_FSM : PE_HARD_RESET, PE_HARD_RESET_SHUTDOWN, PE_HARD_RESET_RECOVERY, PE_ERRORRECOVERY
+ * TYPEC_STATUS : TYPEC_ERRORRECOVERY
+ * CC_HW_FAULT_STATUS_1 : VPU_OVP_FAULT, VBUS_DISCH_FAULT
+ * TYPEC_MONITORING_STATUS_0 : VBUS_HIGH_STATUS, VBUS_LOW_STATUS
+
+usage : python flight_recorder.py capture.csv [--history 1000] [--post-ms 500] [-o faults.csv] [-s name=value]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import sys
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import AnalyzerFrame, STUSB_Registers, transaction_access, frame_list
+from offline import make_hla, read_export, parse_settings, open_sink, CsvSink, CHUNK_SIZE
+
+PE_FAULTS = {
+    stusb.PE_HARD_RESET             : 'PE_HARD_RESET',
+    stusb.PE_HARD_RESET_SHUTDOWN    : 'PE_HARD_RESET_SHUTDOWN',
+    stusb.PE_HARD_RESET_RECOVERY    : 'PE_HARD_RESET_RECOVERY',
+    stusb.PE_ERRORRECOVERY          : 'PE_ERRORRECOVERY'
+}
+
+# register : ((bit mask, fault name), ...)
+FAULT_BITS = {
+    stusb.CC_HW_FAULT_STATUS_1      : ((stusb.VPU_OVP_FAULT, 'VPU_OVP_FAULT'), (stusb.VBUS_DISCH_FAULT, 'VBUS_DISCH_FAULT')),
+    stusb.TYPEC_MONITORING_STATUS_0 : ((stusb.VBUS_HIGH_STATUS, 'VBUS_HIGH_STATUS'), (stusb.VBUS_LOW_STATUS, 'VBUS_LOW_STATUS'))
+}
+
+def fault_name(register, value):
+    """ the fault a register value shows, None : no fault """
+    if register == stusb.PE_FSM:
+        return PE_FAULTS.get(value)
+
+    if register == stusb.TYPEC_STATUS:
+        if value & 0x1f == stusb.TYPEC_ERRORRECOVERY:
+            return 'TYPEC_ERRORRECOVERY'
+        return None
+
+    names = [name for mask, name in FAULT_BITS.get(register, ()) if value & mask]
+
+    return ", ".join(names) if names else None
+
+class FlightRecorder:
+    """ decode a capture, detailed frames around the faults and summary frames for the rest """
+
+    def __init__(self, sinks, history=1000, post=0.5, settings=None):
+        self.sinks = sinks
+        self.hla = make_hla(settings or {})
+        self.size = max(history, 1)
+        self.transactions = [None] * self.size      # ring buffer of (raw transaction, register, output frames)
+        self.next = 0                               # position of the next transaction in the ring
+        self.used = 0                               # transactions in the ring
+        self.post = post                            # seconds shown after a fault
+        self.until = None                           # end of the current post-fault window
+        self.last_fault = {}                        # (address, register) : last fault name (None : no fault)
+        self.faults = []                            # (time, address, register, fault name)
+        self.chunk = []
+        self.gap = None                             # [first, last, count, {register : count}] not shown
+
+    def add_frames(self, frames):
+        hla = self.hla
+
+        for frame in frames:
+            tr = hla.collect(frame)
+
+            if tr is not None:
+                self.add(tr, hla.render(tr))
+
+    def add(self, tr, rendered):
+        """ add a decoded raw transaction, the output is made for every transaction (trackers) """
+        out = self.hla.emit(tr, rendered)
+        fault = self.check_fault(tr)
+
+        if fault is not None:
+            if self.until is None:
+                self.flush_history()
+            self.until = float(tr[1]) + self.post
+
+        if self.until is not None:
+            self.output(out)
+
+            if float(tr[1]) >= self.until:
+                self.until = None
+            return
+
+        # ring buffer : the oldest transaction goes into the summary
+        if self.used == self.size:
+            self.add_gap(*self.transactions[self.next])
+        else:
+            self.used += 1
+
+        self.transactions[self.next] = (tr, rendered[3], out)
+        self.next = (self.next + 1) % self.size
+
+    def check_fault(self, tr):
+        register, values, is_read = transaction_access(tr)
+
+        if not is_read or len(values) == 0:
+            return None
+
+        if register != stusb.PE_FSM and register != stusb.TYPEC_STATUS and register not in FAULT_BITS:
+            return None
+
+        name = fault_name(register, values[0])
+        last = self.last_fault.get((tr[2], register))
+        self.last_fault[(tr[2], register)] = name
+
+        if name is None or name == last:
+            return None
+
+        self.faults.append((float(tr[0]), tr[2], register, name))
+        return name
+
+    def add_gap(self, tr, register, out):
+        """ a transaction that is not shown, its frames are dropped """
+        if self.gap is None:
+            self.gap = [tr[0], tr[1], 0, {}]
+
+        self.gap[1] = tr[1]
+        self.gap[2] += 1
+        self.gap[3][register] = self.gap[3].get(register, 0) + 1
+
+    def flush_history(self):
+        """ summary of the gap, then the transactions in the ring in detail """
+        self.flush_gap()
+
+        first = (self.next - self.used) % self.size
+
+        for num in range(self.used):
+            pos = (first + num) % self.size
+            self.output(self.transactions[pos][2])
+            self.transactions[pos] = None
+
+        self.used = 0
+
+    def flush_gap(self):
+        if self.gap is None:
+            return
+
+        first, last, count, registers = self.gap
+        self.gap = None
+        counts = sorted(registers.items(), key=lambda item: -item[1])
+
+        self.output(AnalyzerFrame("summary", first, last, {
+            "description": str(count) + " transactions not shown",
+            "count": count,
+            "registers": ", ".join(STUSB_Registers.get(register, str(register) + ": ").strip(": ") + "=" + str(n)
+                                   for register, n in counts)
+        }))
+
+    def output(self, out):
+        if out is None:
+            return
+
+        self.chunk += frame_list(out)
+
+        if len(self.chunk) >= CHUNK_SIZE:
+            for sink in self.sinks:
+                sink.write(self.chunk)
+            self.chunk = []
+
+    def close(self):
+        """ summary of the transactions after the last fault, write the last chunk """
+        first = (self.next - self.used) % self.size
+
+        for num in range(self.used):
+            self.add_gap(*self.transactions[(first + num) % self.size])
+
+        self.used = 0
+        self.flush_gap()
+
+        if len(self.chunk) > 0:
+            for sink in self.sinks:
+                sink.write(self.chunk)
+            self.chunk = []
+
+        for sink in self.sinks:
+            sink.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detailed frames around the faults in a STUSB4500 capture")
+    parser.add_argument("capture", help="I2C analyzer table export (CSV) from Logic 2")
+    parser.add_argument("--history", type=int, default=1000, help="transactions shown before a fault (default 1000)")
+    parser.add_argument("--post-ms", type=float, default=500.0, help="time shown after a fault (default 500 ms)")
+    parser.add_argument("-o", "--output", action="append",
+                        help="output file, CSV, JSON Lines (.jsonl) or columnar batches (.columns.json), can be repeated (default CSV on stdout)")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    files = [open(name, "w", newline='', buffering=1 << 20) for name in args.output or []]
+    sinks = [open_sink(name, file) for name, file in zip(args.output or [], files)] or [CsvSink(sys.stdout)]
+
+    try:
+        recorder = FlightRecorder(sinks, args.history, args.post_ms / 1000, parse_settings(args.setting))
+
+        with open(args.capture, newline='') as file:
+            recorder.add_frames(read_export(file))
+
+        recorder.close()
+    finally:
+        for file in files:
+            file.close()
+
+    for time, address, register, name in recorder.faults:
+        print("{:>14.6f} s  {}  {}: {}".format(time, "?" if address is None else hex(address),
+              STUSB_Registers[register].strip(": "), name), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+'''
+Generate the STUSB4500 register tables from the header files in extras
+
+Parses extras/STUSB4500_register.h (register addresses, access, bit fields) and extras/STUSB_NVM.h (NVM
+default content) and writes stusb4500_tables.py: plain literals only, so importing it is a constant time
+load of the cached byte code. HighLevelAnalyzer.py completes its register names from it.
+
+Run it again after a header change. With --check the hand kept names in HighLevelAnalyzer.py are compared
+with the header (nothing is written).
+
+usage : python gen_tables.py [-o stusb4500_tables.py] [--check]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import os
+import pprint
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REGISTER_HEADER = os.path.join(HERE, "extras", "STUSB4500_register.h")
+NVM_HEADER = os.path.join(HERE, "extras", "STUSB_NVM.h")
+OUTPUT = os.path.join(HERE, "stusb4500_tables.py")
+
+# defines that are a register address, but have no typedef, @Address or size comment in the header
+ADDRESS_DEFINES = (
+    "STUSB_GEN1S_MONITORING_CTRL_0",
+    "STUSB_GEN1S_MONITORING_CTRL_2",
+    "PE_FSM",
+    "RX_BYTE_CNT",
+    "TX_BYTE_CNT",
+    "TX_HEADER_LOW",
+    "TX_HEADER_HIGH",
+    "TX_DATA_OBJ1",
+    "TX_DATA_OBJ2",
+    "TX_DATA_OBJ3",
+    "TX_DATA_OBJ4",
+    "TX_DATA_OBJ5",
+    "TX_DATA_OBJ6",
+    "TX_DATA_OBJ7",
+    "DPM_PDO_NUMB",
+    "REG_DEVICE_ID",
+    "FTP_CUST_PASSWORD_REG",
+    "FTP_CTRL_0",
+    "FTP_CTRL_1",
+    "RW_BUFFER"
+)
+
+# errors in the header : name : (address, size)
+ERRATA = {
+    "RX_DATA_OBJ5": (0x43, 4),      # header has 0x33 (RX_DATA_OBJ1)
+    "RX_DATA_OBJ6": (0x47, 4),      # header has 0x37 (RX_DATA_OBJ2)
+    "TX_DATA_OBJ1": (0x53, 4),      # the data objects are 32 bit, no size in the header
+    "TX_DATA_OBJ2": (0x57, 4),
+    "TX_DATA_OBJ3": (0x5b, 4),
+    "TX_DATA_OBJ4": (0x5f, 4),
+    "TX_DATA_OBJ5": (0x63, 4),
+    "TX_DATA_OBJ6": (0x67, 4),
+    "TX_DATA_OBJ7": (0x6b, 4),
+}
+
+# registers missing in the header (register map) : name : (address, size, access)
+MISSING = {
+    "DPM_SNK_PDO2": (0x89, 4, "R/W"),
+    "DPM_SNK_PDO3": (0x8d, 4, "R/W"),
+}
+
+# name prefixes that are left out
+PREFIXES = ("STUSB_GEN1S_", "REG_")
+
+re_define = re.compile(r'#define\s+(\w+)\s+(?:\(uint8_t\))?(0x[0-9a-fA-F]+)\b\s*(.*)$')
+re_address = re.compile(r'@Address:\s*([0-9a-fA-F]+)h')
+re_access = re.compile(r'@Access:\s*([\w/]+)')
+re_field = re.compile(r'uint(8|32)_t\s+(\w+)\s*:\s*(\d+)\s*;')
+re_size = re.compile(r'\((16|32)bits?\)')
+re_sector = re.compile(r'Sector(\d+)\s*\[\s*\d+\s*\]\s*=\s*\{([^}]*)\}')
+
+def short_name(name):
+    for prefix in PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+def parse_registers(text):
+    """
+    returns list of (name, address, size, access, fields) in header order
+
+    fields : tuple of (name, bit offset, width) of the first struct in the typedef
+    """
+    registers = []
+    group = []                      # defines since the last other line : (name, address, comment)
+    address = access = None         # from the last comment block
+    lines = text.splitlines()
+    num = 0
+
+    while num < len(lines):
+        line = lines[num].strip()
+        num += 1
+
+        match = re_address.search(line)
+        if match:
+            address = int(match.group(1), 16)
+            continue
+
+        match = re_access.search(line)
+        if match:
+            access = match.group(1)
+            continue
+
+        match = re_define.match(line)
+        if match:
+            name, value, comment = match.group(1), int(match.group(2), 16), match.group(3)
+            group.append((name, value, comment))
+            size = re_size.search(comment)
+
+            if name in ERRATA:
+                registers.append([name, ERRATA[name][0], ERRATA[name][1], None, ()])
+            elif size:
+                registers.append([name, value, int(size.group(1)) // 8, None, ()])
+            elif name in ADDRESS_DEFINES or value == address:
+                registers.append([name, value, 1, access if value == address else None, ()])
+            continue
+
+        if line.startswith("typedef union"):
+            body = []
+            while not lines[num].startswith("}"):
+                body.append(lines[num])
+                num += 1
+            type_name = lines[num].strip("} ;\n")
+
+            fields = []
+            offset = 0
+            width32 = False
+
+            for item in body:
+                if "d32" in item:
+                    width32 = True
+
+                # the first struct only (alternative layouts follow)
+                if item.strip().startswith("}") and len(fields) > 0:
+                    break
+
+                match = re_field.search(item)
+                if match:
+                    fields.append((match.group(2), offset, int(match.group(3))))
+                    offset += int(match.group(3))
+
+            # register of the typedef : named in the typedef name, else the last define before it
+            owner = None
+            for define in group:
+                if define[0] in type_name:
+                    owner = define
+            if owner is None and len(group) > 0:
+                owner = group[-1]
+
+            if owner is not None:
+                reg = [r for r in registers if r[0] == owner[0]]
+                if len(reg) == 0:
+                    reg = [[owner[0], owner[1], 1, access if owner[1] == address else None, ()]]
+                    registers.append(reg[0])
+                reg[0][2] = 4 if width32 else reg[0][2]
+                reg[0][4] = tuple(fields)
+
+            group = []
+            continue
+
+        if line and not line.startswith(("//", "/*", "*")):
+            group = []
+
+    for name, (addr, size, acc) in MISSING.items():
+        registers.append([name, addr, size, acc, ()])
+
+    return registers
+
+def byte_names(name, size):
+    """ name of each byte of a register """
+    if size == 1:
+        return (name,)
+
+    if size == 2:
+        return (name + "_LOW", name + "_HIGH")
+
+    return tuple(name + "_" + str(n) for n in range(size))
+
+def build_tables(registers):
+    """
+    returns (registers, fields, conflicts)
+
+    registers : hex address : (names, access, first address of the register, size)
+    fields    : hex address of the register : bit fields
+    """
+    table = {}
+    fields = {}
+    conflicts = []
+
+    for name, address, size, access, bits in registers:
+        name = short_name(name)
+
+        for pos, byte_name in enumerate(byte_names(name, size)):
+            key = hex(address + pos)
+
+            if key in table:
+                names, acc, first, length = table[key]
+
+                if byte_name not in names:
+                    conflicts.append((key, names[0], byte_name))
+                    table[key] = (names + (byte_name,), acc or access, first, length)
+            else:
+                table[key] = ((byte_name,), access, hex(address), size)
+
+        if len(bits) > 0:
+            fields.setdefault(hex(address), bits)
+
+    return dict(sorted(table.items(), key=lambda item: int(item[0], 16))), fields, conflicts
+
+def parse_nvm(text):
+    """ NVM default content by sector """
+    sectors = {}
+
+    for match in re_sector.finditer(text):
+        sectors[int(match.group(1))] = tuple(int(value, 0) for value in match.group(2).split(","))
+
+    return tuple(sectors[num] for num in sorted(sectors))
+
+def write_module(file, table, fields, nvm):
+    print("# Generated by gen_tables.py from extras/STUSB4500_register.h and extras/STUSB_NVM.h, do not edit", file=file)
+    print(file=file)
+    print("# hex address : (names, access, address of the first byte, size in bytes)", file=file)
+    print("REGISTERS =", pprint.pformat(table, width=120, sort_dicts=False), file=file)
+    print(file=file)
+    print("# hex address : bit fields (name, bit offset, width)", file=file)
+    print("FIELDS =", pprint.pformat(fields, width=120, sort_dicts=False), file=file)
+    print(file=file)
+    print("# NVM default content by sector", file=file)
+    print("NVM_SECTORS =", pprint.pformat(nvm, width=120), file=file)
+
+def check(table):
+    """ compare the register names in HighLevelAnalyzer.py with the header, returns the number of differences """
+    from HighLevelAnalyzer import STUSB_Registers
+
+    count = 0
+    for key, name in STUSB_Registers.items():
+        name = name.strip(": ")
+
+        if key not in table:
+            print(key, name, ": not in header")
+            count += 1
+        elif name not in table[key][0]:
+            print(key, name, ": header", ", ".join(table[key][0]))
+            count += 1
+
+    for key in table:
+        if key not in STUSB_Registers:
+            print(key, ", ".join(table[key][0]), ": no name in HighLevelAnalyzer.py")
+
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the STUSB4500 register tables from the headers")
+    parser.add_argument("-o", "--output", default=OUTPUT, help="table module (default stusb4500_tables.py)")
+    parser.add_argument("--check", action="store_true", help="compare the names in HighLevelAnalyzer.py with the header")
+    args = parser.parse_args(argv)
+
+    with open(REGISTER_HEADER) as file:
+        table, fields, conflicts = build_tables(parse_registers(file.read()))
+
+    with open(NVM_HEADER) as file:
+        nvm = parse_nvm(file.read())
+
+    for key, first, other in conflicts:
+        print("address", key, "is", first, "and", other, file=sys.stderr)
+
+    if args.check:
+        sys.exit(1 if check(table) else 0)
+
+    with open(args.output, "w") as file:
+        write_module(file, table, fields, nvm)
+
+    print(len(table), "register addresses,", len(fields), "with bit fields,", len(nvm), "NVM sectors", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
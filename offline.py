@@ -0,0 +1,638 @@
+'''
+Offline decoding of STUSB4500 I2C traffic
+
+Decodes an I2C capture that was exported from Logic 2 (I2C analyzer, export table as CSV) with the same
+decoder as the High Level Analyzer, but without the need to run Logic 2.
+
+The raw transactions (address, register, data bytes, timestamps) are kept next to the decoded output.
+After a setting change only the transactions on the registers that depend on that setting are rendered
+again (see SETTING_REGISTERS in HighLevelAnalyzer.py), everything else is reused.
+
+The decoded frames are handed in chunks to the output sinks (CSV, JSON Lines, columnar batches), each
+sink collects a batch and writes it at once. Several sinks can be attached to one decode pass, the capture
+is read and decoded once.
+
+With --pipeline reading, decoding and writing run in their own thread, connected by bounded queues of
+chunks, so reading and writing the files overlap with decoding. --stats shows per stage the time busy and
+waiting, the throughput and the queue depth: the stage that is busy all the time limits the throughput.
+
+usage : python offline.py capture.csv [-s power_units="mV / mA"] [-s register_filter="PE_FSM, 0x91"]
+                                      [-s state_display="transitions only"] [-s read_display=combined]
+                                      [-s trigger="hard reset"] [-s nvm_timing="all operations"] [-s nvm_slow_ms=5]
+                                      [-s renegotiation_timing="all attempts"] [-s sink_capabilities="on change"]
+                                      [-s anomalies=on] [-s anomaly_sigma=4]
+                                      [-s sampling="unchanged polls, adaptive"] [-s sample_budget_ms=50]
+                                      [-o decoded.csv] [-o decoded.jsonl] [-o decoded.columns.json]
+                                      [--pipeline [--queue 8] [--stats]]
+
+python offline.py --help lists all settings with their values, taken from the analyzer.
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import array
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+from HighLevelAnalyzer import Hla, AnalyzerFrame, NumberSetting, ChoicesSetting, SETTING_REGISTERS, STUSB_Registers, SAMPLING_OFF
+
+def read_export(file):
+    """ read an I2C table export from Logic 2 and yield the frames as the I2C analyzer provides them """
+    for row in csv.DictReader(file):
+        yield parse_row(row)
+
+def parse_row(row):
+    """ one row of the I2C table export (as dictionary) to a frame """
+    row = {key.strip().lower(): value.strip() for key, value in row.items() if key is not None and value is not None}
+
+    start = float(row["start_time"])
+    end = start + float(row.get("duration") or 0)
+    frame_type = row["type"]
+
+    if frame_type == "address":
+        data = {
+            "address": bytes([int(row["address"], 0)]),
+            "read": row.get("read", "").lower() == "true",
+            "ack": row.get("ack", "").lower() == "true"
+        }
+
+    elif frame_type == "data":
+        data = {
+            "data": bytes([int(row["data"], 0)]),
+            "ack": row.get("ack", "").lower() == "true"
+        }
+
+    else:
+        data = {}
+
+    return AnalyzerFrame(frame_type, start, end, data)
+
+def parse_rows(header, rows):
+    """ rows (lists) of the I2C table export to frames, as parse_row but with the columns looked up once """
+    columns = {key.strip().lower(): num for num, key in enumerate(header)}
+    frame_type = columns["type"]
+    start_time = columns["start_time"]
+    duration = columns.get("duration")
+    address = columns.get("address")
+    read = columns.get("read")
+    ack = columns.get("ack")
+    data = columns.get("data")
+    width = len(header)
+    frames = []
+
+    for row in rows:
+        if len(row) < width:
+            frames.append(parse_row(dict(zip(header, row))))
+            continue
+
+        start = float(row[start_time])
+        end = start + float(row[duration].strip() or 0) if duration is not None else start
+        kind = row[frame_type].strip()
+
+        if kind == "address":
+            values = {
+                "address": bytes([int(row[address], 0)]),
+                "read": read is not None and row[read].strip().lower() == "true",
+                "ack": ack is not None and row[ack].strip().lower() == "true"
+            }
+
+        elif kind == "data":
+            values = {
+                "data": bytes([int(row[data], 0)]),
+                "ack": ack is not None and row[ack].strip().lower() == "true"
+            }
+
+        else:
+            values = {}
+
+        frames.append(AnalyzerFrame(kind, start, end, values))
+
+    return frames
+
+def make_hla(settings):
+    """ create an Hla with settings, like Logic 2 does: settings are available before __init__ """
+    hla = Hla.__new__(Hla)
+
+    for name, value in vars(Hla).items():
+        if hasattr(value, "default"):
+            setattr(hla, name, settings.get(name, value.default))
+
+    hla.__init__()
+    return hla
+
+# frames handed to the sinks at once
+CHUNK_SIZE = 1024
+
+class OfflineDecoder:
+    """ decode a capture and keep the raw transactions to re-render after a setting change """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.rendered = []                  # rendered transaction for each raw transaction (None : not rendered)
+        self.frames = []                    # output (None, frame or list of frames) for each raw transaction
+        self.hla = make_hla(settings)
+        self.hla.transaction_log = []
+
+    @property
+    def transactions(self):
+        return self.hla.transaction_log
+
+    def decode(self, frames, sinks=(), chunk_size=CHUNK_SIZE):
+        """ decode frames from the I2C analyzer, the decoded frames are written to the sinks in chunks """
+        hla = self.hla
+        chunk = []
+
+        for frame in frames:
+            tr = hla.collect(frame)
+
+            if tr is not None:
+                # when sampling the skipped reads are not rendered (None)
+                rendered = hla.render(tr) if hla.sampling == SAMPLING_OFF else None
+                out = hla.emit(tr, rendered)
+                self.rendered.append(rendered)
+                self.frames.append(out)
+
+                if out is None or len(sinks) == 0:
+                    continue
+
+                if isinstance(out, list):
+                    chunk.extend(out)
+                else:
+                    chunk.append(out)
+
+                if len(chunk) >= chunk_size:
+                    for sink in sinks:
+                        sink.write(chunk)
+                    chunk = []
+
+        if len(chunk) > 0:
+            for sink in sinks:
+                sink.write(chunk)
+
+    def decode_file(self, file_name, sinks=()):
+        with open(file_name, newline='') as file:
+            self.decode(read_export(file), sinks)
+
+    def change_settings(self, **changes):
+        """
+        apply new settings, render again only the transactions on the affected registers
+
+        returns the number of transactions that were rendered again
+        """
+        affected = set()
+
+        for name, value in changes.items():
+            if name not in SETTING_REGISTERS:
+                raise ValueError("unknown setting " + name)
+
+            if self.settings.get(name, getattr(Hla, name).default) == value:
+                continue
+
+            if SETTING_REGISTERS[name] is None:
+                affected = None
+            elif affected is not None:
+                affected.update(SETTING_REGISTERS[name])
+
+        self.settings.update(changes)
+
+        log = self.hla.transaction_log
+        self.hla = make_hla(self.settings)
+        self.hla.transaction_log = log
+
+        count = 0
+
+        for num in range(len(log)):
+            tr = log[num]
+
+            # the device context is selected in render, also for the transactions that are not rendered again
+            if tr[2] is not None and tr[2] != self.hla.device:
+                self.hla.select_device(tr[2])
+
+            if self.rendered[num] is None or affected is None or self.rendered[num][3] in affected:
+                self.rendered[num] = self.hla.render(tr)
+                count += 1
+
+            # output only, the events (transitions, triggers) are replayed on every transaction
+            self.frames[num] = self.hla.emit(tr, self.rendered[num])
+
+        return count
+
+    def output(self):
+        """ the decoded frames """
+        for out in self.frames:
+            if isinstance(out, list):
+                yield from out
+            elif out is not None:
+                yield out
+
+# frame data fields with their own column, the other fields go into the info column
+CSV_FIELDS = ("address", "description", "action", "data")
+
+def frame_info(frame):
+    return "; ".join(key + "=" + str(value) for key, value in frame.data.items() if key not in CSV_FIELDS)
+
+""" output sinks """
+class Sink:
+    """
+    Output of a decode pass
+
+    write() receives a chunk (list) of decoded frames, the frames are collected and written as one batch
+    when batch_size is reached. close() writes the last batch.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.batch = []
+        self.count = 0
+
+    def write(self, frames):
+        self.batch.extend(frames)
+        self.count += len(frames)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.batch) > 0:
+            self.write_batch(self.batch)
+            self.batch = []
+
+    def write_batch(self, frames):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+class CsvSink(Sink):
+    """ CSV, the columns of CSV_FIELDS and an info column with the other frame data """
+
+    def __init__(self, file, batch_size=8192):
+        super().__init__(batch_size)
+        self.file = file
+        self.out = csv.writer(file)
+        self.out.writerow(["start", "end", "type"] + list(CSV_FIELDS) + ["info"])
+
+    def write_batch(self, frames):
+        self.out.writerows([frame.start_time, frame.end_time, frame.type] + [frame.data.get(key, "") for key in CSV_FIELDS] +
+                           [frame_info(frame)] for frame in frames)
+
+class JsonLinesSink(Sink):
+    """ one JSON object per frame : start, end, type and the frame data """
+
+    def __init__(self, file, batch_size=8192):
+        super().__init__(batch_size)
+        self.file = file
+
+    def write_batch(self, frames):
+        self.file.write("".join(json.dumps({"start": float(frame.start_time), "end": float(frame.end_time),
+                                            "type": frame.type, "data": frame.data}, default=str) + "\n"
+                                for frame in frames))
+
+class ColumnarSink(Sink):
+    """
+    Columnar batches : a dictionary with an array or list per field, for each batch
+
+    start / end are arrays of float, the other fields lists. A batch is handed to on_batch (e.g. to build a
+    data frame), else it is written as one JSON line to file, else kept in batches.
+    """
+
+    COLUMNS = ("type",) + CSV_FIELDS + ("info",)
+
+    def __init__(self, file=None, batch_size=65536, on_batch=None):
+        super().__init__(batch_size)
+        self.file = file
+        self.on_batch = on_batch
+        self.batches = []
+
+    def write_batch(self, frames):
+        batch = {
+            "start": array.array('d', [float(frame.start_time) for frame in frames]),
+            "end": array.array('d', [float(frame.end_time) for frame in frames]),
+            "type": [frame.type for frame in frames],
+            "info": [frame_info(frame) for frame in frames]
+        }
+
+        for key in CSV_FIELDS:
+            batch[key] = [str(frame.data.get(key, "")) for frame in frames]
+
+        if self.on_batch is not None:
+            self.on_batch(batch)
+        elif self.file is not None:
+            batch["start"] = batch["start"].tolist()
+            batch["end"] = batch["end"].tolist()
+            self.file.write(json.dumps(batch) + "\n")
+        else:
+            self.batches.append(batch)
+
+def open_sink(file_name, file):
+    """ sink for the file name extension : .jsonl, .columns.json or else CSV """
+    if file_name.endswith(".jsonl"):
+        return JsonLinesSink(file)
+
+    if file_name.endswith(".columns.json"):
+        return ColumnarSink(file)
+
+    return CsvSink(file)
+
+def write_frames(frames, file):
+    """ write decoded frames as CSV """
+    sink = CsvSink(file)
+
+    for frame in frames:
+        sink.write((frame,))
+
+    sink.close()
+
+""" pipelined decoding """
+READ_BLOCK = 1 << 20        # bytes of the export parsed at once
+
+def frame_chunks(frames, size=CHUNK_SIZE):
+    """ lists of at most size frames """
+    chunk = []
+
+    for frame in frames:
+        chunk.append(frame)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+class StageStats:
+    """ instrumentation of a pipeline stage """
+
+    __slots__ = ("name", "items", "chunks", "busy", "wait_in", "wait_out", "depth_total", "depth_max")
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0              # frames handled
+        self.chunks = 0
+        self.busy = 0.0             # seconds working
+        self.wait_in = 0.0          # seconds waiting for input
+        self.wait_out = 0.0         # seconds waiting for room in the output queue
+        self.depth_total = 0        # output queue depth, summed at each put
+        self.depth_max = 0
+
+    def put(self, out, chunk):
+        """ put a chunk in the output queue, with the depth and the time blocked """
+        depth = out.qsize()
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+        begin = time.perf_counter()
+        out.put(chunk)
+        self.wait_out += time.perf_counter() - begin
+
+    def report(self):
+        rate = self.items / self.busy if self.busy > 0 else 0
+        depth = self.depth_total / self.chunks if self.chunks > 0 else 0
+
+        return "{:<8} {:>10} frames {:>7} chunks  busy {:8.3f} s  wait in {:8.3f} s  wait out {:8.3f} s  {:>10.0f} frames/s  queue {:5.1f} mean {:3} max".format(
+            self.name, self.items, self.chunks, self.busy, self.wait_in, self.wait_out, rate, depth, self.depth_max)
+
+class PipelineDecoder:
+    """
+    Decode a capture export in three threads : read (parse blocks of the export into frames), decode (Hla)
+    and write (sinks). The stages pass chunks of frames through bounded queues.
+    """
+
+    def __init__(self, queue_size=8, **settings):
+        self.hla = make_hla(settings)
+        self.queue_size = queue_size
+        self.stats = [StageStats("read"), StageStats("decode"), StageStats("write")]
+        self.error = None
+
+    def read_blocks(self, file_name):
+        """ frames of the export, a chunk for each block """
+        with open(file_name, newline='') as file:
+            header = next(csv.reader([file.readline()]))
+
+            while True:
+                lines = file.readlines(READ_BLOCK)
+
+                if len(lines) == 0:
+                    break
+
+                yield parse_rows(header, csv.reader(lines))
+
+    def read_stage(self, chunks, out):
+        stats = self.stats[0]
+
+        try:
+            while True:
+                begin = time.perf_counter()
+                chunk = next(chunks, None)
+
+                if chunk is None:
+                    break
+
+                stats.items += len(chunk)
+                stats.chunks += 1
+                stats.busy += time.perf_counter() - begin
+                stats.put(out, chunk)
+        except Exception as error:
+            self.error = error
+        finally:
+            out.put(None)
+
+    def decode_stage(self, source, out):
+        stats = self.stats[1]
+        hla = self.hla
+
+        try:
+            while True:
+                begin = time.perf_counter()
+                frames = source.get()
+                stats.wait_in += time.perf_counter() - begin
+
+                if frames is None:
+                    break
+
+                begin = time.perf_counter()
+                chunk = []
+
+                for frame in frames:
+                    tr = hla.collect(frame)
+
+                    if tr is not None:
+                        result = hla.emit(tr)
+
+                        if isinstance(result, list):
+                            chunk.extend(result)
+                        elif result is not None:
+                            chunk.append(result)
+
+                stats.busy += time.perf_counter() - begin
+
+                if len(chunk) > 0:
+                    stats.items += len(chunk)
+                    stats.chunks += 1
+                    stats.put(out, chunk)
+        except Exception as error:
+            self.error = error
+
+            # let the reader finish
+            while source.get() is not None:
+                pass
+        finally:
+            out.put(None)
+
+    def write_stage(self, source, sinks):
+        stats = self.stats[2]
+
+        try:
+            while True:
+                begin = time.perf_counter()
+                chunk = source.get()
+                stats.wait_in += time.perf_counter() - begin
+
+                if chunk is None:
+                    break
+
+                begin = time.perf_counter()
+                for sink in sinks:
+                    sink.write(chunk)
+                stats.items += len(chunk)
+                stats.chunks += 1
+                stats.busy += time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            for sink in sinks:
+                sink.flush()
+            stats.busy += time.perf_counter() - begin
+        except Exception as error:
+            self.error = error
+
+            while source.get() is not None:
+                pass
+
+    def decode_file(self, file_name, sinks):
+        self.run(self.read_blocks(file_name), sinks)
+
+    def decode(self, frames, sinks):
+        """ decode frames from the I2C analyzer """
+        self.run(frame_chunks(frames), sinks)
+
+    def run(self, chunks, sinks):
+        """ chunks : iterator of lists of frames """
+        frames = queue.Queue(self.queue_size)
+        decoded = queue.Queue(self.queue_size)
+
+        threads = [
+            threading.Thread(target=self.read_stage, args=(chunks, frames), name="read"),
+            threading.Thread(target=self.decode_stage, args=(frames, decoded), name="decode"),
+            threading.Thread(target=self.write_stage, args=(decoded, sinks), name="write")
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        """ per stage instrumentation as text lines """
+        return [stats.report() for stats in self.stats]
+
+def parse_settings(items):
+    """ name=value pairs to settings dictionary """
+    settings = {}
+
+    for item in items or []:
+        name, sep, value = item.partition("=")
+
+        if sep == "" or not hasattr(Hla, name.strip()):
+            raise SystemExit("invalid setting: " + item)
+
+        name = name.strip()
+
+        if isinstance(getattr(Hla, name), NumberSetting):
+            settings[name] = float(value)
+        else:
+            settings[name] = value.strip()
+
+    return settings
+
+def settings_help():
+    """ the analyzer settings and their values, for -s """
+    lines = ["analyzer settings (-s name=value):"]
+
+    for name, value in vars(Hla).items():
+        if isinstance(value, ChoicesSetting):
+            lines.append("  {:<22} {}".format(name, " | ".join('"{}"'.format(choice) for choice in value.choices)))
+        elif isinstance(value, NumberSetting):
+            lines.append("  {:<22} number, {}".format(name, value.label))
+        elif hasattr(value, "default"):
+            lines.append("  {:<22} text, {}".format(name, value.label))
+
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode an exported I2C capture of an STUSB4500",
+                                     epilog=settings_help(), formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="I2C analyzer table export (CSV) from Logic 2")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    parser.add_argument("-o", "--output", action="append",
+                        help="output file, CSV, JSON Lines (.jsonl) or columnar batches (.columns.json), can be repeated (default CSV on stdout)")
+    parser.add_argument("--pipeline", action="store_true", help="read, decode and write in separate threads")
+    parser.add_argument("--queue", type=int, default=8, help="chunks in each pipeline queue (default 8)")
+    parser.add_argument("--stats", action="store_true", help="show the pipeline stage statistics")
+    args = parser.parse_args(argv)
+
+    if args.pipeline:
+        decoder = PipelineDecoder(max(args.queue, 1), **parse_settings(args.setting))
+    else:
+        decoder = OfflineDecoder(**parse_settings(args.setting))
+
+    files = [open(name, "w", newline='', buffering=1 << 20) for name in args.output or []]
+    sinks = [open_sink(name, file) for name, file in zip(args.output or [], files)] or [CsvSink(sys.stdout)]
+
+    try:
+        decoder.decode_file(args.capture, sinks)
+
+        for sink in sinks:
+            sink.close()
+    finally:
+        for file in files:
+            file.close()
+
+    if args.pipeline and args.stats:
+        print("\n".join(decoder.report()), file=sys.stderr)
+
+    devices = decoder.hla.device_contexts()
+
+    for address, context in devices.items():
+        if len(devices) > 1 and (context.sampler is not None or context.nvm is not None or context.renegotiation is not None
+                                 or context.capabilities is not None or context.anomalies is not None):
+            print("device", hex(address), file=sys.stderr)
+
+        if context.sampler is not None:
+            for register, count in sorted(context.sampler.counts.items(), key=lambda item: -item[1]):
+                print("{:<30} {:>10} transactions {:>10} skipped".format(STUSB_Registers.get(register, str(register)).strip(": "),
+                      count, context.sampler.skipped_total.get(register, 0)), file=sys.stderr)
+
+        if context.nvm is not None and len(context.nvm.stats) > 0:
+            print("\n".join(context.nvm.report()), file=sys.stderr)
+
+        if context.renegotiation is not None and len(context.renegotiation.stats) > 0:
+            print("\n".join(context.renegotiation.report()), file=sys.stderr)
+
+        if context.capabilities is not None:
+            print("sink capability changes :", context.capabilities.changes, file=sys.stderr)
+
+        if context.anomalies is not None:
+            print("anomalies :", ", ".join("{} {}".format(kind, count) for kind, count in sorted(context.anomalies.counts.items()))
+                  or "none", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
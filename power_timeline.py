@@ -0,0 +1,197 @@
+'''
+Power contract timeline of a STUSB4500 I2C capture
+
+Records the negotiated contract from RDO_REG_STATUS_0 (object position, voltage, current, capability
+mismatch) and the sink PDOs the MCU writes, with their time stamps. Every series keeps at most a fixed
+number of points: when it is full, neighbouring buckets are merged (bucket width doubles), keeping the min,
+max and last value of each bucket. A 24 hour soak capture gives the same compact timeline size as a short
+one, to plot min / max bands.
+
+usage : python power_timeline.py capture.csv [--points 1000] [--csv timeline.csv] [--json timeline.json]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import collections
+import csv
+import json
+import sys
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import STUSB_Registers, transaction_access
+from offline import make_hla, read_export, parse_settings
+from batch import power, SNK_PDO_REGISTERS
+
+class MinMaxSeries:
+    """ time series downsampled to at most points buckets, min / max / last value per bucket """
+
+    def __init__(self, points=1000, width=0.001):
+        self.points = points
+        self.width = width          # bucket width (seconds), doubles when the series is full
+        self.buckets = []           # [bucket index, first time, last time, min, max, last, count]
+        self.count = 0
+
+    def add(self, time, value):
+        time = float(time)
+        index = int(time // self.width)
+        self.count += 1
+
+        if len(self.buckets) > 0 and self.buckets[-1][0] == index:
+            self.add_to_last(time, value)
+            return
+
+        while len(self.buckets) >= self.points:
+            self.compact()
+            index = int(time // self.width)
+
+            if self.buckets[-1][0] == index:
+                self.add_to_last(time, value)
+                return
+
+        self.buckets.append([index, time, time, value, value, value, 1])
+
+    def add_to_last(self, time, value):
+        bucket = self.buckets[-1]
+        bucket[2] = time
+        bucket[3] = min(bucket[3], value)
+        bucket[4] = max(bucket[4], value)
+        bucket[5] = value
+        bucket[6] += 1
+
+    def compact(self):
+        """ double the bucket width and merge the buckets that now fall together """
+        self.width *= 2
+        merged = []
+
+        for bucket in self.buckets:
+            index = bucket[0] // 2
+
+            if len(merged) > 0 and merged[-1][0] == index:
+                last = merged[-1]
+                last[2] = bucket[2]
+                last[3] = min(last[3], bucket[3])
+                last[4] = max(last[4], bucket[4])
+                last[5] = bucket[5]
+                last[6] += bucket[6]
+            else:
+                merged.append([index] + bucket[1:])
+
+        self.buckets = merged
+
+    def rows(self):
+        """ (first time, last time, min, max, last, samples) per bucket """
+        return [tuple(bucket[1:]) for bucket in self.buckets]
+
+class PowerTimeline:
+    """ contract and sink PDO series of one capture """
+
+    def __init__(self, points=1000, changes=100):
+        self.points = points
+        self.series = collections.OrderedDict()
+        self.contract = None                        # last RDO value
+        self.changes = collections.deque(maxlen=changes)  # the last contract changes
+        self.change_count = 0
+
+    def add_value(self, name, time, value):
+        if name not in self.series:
+            self.series[name] = MinMaxSeries(self.points)
+        self.series[name].add(time, value)
+
+    def add(self, tr):
+        """ add a raw transaction """
+        register, values, is_read = transaction_access(tr)
+        start = tr[0]
+
+        if len(values) == 0:
+            return
+
+        if register == stusb.RDO_REG_STATUS_0 and len(values) >= 4:
+            rdo = int.from_bytes(values[:4], 'little')
+            voltage, current = power(rdo)
+            object_pos = (rdo >> stusb.RDO_Object_Pos) & 0x07
+            mismatch = (rdo >> stusb.RDO_CapaMismatch) & 0x01
+
+            self.add_value("RDO voltage (V)", start, voltage)
+            self.add_value("RDO current (A)", start, current)
+            self.add_value("RDO object position", start, object_pos)
+            self.add_value("RDO capability mismatch", start, mismatch)
+
+            if rdo != self.contract:
+                self.contract = rdo
+                self.change_count += 1
+                self.changes.append({"time": float(start), "object_pos": object_pos, "voltage": voltage,
+                                     "current": current, "capa_mismatch": mismatch})
+
+        elif not is_read and register in SNK_PDO_REGISTERS and len(values) >= 4:
+            voltage, current = power(int.from_bytes(values[:4], 'little'))
+            name = STUSB_Registers[register].strip(": ")[:-2]
+
+            self.add_value(name + " voltage (V)", start, voltage)
+            self.add_value(name + " current (A)", start, current)
+
+        elif not is_read and register == stusb.DPM_PDO_NUMB:
+            self.add_value("DPM_PDO_NUMB", start, values[0] & 0x07)
+
+    def result(self):
+        return {
+            "contract_changes": self.change_count,
+            "last_changes": list(self.changes),
+            "series": {name: {"samples": series.count, "bucket_width": series.width, "points": series.rows()}
+                       for name, series in self.series.items()}
+        }
+
+def timeline_file(file_name, points=1000, settings=None):
+    """ power timeline of a capture export """
+    timeline = PowerTimeline(points)
+    hla = make_hla(settings or {})
+
+    with open(file_name, newline='') as file:
+        for frame in read_export(file):
+            tr = hla.collect(frame)
+
+            if tr is not None:
+                hla.render(tr)
+                timeline.add(tr)
+
+    return timeline
+
+def write_csv(timeline, file):
+    out = csv.writer(file)
+    out.writerow(["series", "first", "last", "min", "max", "value", "samples"])
+
+    for name, series in timeline.series.items():
+        for row in series.rows():
+            out.writerow((name,) + row)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Power contract timeline of a STUSB4500 capture")
+    parser.add_argument("capture", help="I2C analyzer table export (CSV) from Logic 2")
+    parser.add_argument("--points", type=int, default=1000, help="maximum points per series (default 1000)")
+    parser.add_argument("--csv", help="write the series as CSV")
+    parser.add_argument("--json", help="write the timeline as JSON")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    timeline = timeline_file(args.capture, args.points, parse_settings(args.setting))
+
+    if args.csv:
+        with open(args.csv, "w", newline='') as file:
+            write_csv(timeline, file)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(timeline.result(), file, indent=1)
+
+    print("contract changes :", timeline.change_count)
+    for change in timeline.changes:
+        print("  {:>12.6f} s  object {}  {} V / {} A{}".format(change["time"], change["object_pos"], change["voltage"],
+              change["current"], "  capability mismatch" if change["capa_mismatch"] else ""))
+
+    for name, series in timeline.series.items():
+        rows = series.rows()
+        print("{:<28} {:>8} samples {:>5} points  min {:<8} max {:<8}".format(
+            name, series.count, len(rows), min(row[2] for row in rows), max(row[3] for row in rows)))
+
+if __name__ == '__main__':
+    main()
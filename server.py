@@ -0,0 +1,295 @@
+'''
+Live decoding server for STUSB4500 I2C traffic
+
+Capture front ends (bench rigs) connect to the listen socket and stream I2C frames. Each connection is
+decoded with its own Hla. Decoded transactions are pushed as JSON lines to every client connected on the
+subscribe socket.
+
+Rig stream formats:
+ * CSV lines : a header line with at least the columns type, start_time (and duration, address, read, data)
+               as in the Logic 2 I2C table export, followed by one line per frame.
+ * binary    : the magic b'STUSB' followed by records of 19 bytes (little endian):
+               type (B), value (B), flags (B, bit 0 = read), start time (d), end time (d)
+               type : 0 start, 1 stop, 2 address, 3 data, 4 error
+
+All queues are bounded. A slow subscriber slows down the reading of the rig streams (block, default) and is
+disconnected when its queue stays full for the timeout, or loses messages (drop), so memory use does not
+grow with the number or speed of the rigs. A subscriber that closes its connection is removed at once.
+
+A CSV stream that is not UTF-8, is not valid CSV or has a line longer than LINE_LIMIT (64 KiB) gets an error
+line back ({"error": ...}) and is closed.
+
+usage : python server.py --listen tcp:127.0.0.1:7450 --subscribe tcp:127.0.0.1:7451 [--timeout 5] [-s name=value]
+        python server.py --listen unix:/tmp/stusb_rigs.sock --subscribe unix:/tmp/stusb_out.sock
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import asyncio
+import csv
+import json
+import struct
+import sys
+
+from HighLevelAnalyzer import AnalyzerFrame
+from offline import make_hla, parse_row, parse_settings
+
+MAGIC = b'STUSB'
+RECORD = struct.Struct('<BBBdd')
+READ_SIZE = 65536
+LINE_LIMIT = 65536      # longest CSV line of a rig (StreamReader limit)
+
+Binary_types = {
+    0: 'start',
+    1: 'stop',
+    2: 'address',
+    3: 'data',
+    4: 'error'
+}
+
+def binary_frame(frame_type, value, flags, start, end):
+    """ binary record to frame """
+    frame_type = Binary_types.get(frame_type, 'error')
+
+    if frame_type == 'address':
+        data = {"address": bytes([value]), "read": (flags & 0x1) != 0}
+    elif frame_type == 'data':
+        data = {"data": bytes([value])}
+    else:
+        data = {}
+
+    return AnalyzerFrame(frame_type, start, end, data)
+
+class RigStreamError(Exception):
+    """ a rig stream that can not be read, the message is sent back to the rig """
+
+def frame_message(source, frame):
+    """ decoded frame to JSON line """
+    msg = {"source": source, "type": frame.type, "start": float(frame.start_time), "end": float(frame.end_time)}
+    msg.update(frame.data)
+    return (json.dumps(msg) + "\n").encode()
+
+class DecodeServer:
+    """ decode I2C frame streams per connection and publish to subscribers """
+
+    def __init__(self, settings=None, queue_size=1024, drop=False, timeout=5.0):
+        self.settings = settings or {}
+        self.queue_size = queue_size        # messages per subscriber
+        self.drop = drop                    # True : drop messages for a full subscriber, False : wait
+        self.timeout = timeout              # seconds to wait for a full subscriber before disconnecting it
+        self.subscribers = {}               # queue : sender task
+        self.connections = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    async def publish(self, message):
+        """ pass a message to all subscribers """
+        for queue in list(self.subscribers):
+            if self.drop:
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+            else:
+                try:
+                    await asyncio.wait_for(queue.put(message), self.timeout)
+                except asyncio.TimeoutError:
+                    self.disconnect(queue)
+
+    def disconnect(self, queue):
+        """ stop sending to a slow subscriber, its handler closes the connection """
+        sender = self.subscribers.pop(queue, None)
+
+        if sender is not None:
+            self.disconnected += 1
+            sender.cancel()
+            print("subscriber disconnected, queue full for", self.timeout, "s", file=sys.stderr)
+
+    async def decode_frames(self, source, hla, frames):
+        """ decode frames and publish the results, returns number of decoded frames """
+        count = 0
+
+        for frame in frames:
+            out = hla.decode(frame)
+
+            if out is None:
+                continue
+
+            if not isinstance(out, list):
+                out = [out]
+
+            for new_frame in out:
+                await self.publish(frame_message(source, new_frame))
+                count += 1
+
+        return count
+
+    async def read_binary(self, reader, source, hla):
+        """ binary records, read in large blocks """
+        pending = b''
+        count = 0
+
+        while True:
+            block = await reader.read(READ_SIZE)
+
+            if len(block) == 0:
+                return count
+
+            pending += block
+            whole = len(pending) - len(pending) % RECORD.size
+
+            frames = [binary_frame(*rec) for rec in RECORD.iter_unpack(pending[:whole])]
+            pending = pending[whole:]
+
+            count += await self.decode_frames(source, hla, frames)
+
+    async def read_line(self, reader, first=b''):
+        """ one CSV line as list of values (None at the end of the stream), RigStreamError when invalid """
+        try:
+            line = first + await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            raise RigStreamError("line longer than {} bytes".format(LINE_LIMIT))
+
+        if len(line) == 0:
+            return None
+
+        try:
+            return next(csv.reader([line.decode()]), [])
+        except UnicodeDecodeError as error:
+            raise RigStreamError("not UTF-8: " + str(error))
+        except csv.Error as error:
+            raise RigStreamError("invalid CSV: " + str(error))
+
+    async def read_csv(self, reader, source, hla, first):
+        """ CSV lines with header """
+        header = await self.read_line(reader, first)
+        count = 0
+
+        while True:
+            values = await self.read_line(reader)
+
+            if values is None:
+                return count
+
+            if not values:
+                continue
+
+            try:
+                frame = parse_row(dict(zip(header, values)))
+            except (KeyError, ValueError):
+                continue
+
+            count += await self.decode_frames(source, hla, [frame])
+
+    async def handle_rig(self, reader, writer):
+        """ one capture front end """
+        self.connections += 1
+        source = self.connections
+        hla = make_hla(self.settings)
+
+        try:
+            first = await reader.readexactly(len(MAGIC))
+
+            if first == MAGIC:
+                count = await self.read_binary(reader, source, hla)
+            else:
+                count = await self.read_csv(reader, source, hla, first)
+
+            print("rig", source, "closed,", count, "decoded frames", file=sys.stderr)
+
+        except RigStreamError as error:
+            print("rig", source, "closed,", error, file=sys.stderr)
+
+            try:
+                writer.write((json.dumps({"error": str(error)}) + "\n").encode())
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def handle_subscriber(self, reader, writer):
+        """ send the decoded frames to a subscriber, until it closes the connection or is disconnected """
+        queue = asyncio.Queue(self.queue_size)
+        sender = asyncio.ensure_future(self.send(queue, writer))
+        receiver = asyncio.ensure_future(self.receive(reader))
+        self.subscribers[queue] = sender
+
+        try:
+            await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+
+        finally:
+            self.subscribers.pop(queue, None)
+            sender.cancel()
+            receiver.cancel()
+
+            # free a publish waiting on the queue
+            while not queue.empty():
+                queue.get_nowait()
+
+            writer.close()
+
+    async def send(self, queue, writer):
+        """ messages of the queue to the subscriber """
+        try:
+            while True:
+                message = await queue.get()
+                writer.write(message)
+                await writer.drain()
+
+        except ConnectionError:
+            pass
+
+    async def receive(self, reader):
+        """ ignore what a subscriber sends, returns when it closes the connection """
+        try:
+            while len(await reader.read(READ_SIZE)) > 0:
+                pass
+
+        except ConnectionError:
+            pass
+
+    async def serve(self, listen, subscribe):
+        rigs = await start_server(self.handle_rig, listen)
+        subscribers = await start_server(self.handle_subscriber, subscribe)
+
+        async with rigs, subscribers:
+            await asyncio.gather(rigs.serve_forever(), subscribers.serve_forever())
+
+async def start_server(handler, address):
+    """ address is tcp:host:port or unix:path """
+    kind, sep, where = address.partition(":")
+
+    if kind == "unix":
+        return await asyncio.start_unix_server(handler, where, limit=LINE_LIMIT)
+
+    if kind == "tcp":
+        host, sep, port = where.rpartition(":")
+        return await asyncio.start_server(handler, host or None, int(port), limit=LINE_LIMIT)
+
+    raise SystemExit("invalid address: " + address)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live decoding server for STUSB4500 I2C streams")
+    parser.add_argument("--listen", default="tcp:127.0.0.1:7450", help="rig socket, tcp:host:port or unix:path")
+    parser.add_argument("--subscribe", default="tcp:127.0.0.1:7451", help="subscriber socket, tcp:host:port or unix:path")
+    parser.add_argument("--queue", type=int, default=1024, help="messages queued per subscriber")
+    parser.add_argument("--drop", action="store_true", help="drop messages for slow subscribers instead of waiting")
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for a slow subscriber before disconnecting it")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    server = DecodeServer(parse_settings(args.setting), args.queue, args.drop, args.timeout)
+
+    try:
+        asyncio.run(server.serve(args.listen, args.subscribe))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,712 @@
+'''
+STUSB4500 device simulator
+
+Register file model of the STUSB4500 together with scripted MCU behaviours, to create (timed) I2C traffic
+without hardware. It is used to load- and soak-test the analyzer at traffic rates beyond what a real
+setup produces.
+
+The model covers:
+ * clear-on-read alerts : PRT_STATUS, CC_HW_FAULT_STATUS_0, TYPEC_MONITORING_STATUS_0 and PORT_STATUS_0,
+                          reflected in ALERT_STATUS_1
+ * the TYPEC_STATUS, CC_STATUS and PE_FSM progression on attach, soft reset and hard reset. A new
+   sequence (attach, detach, negotiation, soft or hard reset) drops the pending steps of the previous one,
+   a soft reset or hard reset without attached source is ignored
+ * sink PDO / RDO negotiation against a list of source capabilities
+ * the NVM (FTP) sequence : password, CTRL_0 request bit that clears when the operation is done, RW_BUFFER
+
+MCU behaviours (steps of the script):
+ poll:<seconds>     SparkFun library style polling of ALERT_STATUS_1, status and state registers
+ nvm                read and program the NVM sectors
+ renegotiate        write new sink PDOs and trigger a soft reset
+ hardreset          the source sends a hard reset
+ detach / attach    cable removed / inserted
+
+usage : python simulator.py [--script "poll:1,renegotiate,poll:1,nvm,poll:1"] [--speed 400000] [--rate 10]
+                            [-o capture.csv] [--binary capture.bin] [--send tcp:127.0.0.1:7450] [--bench]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import csv
+import heapq
+import socket
+import sys
+import time
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import AnalyzerFrame
+from stusb4500_tables import NVM_SECTORS
+
+I2C_ADDRESS = 0x28
+
+# frames handed out at once : a long soak run is streamed in chunks, not kept in memory
+CHUNK_SIZE = 4096
+
+# register addresses
+REG_ALERT_STATUS_1          = 0x0b
+REG_ALERT_STATUS_1_MASK     = 0x0c
+REG_PORT_STATUS_0           = 0x0d
+REG_PORT_STATUS_1           = 0x0e
+REG_TYPEC_MONITORING_0      = 0x0f
+REG_TYPEC_MONITORING_1      = 0x10
+REG_CC_STATUS               = 0x11
+REG_CC_HW_FAULT_STATUS_0    = 0x12
+REG_CC_HW_FAULT_STATUS_1    = 0x13
+REG_TYPEC_STATUS            = 0x15
+REG_PRT_STATUS              = 0x16
+REG_PD_COMMAND_CTRL         = 0x1a
+REG_RESET_CTRL              = 0x23
+REG_PE_FSM                  = 0x29
+REG_DEVICE_ID               = 0x2f
+REG_TX_HEADER_LOW           = 0x51
+REG_RW_BUFFER               = 0x53
+REG_DPM_PDO_NUMB            = 0x70
+REG_DPM_SNK_PDO1            = 0x85
+REG_RDO_REG_STATUS_0        = 0x91
+REG_FTP_PASSWORD            = 0x95
+REG_FTP_CTRL_0              = 0x96
+REG_FTP_CTRL_1              = 0x97
+
+# read and clear, with the alert bit in ALERT_STATUS_1
+Clear_on_read = {
+    REG_PRT_STATUS              : stusb.PRT_STATUS_AL,
+    REG_CC_HW_FAULT_STATUS_0    : stusb.CC_HW_FAULT_STATUS_AL,
+    REG_TYPEC_MONITORING_0      : stusb.TYPEC_MONITORING_STATUS_AL,
+    REG_PORT_STATUS_0           : stusb.PORT_STATUS_AL
+}
+
+# duration of the NVM operations (seconds) by CTRL_1 opcode
+Nvm_duration = {
+    0b000: 0.0001,      # Read
+    0b001: 0.0001,      # Write_to_PL
+    0b010: 0.0001,      # Write_to_Erase
+    0b011: 0.0001,      # Write_out_PL
+    0b100: 0.0001,      # Write_out_Erase
+    0b101: 0.005,       # Erase_sector
+    0b110: 0.002,       # Word_to_EEPROM
+    0b111: 0.002        # Soft Program
+}
+
+# NVM content as in extras/STUSB_NVM.h
+NVM_DEFAULT = NVM_SECTORS
+
+# source capabilities (voltage V, max current A)
+SOURCE_PDOS = ((5.0, 3.0), (9.0, 3.0), (15.0, 3.0), (20.0, 2.25))
+
+# sink PDOs after power up (voltage V, current A)
+SINK_PDOS = ((5.0, 1.5), (15.0, 1.5), (20.0, 1.0))
+
+def pdo_value(voltage, current):
+    """ fixed supply PDO : bits 19..10 voltage in 50mV, bits 9..0 current in 10mA """
+    return (int(round(voltage * 20)) << 10) | int(round(current * 100))
+
+class Stusb4500:
+    """ register file model of the STUSB4500 """
+
+    def __init__(self, source_pdos=SOURCE_PDOS):
+        self.source_pdos = source_pdos
+        self.regs = bytearray(256)
+        self.regs[REG_DEVICE_ID] = 0x25
+        self.regs[REG_ALERT_STATUS_1_MASK] = 0xff
+        self.regs[REG_CC_HW_FAULT_STATUS_1] = stusb.VPU_VALID
+        self.regs[REG_TYPEC_MONITORING_1] = stusb.VBUS_VSAFE0V
+        self.regs[REG_CC_STATUS] = stusb.LOOKING_4_CONNECTION
+        self.regs[REG_PE_FSM] = stusb.PE_INIT
+        self.set_sink_pdos(SINK_PDOS)
+
+        self.nvm = [bytearray(sector) for sector in NVM_DEFAULT]
+        self.latch = bytearray(8)               # NVM program load register
+        self.pointer = 0
+        self.time = 0.0
+        self.events = []                        # heap of (time, sequence, function, argument, generation)
+        self.sequence = 0
+        self.generation = 0                     # port sequence, older port events are dropped
+
+    def set_sink_pdos(self, pdos):
+        self.regs[REG_DPM_PDO_NUMB] = len(pdos)
+
+        for num in range(len(pdos)):
+            value = pdo_value(*pdos[num])
+            self.regs[REG_DPM_SNK_PDO1 + 4 * num: REG_DPM_SNK_PDO1 + 4 * num + 4] = value.to_bytes(4, 'little')
+
+    # events
+
+    def schedule(self, delay, function, argument=None, port=False):
+        """ port : step of the current port sequence (PE_FSM progression), dropped when a new one starts """
+        self.sequence += 1
+        heapq.heappush(self.events, (self.time + delay, self.sequence, function, argument,
+                                     self.generation if port else None))
+
+    def advance(self, now):
+        """ run the events up to now """
+        while self.events and self.events[0][0] <= now:
+            at, seq, function, argument, generation = heapq.heappop(self.events)
+            self.time = at
+
+            if generation is None or generation == self.generation:
+                function(argument)
+
+        self.time = now
+
+    def new_sequence(self):
+        """ a new port sequence starts : the pending steps of the previous one are dropped """
+        self.generation += 1
+
+    def attached(self):
+        return self.regs[REG_TYPEC_STATUS] == stusb.ATTACHED_SNK
+
+    def set_register(self, args):
+        reg, value = args
+        self.regs[reg] = value
+
+    def set_bits(self, args):
+        reg, bits = args
+        self.regs[reg] |= bits
+
+    # port behaviour
+
+    def attach(self, arg=None):
+        """ source connected """
+        self.new_sequence()
+        self.state_sequence([
+            (0.0,   REG_CC_STATUS, stusb.LOOKING_4_CONNECTION),
+            (0.0,   REG_TYPEC_STATUS, stusb.ATTACHWAIT_SNK),
+            (0.1,   REG_TYPEC_STATUS, stusb.ATTACHED_SNK),
+            (0.1,   REG_CC_STATUS, stusb.CONNECT_RESULT | stusb.SNK_CC1_Power3_0),
+            (0.1,   REG_PORT_STATUS_1, (stusb.SNK_ATT << 5) | stusb.ATTACH),
+            (0.1,   REG_TYPEC_MONITORING_1, stusb.VBUS_READY | stusb.VBUS_VALID_SNK),
+            (0.1,   self.set_bits, (REG_PORT_STATUS_0, 0x01)),
+            (0.1,   self.set_bits, (REG_TYPEC_MONITORING_0, stusb.VBUS_VALID_SNK_TRANS | stusb.VBUS_READY_TRANS | stusb.VBUS_VSAFE0V_TRANS)),
+            (0.1,   self.negotiate, None)
+        ])
+
+    def detach(self, arg=None):
+        """ source disconnected """
+        self.new_sequence()
+        self.regs[REG_TYPEC_STATUS] = stusb.UNATTACHED_SNK
+        self.regs[REG_CC_STATUS] = stusb.LOOKING_4_CONNECTION
+        self.regs[REG_PORT_STATUS_1] = 0
+        self.regs[REG_PORT_STATUS_0] |= 0x01
+        self.regs[REG_TYPEC_MONITORING_1] = stusb.VBUS_VSAFE0V
+        self.regs[REG_TYPEC_MONITORING_0] |= stusb.VBUS_VALID_SNK_TRANS | stusb.VBUS_READY_TRANS | stusb.VBUS_VSAFE0V_TRANS
+        self.regs[REG_PE_FSM] = stusb.PE_INIT
+        self.regs[REG_RDO_REG_STATUS_0: REG_RDO_REG_STATUS_0 + 4] = bytes(4)
+
+    def negotiate(self, start=None):
+        """ PE_FSM progression from start state until an explicit contract """
+        if start is None:
+            start = stusb.PE_SNK_STARTUP
+
+        self.new_sequence()
+
+        steps = [
+            (0.000, stusb.PE_SNK_STARTUP),
+            (0.001, stusb.PE_SNK_DISCOVERY),
+            (0.002, stusb.PE_SNK_WAIT_FOR_CAPABILITIES),
+            (0.030, stusb.PE_SNK_EVALUATE_CAPABILITIES),
+            (0.031, stusb.PE_SNK_SELECT_CAPABILITIES),
+            (0.035, stusb.PE_SNK_TRANSITION_SINK),
+            (0.060, stusb.PE_SNK_READY)
+        ]
+        offset = [state for delay, state in steps].index(start)
+        begin = steps[offset][0]
+
+        for delay, state in steps[offset:]:
+            if state == stusb.PE_SNK_READY:
+                self.schedule(delay - begin, self.contract, port=True)
+
+            self.schedule(delay - begin, self.set_register, (REG_PE_FSM, state), port=True)
+
+    def contract(self, arg=None):
+        """ select the highest sink PDO the source can deliver and set the RDO """
+        rdo = None
+        count = max(1, min(3, self.regs[REG_DPM_PDO_NUMB] & 0x07))
+
+        for num in range(count - 1, -1, -1):
+            snk = int.from_bytes(self.regs[REG_DPM_SNK_PDO1 + 4 * num: REG_DPM_SNK_PDO1 + 4 * num + 4], 'little')
+            voltage = ((snk >> 10) & 0x3ff) / 20
+
+            for pos in range(len(self.source_pdos)):
+                src_voltage, src_current = self.source_pdos[pos]
+
+                if src_voltage == voltage and src_current * 100 >= (snk & 0x3ff):
+                    rdo = ((pos + 1) << stusb.RDO_Object_Pos) | (snk & 0xfffff)
+                    break
+
+            if rdo is not None:
+                break
+
+        # no match : 5V with capability mismatch
+        if rdo is None:
+            rdo = (1 << stusb.RDO_Object_Pos) | (1 << stusb.RDO_CapaMismatch) | pdo_value(5.0, 0.5)
+
+        # as the decoder shows it : bits 19..10 voltage, bits 9..0 current
+        self.regs[REG_RDO_REG_STATUS_0: REG_RDO_REG_STATUS_0 + 4] = rdo.to_bytes(4, 'little')
+        self.regs[REG_PRT_STATUS] |= stusb.PRL_MSG_RECEIVED
+
+    def soft_reset(self, arg=None):
+        self.new_sequence()
+        self.state_sequence([
+            (0.000, REG_PE_FSM, stusb.PE_SEND_SOFT_RESET),
+            (0.001, REG_PE_FSM, stusb.PE_SOFT_RESET),
+            (0.002, self.negotiate, stusb.PE_SNK_WAIT_FOR_CAPABILITIES)
+        ])
+
+    def hard_reset(self, arg=None):
+        """ hard reset from the source : VBUS to vSafe0V and back """
+        if not self.attached():
+            return
+
+        self.new_sequence()
+        self.regs[REG_PRT_STATUS] |= stusb.PRL_HW_RST_RECEIVED
+        self.state_sequence([
+            (0.000, REG_PE_FSM, stusb.PE_HARD_RESET),
+            (0.001, REG_PE_FSM, stusb.PE_HARD_RESET_SHUTDOWN),
+            (0.010, REG_TYPEC_MONITORING_1, stusb.VBUS_VSAFE0V),
+            (0.010, self.set_bits, (REG_TYPEC_MONITORING_0, stusb.VBUS_READY_TRANS | stusb.VBUS_VSAFE0V_TRANS)),
+            (0.600, REG_PE_FSM, stusb.PE_HARD_RESET_RECOVERY),
+            (0.700, REG_TYPEC_MONITORING_1, stusb.VBUS_READY | stusb.VBUS_VALID_SNK),
+            (0.700, self.set_bits, (REG_TYPEC_MONITORING_0, stusb.VBUS_READY_TRANS | stusb.VBUS_VSAFE0V_TRANS)),
+        ])
+        self.schedule(0.710, self.negotiate, stusb.PE_SNK_STARTUP, port=True)
+
+    def state_sequence(self, steps):
+        """ steps of the current port sequence : list of (delay from now, register or function, value or argument) """
+        for delay, reg, value in steps:
+            if callable(reg):
+                self.schedule(delay, reg, value, port=True)
+            else:
+                self.schedule(delay, self.set_register, (reg, value), port=True)
+
+    # NVM
+
+    def nvm_operation(self, arg=None):
+        """ execute the NVM operation requested in CTRL_0 / CTRL_1 and clear the request bit """
+        opcode = self.regs[REG_FTP_CTRL_1] & 0x07
+        sector = self.regs[REG_FTP_CTRL_0] & 0x07
+        sectors = (self.regs[REG_FTP_CTRL_1] >> 3) & 0x1f
+
+        if sector < len(self.nvm):
+            if opcode == 0b000:                                 # Read
+                self.regs[REG_RW_BUFFER: REG_RW_BUFFER + 8] = self.nvm[sector]
+            elif opcode == 0b001:                               # Write_to_PL
+                self.latch[:] = self.regs[REG_RW_BUFFER: REG_RW_BUFFER + 8]
+            elif opcode in (0b110, 0b111):                      # program sector
+                self.nvm[sector][:] = self.latch
+
+        if opcode == 0b101:                                     # Erase_sector
+            for num in range(len(self.nvm)):
+                if sectors & (1 << num):
+                    self.nvm[num][:] = bytes(8)
+
+        self.regs[REG_FTP_CTRL_0] &= ~(1 << stusb.FTP_CUST_REQ) & 0xff
+
+    # I2C access
+
+    def read_register(self, reg):
+        if reg == REG_ALERT_STATUS_1:
+            value = 0
+
+            for status, bit in Clear_on_read.items():
+                if self.regs[status]:
+                    value |= bit
+
+            return value
+
+        value = self.regs[reg]
+
+        if reg in Clear_on_read:
+            self.regs[reg] = 0
+
+        return value
+
+    def write_register(self, reg, value):
+        self.regs[reg] = value
+
+        if reg == REG_PD_COMMAND_CTRL and value == 0x26 and self.regs[REG_TX_HEADER_LOW] == 0x0D:
+            # soft reset message, only with a source attached
+            if self.attached():
+                self.schedule(0.0005, self.soft_reset, port=True)
+
+        elif reg == REG_FTP_CTRL_0 and value & (1 << stusb.FTP_CUST_REQ):
+            if hex(self.regs[REG_FTP_PASSWORD]) == stusb.FTP_CUST_PASSWORD:
+                self.schedule(Nvm_duration[self.regs[REG_FTP_CTRL_1] & 0x07], self.nvm_operation)
+
+        elif reg == REG_RESET_CTRL and value & 0x01:
+            self.detach()
+
+        elif reg == REG_RESET_CTRL:
+            self.schedule(0.01, self.attach)
+
+    def i2c_write(self, data):
+        """ write transaction : register pointer and (auto increment) data """
+        if len(data) == 0:
+            return
+
+        self.pointer = data[0]
+
+        for value in data[1:]:
+            self.write_register(self.pointer, value)
+            self.pointer = (self.pointer + 1) & 0xff
+
+    def i2c_read(self, count):
+        data = bytearray()
+
+        for num in range(count):
+            data.append(self.read_register(self.pointer))
+            self.pointer = (self.pointer + 1) & 0xff
+
+        return bytes(data)
+
+class Simulator:
+    """ runs MCU behaviours against the device model and creates the timed I2C frames """
+
+    def __init__(self, speed=400000, rate=1.0, repeated_start=False, address=I2C_ADDRESS):
+        self.device = Stusb4500()
+        self.bit = 1.0 / speed                  # SCL period
+        self.rate = rate                        # traffic multiplier : MCU delays are divided by this
+        self.repeated_start = repeated_start    # register read with repeated start (else write, stop, read)
+        self.address = address
+        self.time = 0.0
+        self.frames = []                        # (type, start, end, value, read)
+
+    def frame(self, frame_type, bits, value=None, read=False):
+        start = self.time
+        self.time += bits * self.bit
+        self.frames.append((frame_type, start, self.time, value, read))
+
+    def transaction(self, read, data=b'', count=0, pointer=None):
+        """ one I2C transaction, returns the bytes read """
+        self.device.advance(self.time)
+        self.frame("start", 0.5)
+
+        if pointer is not None:
+            # register pointer write + repeated start
+            self.frame("address", 9, self.address, False)
+            self.frame("data", 9, pointer)
+            self.device.i2c_write(bytes([pointer]))
+            self.frame("start", 0.5)
+
+        self.frame("address", 9, self.address, read)
+
+        if read:
+            result = self.device.i2c_read(count)
+            for value in result:
+                self.frame("data", 9, value)
+        else:
+            result = b''
+            self.device.i2c_write(data)
+            for value in data:
+                self.frame("data", 9, value)
+
+        self.frame("stop", 0.5)
+
+        # MCU time between transactions
+        self.time += 0.00002 / self.rate
+        return result
+
+    def write(self, reg, data=b''):
+        self.transaction(False, bytes([reg]) + bytes(data))
+
+    def read(self, reg, count=1):
+        if self.repeated_start:
+            return self.transaction(True, count=count, pointer=reg)
+
+        self.transaction(False, bytes([reg]))
+        return self.transaction(True, count=count)
+
+    def wait(self, seconds):
+        self.time += seconds / self.rate
+
+    def run(self, behaviour, chunk_size=CHUNK_SIZE):
+        """ run an MCU behaviour (generator of operations), yields the frames in chunks of about chunk_size """
+        result = None
+
+        try:
+            while True:
+                op = behaviour.send(result)
+                result = None
+
+                if op[0] == "read":
+                    result = self.read(op[1], op[2])
+                elif op[0] == "write":
+                    self.write(op[1], op[2])
+                elif op[0] == "wait":
+                    self.wait(op[1])
+                elif op[0] == "event":
+                    self.device.advance(self.time)
+                    op[1]()
+
+                if len(self.frames) >= chunk_size:
+                    yield self.take_frames()
+
+        except StopIteration:
+            pass
+
+    def take_frames(self):
+        frames = self.frames
+        self.frames = []
+        return frames
+
+# MCU behaviours, generators of ("read", register, count), ("write", register, data), ("wait", seconds),
+# ("event", function)
+
+def startup(sim):
+    """ SparkFun begin() / read() : device id and the sink PDOs """
+    yield ("read", REG_DEVICE_ID, 1)
+    yield ("read", REG_DPM_PDO_NUMB, 1)
+
+    for num in range(3):
+        yield ("read", REG_DPM_SNK_PDO1 + 4 * num, 4)
+
+def sparkfun_polling(sim, duration, interval=0.01):
+    """ poll the alert and status registers like the SparkFun examples loop """
+    end = sim.time + duration
+
+    while sim.time < end:
+        alert = yield ("read", REG_ALERT_STATUS_1, 1)
+
+        if alert and alert[0]:
+            for status, bit in Clear_on_read.items():
+                if alert[0] & bit:
+                    yield ("read", status, 1)
+
+        yield ("read", REG_TYPEC_MONITORING_1, 1)
+        yield ("read", REG_CC_STATUS, 1)
+        yield ("read", REG_TYPEC_STATUS, 1)
+        yield ("read", REG_PE_FSM, 1)
+        yield ("read", REG_RDO_REG_STATUS_0, 4)
+        yield ("wait", interval)
+
+def nvm_programming(sim):
+    """ read all NVM sectors and program them back (SparkFun write()) """
+    yield ("write", REG_FTP_PASSWORD, [0x47])
+    yield ("write", REG_RW_BUFFER, [0x00])
+    yield ("write", REG_FTP_CTRL_0, [0x00])
+    yield ("write", REG_FTP_CTRL_0, [0xC0])
+
+    sectors = []
+
+    for sector in range(5):
+        yield ("write", REG_FTP_CTRL_1, [0b000])
+        yield from nvm_request(sector)
+        sectors.append((yield ("read", REG_RW_BUFFER, 8)))
+
+    # erase all sectors
+    yield ("write", REG_FTP_CTRL_1, [(0x1f << 3) | 0b010])
+    yield from nvm_request(0)
+    yield ("write", REG_FTP_CTRL_1, [0b101 | (0x1f << 3)])
+    yield from nvm_request(0)
+
+    for sector in range(5):
+        yield ("write", REG_RW_BUFFER, list(sectors[sector]))
+        yield ("write", REG_FTP_CTRL_1, [0b001])
+        yield from nvm_request(sector)
+        yield ("write", REG_FTP_CTRL_1, [0b110])
+        yield from nvm_request(sector)
+
+    # exit test mode
+    yield ("write", REG_FTP_CTRL_0, [0x40, 0x00])
+    yield ("write", REG_FTP_PASSWORD, [0x00])
+
+def nvm_request(sector):
+    """ set FTP_CUST_REQ and poll CTRL_0 until the NVM clears it """
+    yield ("write", REG_FTP_CTRL_0, [0xC0 | (1 << stusb.FTP_CUST_REQ) | sector])
+
+    while True:
+        value = yield ("read", REG_FTP_CTRL_0, 1)
+
+        if not value[0] & (1 << stusb.FTP_CUST_REQ):
+            return
+
+        yield ("wait", 0.0001)
+
+def renegotiate(sim, pdos=((5.0, 1.5), (9.0, 2.0), (20.0, 2.0)), timeout=1.0):
+    """ write new sink PDOs, soft reset and wait for PE_SNK_READY """
+    for num in range(len(pdos)):
+        yield ("write", REG_DPM_SNK_PDO1 + 4 * num, list(pdo_value(*pdos[num]).to_bytes(4, 'little')))
+
+    yield ("write", REG_DPM_PDO_NUMB, [len(pdos)])
+    yield ("write", REG_TX_HEADER_LOW, [0x0D])
+    yield ("write", REG_PD_COMMAND_CTRL, [0x26])
+
+    end = sim.time + timeout
+    left_ready = False
+
+    while sim.time < end:
+        state = yield ("read", REG_PE_FSM, 1)
+
+        if state[0] != stusb.PE_SNK_READY:
+            left_ready = True
+        elif left_ready:
+            break
+
+        yield ("wait", 0.001)
+
+    yield ("read", REG_RDO_REG_STATUS_0, 4)
+
+def device_event(sim, name):
+    """ event on the USB-C side """
+    yield ("event", getattr(sim.device, name))
+
+def run_script(sim, script, chunk_size=CHUNK_SIZE):
+    """ script : comma separated steps, see module description. Yields the frames in chunks """
+    for step in script.split(","):
+        name, sep, arg = step.strip().partition(":")
+
+        if name == "poll":
+            behaviour = sparkfun_polling(sim, float(arg or 1))
+        elif name == "nvm":
+            behaviour = nvm_programming(sim)
+        elif name == "renegotiate":
+            behaviour = renegotiate(sim)
+        elif name in ("hardreset", "attach", "detach"):
+            behaviour = device_event(sim, {"hardreset": "hard_reset"}.get(name, name))
+        elif name == "startup":
+            behaviour = startup(sim)
+        else:
+            raise SystemExit("unknown script step: " + step)
+
+        yield from sim.run(behaviour, chunk_size)
+
+def simulate(script, speed=400000, rate=1.0, repeated_start=False, chunk_size=CHUNK_SIZE):
+    """
+    run a script, yield the frames (type, start, end, value, read) in chunks of about chunk_size frames
+
+    A step of the script always ends a chunk. The frames are created while the chunks are taken, so a long
+    run uses constant memory.
+    """
+    sim = Simulator(speed, rate, repeated_start)
+    sim.device.attach()
+    yield from sim.run(startup(sim), chunk_size)
+
+    for step in script.split(","):
+        yield from run_script(sim, step, chunk_size)
+
+        if len(sim.frames) > 0:
+            yield sim.take_frames()
+
+def analyzer_frames(frames):
+    """ simulated frames as the I2C analyzer provides them """
+    for frame_type, start, end, value, read in frames:
+        if frame_type == "address":
+            yield AnalyzerFrame(frame_type, start, end, {"address": bytes([value]), "read": read})
+        elif frame_type == "data":
+            yield AnalyzerFrame(frame_type, start, end, {"data": bytes([value])})
+        else:
+            yield AnalyzerFrame(frame_type, start, end, {})
+
+Binary_codes = {"start": 0, "stop": 1, "address": 2, "data": 3, "error": 4}
+
+def binary_records(frames):
+    """ simulated frames in the binary stream format of server.py """
+    from server import RECORD
+    return b''.join(RECORD.pack(Binary_codes[t], v or 0, 1 if r else 0, s, e) for t, s, e, v, r in frames)
+
+def write_csv(frames, out):
+    """ simulated frames in the Logic 2 I2C table export format """
+    for frame_type, start, end, value, read in frames:
+        out.writerow(["I2C", frame_type, repr(start), repr(end - start), "true",
+                      hex(value) if frame_type == "address" else "",
+                      ("true" if read else "false") if frame_type == "address" else "",
+                      hex(value) if frame_type == "data" else ""])
+
+def bench(chunks, settings=None):
+    """ decode simulated traffic in-process, returns statistics """
+    from offline import make_hla
+
+    hla = make_hla(settings or {})
+    frames = 0
+    output = 0
+    decode = 0.0
+    last = 0.0
+
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+
+        data = list(analyzer_frames(chunk))
+        begin = time.perf_counter()
+
+        for frame in data:
+            out = hla.decode(frame)
+            if out is not None:
+                output += len(out) if isinstance(out, list) else 1
+
+        decode += time.perf_counter() - begin
+        frames += len(data)
+        last = chunk[-1][2]
+
+    return {
+        "frames": frames,
+        "output": output,
+        "capture": last,
+        "decode": decode,
+        "frames_per_second": frames / decode if decode else 0,
+        "real_time": last / decode if decode else 0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="STUSB4500 I2C traffic simulator")
+    parser.add_argument("--script", default="poll:1,renegotiate,poll:1,nvm,poll:1,hardreset,poll:1",
+                        help="comma separated steps: poll:<s>, nvm, renegotiate, hardreset, detach, attach")
+    parser.add_argument("--speed", type=int, default=400000, help="I2C bus speed (Hz)")
+    parser.add_argument("--rate", type=float, default=1.0, help="traffic multiplier (MCU delays divided by this)")
+    parser.add_argument("--repeated-start", action="store_true", help="read registers with repeated start")
+    parser.add_argument("-o", "--output", help="write Logic 2 I2C table export (CSV)")
+    parser.add_argument("--binary", help="write binary frame records (server.py format)")
+    parser.add_argument("--send", help="stream binary frames to server.py, tcp:host:port")
+    parser.add_argument("--bench", action="store_true", help="decode in-process and report throughput")
+    args = parser.parse_args(argv)
+
+    chunks = simulate(args.script, args.speed, args.rate, args.repeated_start)
+
+    if args.bench:
+        res = bench(chunks)
+        print("frames          :", res["frames"])
+        print("output frames   :", res["output"])
+        print("capture time    : {:.3f} s".format(res["capture"]))
+        print("decode time     : {:.3f} s".format(res["decode"]))
+        print("frames / second : {:.0f}".format(res["frames_per_second"]))
+        print("real time factor: {:.1f} x".format(res["real_time"]))
+        return
+
+    csv_file = open(args.output, "w", newline='') if args.output else None
+    bin_file = open(args.binary, "wb") if args.binary else None
+    sock = None
+
+    if args.send:
+        kind, sep, where = args.send.partition(":")
+        host, sep, port = where.rpartition(":")
+        sock = socket.create_connection((host, int(port)))
+        sock.sendall(b'STUSB')
+
+    if csv_file is None and bin_file is None and sock is None:
+        csv_file = sys.stdout
+
+    out = None
+    if csv_file is not None:
+        out = csv.writer(csv_file)
+        out.writerow(["name", "type", "start_time", "duration", "ack", "address", "read", "data"])
+
+    if bin_file is not None:
+        bin_file.write(b'STUSB')
+
+    for chunk in chunks:
+        if out is not None:
+            write_csv(chunk, out)
+        if bin_file is not None:
+            bin_file.write(binary_records(chunk))
+        if sock is not None:
+            sock.sendall(binary_records(chunk))
+
+    for file in (csv_file, bin_file):
+        if file is not None and file is not sys.stdout:
+            file.close()
+
+    if sock is not None:
+        sock.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# Generated by gen_tables.py from extras/STUSB4500_register.h and extras/STUSB_NVM.h, do not edit
+
+# hex address : (names, access, address of the first byte, size in bytes)
+REGISTERS = {'0xb': (('ALERT_STATUS_1',), 'RC', '0xb', 1),
+ '0xc': (('ALERT_STATUS_MASK',), None, '0xc', 1),
+ '0xd': (('PORT_STATUS_TRANS',), 'RC', '0xd', 1),
+ '0xe': (('PORT_STATUS',), 'RO', '0xe', 1),
+ '0xf': (('TYPEC_MONITORING_STATUS_0',), 'RC', '0xf', 1),
+ '0x10': (('TYPEC_MONITORING_STATUS_1',), 'RO', '0x10', 1),
+ '0x11': (('CC_STATUS',), None, '0x11', 1),
+ '0x12': (('CC_HW_FAULT_STATUS_0',), 'RC', '0x12', 1),
+ '0x13': (('CC_HW_FAULT_STATUS_1',), 'RO', '0x13', 1),
+ '0x14': (('PD_TYPEC_STATUS',), 'RO', '0x14', 1),
+ '0x15': (('TYPE_C_STATUS',), 'RO', '0x15', 1),
+ '0x16': (('PRT_STATUS',), 'RO', '0x16', 1),
+ '0x17': (('PHY_STATUS',), 'RO', '0x17', 1),
+ '0x18': (('CC_CAPABILITY_CTRL',), 'R/W', '0x18', 1),
+ '0x19': (('PRT_TX_CTRL',), 'R/W', '0x19', 1),
+ '0x1a': (('CMD_CTRL',), 'R/W', '0x1a', 1),
+ '0x1d': (('DEV_CTRL',), 'R/W', '0x1d', 1),
+ '0x20': (('MONITORING_CTRL_0',), None, '0x20', 1),
+ '0x21': (('MONITORING_CTRL_1',), None, '0x21', 1),
+ '0x22': (('MONITORING_CTRL_2',), None, '0x22', 1),
+ '0x23': (('RESET_CTRL_REG',), 'R/W', '0x23', 1),
+ '0x29': (('PE_FSM',), None, '0x29', 1),
+ '0x2f': (('DEVICE_ID',), None, '0x2f', 1),
+ '0x30': (('RX_BYTE_CNT',), None, '0x30', 1),
+ '0x31': (('RX_HEADER_LOW',), None, '0x31', 2),
+ '0x32': (('RX_HEADER_HIGH',), None, '0x31', 2),
+ '0x33': (('RX_DATA_OBJ1_0',), None, '0x33', 4),
+ '0x34': (('RX_DATA_OBJ1_1',), None, '0x33', 4),
+ '0x35': (('RX_DATA_OBJ1_2',), None, '0x33', 4),
+ '0x36': (('RX_DATA_OBJ1_3',), None, '0x33', 4),
+ '0x37': (('RX_DATA_OBJ2_0',), None, '0x37', 4),
+ '0x38': (('RX_DATA_OBJ2_1',), None, '0x37', 4),
+ '0x39': (('RX_DATA_OBJ2_2',), None, '0x37', 4),
+ '0x3a': (('RX_DATA_OBJ2_3',), None, '0x37', 4),
+ '0x3b': (('RX_DATA_OBJ3_0',), None, '0x3b', 4),
+ '0x3c': (('RX_DATA_OBJ3_1',), None, '0x3b', 4),
+ '0x3d': (('RX_DATA_OBJ3_2',), None, '0x3b', 4),
+ '0x3e': (('RX_DATA_OBJ3_3',), None, '0x3b', 4),
+ '0x3f': (('RX_DATA_OBJ4_0',), None, '0x3f', 4),
+ '0x40': (('RX_DATA_OBJ4_1',), None, '0x3f', 4),
+ '0x41': (('RX_DATA_OBJ4_2',), None, '0x3f', 4),
+ '0x42': (('RX_DATA_OBJ4_3',), None, '0x3f', 4),
+ '0x43': (('RX_DATA_OBJ5_0',), None, '0x43', 4),
+ '0x44': (('RX_DATA_OBJ5_1',), None, '0x43', 4),
+ '0x45': (('RX_DATA_OBJ5_2',), None, '0x43', 4),
+ '0x46': (('RX_DATA_OBJ5_3',), None, '0x43', 4),
+ '0x47': (('RX_DATA_OBJ6_0',), None, '0x47', 4),
+ '0x48': (('RX_DATA_OBJ6_1',), None, '0x47', 4),
+ '0x49': (('RX_DATA_OBJ6_2',), None, '0x47', 4),
+ '0x4a': (('RX_DATA_OBJ6_3',), None, '0x47', 4),
+ '0x4b': (('RX_DATA_OBJ7_0',), None, '0x4b', 4),
+ '0x4c': (('RX_DATA_OBJ7_1',), None, '0x4b', 4),
+ '0x4d': (('RX_DATA_OBJ7_2',), None, '0x4b', 4),
+ '0x4e': (('RX_DATA_OBJ7_3',), None, '0x4b', 4),
+ '0x50': (('TX_BYTE_CNT',), None, '0x50', 1),
+ '0x51': (('TX_HEADER_LOW',), None, '0x51', 2),
+ '0x52': (('TX_HEADER_HIGH',), None, '0x51', 2),
+ '0x53': (('TX_DATA_OBJ1_0', 'RW_BUFFER'), None, '0x53', 4),
+ '0x54': (('TX_DATA_OBJ1_1',), None, '0x53', 4),
+ '0x55': (('TX_DATA_OBJ1_2',), None, '0x53', 4),
+ '0x56': (('TX_DATA_OBJ1_3',), None, '0x53', 4),
+ '0x57': (('TX_DATA_OBJ2_0',), None, '0x57', 4),
+ '0x58': (('TX_DATA_OBJ2_1',), None, '0x57', 4),
+ '0x59': (('TX_DATA_OBJ2_2',), None, '0x57', 4),
+ '0x5a': (('TX_DATA_OBJ2_3',), None, '0x57', 4),
+ '0x5b': (('TX_DATA_OBJ3_0',), None, '0x5b', 4),
+ '0x5c': (('TX_DATA_OBJ3_1',), None, '0x5b', 4),
+ '0x5d': (('TX_DATA_OBJ3_2',), None, '0x5b', 4),
+ '0x5e': (('TX_DATA_OBJ3_3',), None, '0x5b', 4),
+ '0x5f': (('TX_DATA_OBJ4_0',), None, '0x5f', 4),
+ '0x60': (('TX_DATA_OBJ4_1',), None, '0x5f', 4),
+ '0x61': (('TX_DATA_OBJ4_2',), None, '0x5f', 4),
+ '0x62': (('TX_DATA_OBJ4_3',), None, '0x5f', 4),
+ '0x63': (('TX_DATA_OBJ5_0',), None, '0x63', 4),
+ '0x64': (('TX_DATA_OBJ5_1',), None, '0x63', 4),
+ '0x65': (('TX_DATA_OBJ5_2',), None, '0x63', 4),
+ '0x66': (('TX_DATA_OBJ5_3',), None, '0x63', 4),
+ '0x67': (('TX_DATA_OBJ6_0',), None, '0x67', 4),
+ '0x68': (('TX_DATA_OBJ6_1',), None, '0x67', 4),
+ '0x69': (('TX_DATA_OBJ6_2',), None, '0x67', 4),
+ '0x6a': (('TX_DATA_OBJ6_3',), None, '0x67', 4),
+ '0x6b': (('TX_DATA_OBJ7_0',), None, '0x6b', 4),
+ '0x6c': (('TX_DATA_OBJ7_1',), None, '0x6b', 4),
+ '0x6d': (('TX_DATA_OBJ7_2',), None, '0x6b', 4),
+ '0x6e': (('TX_DATA_OBJ7_3',), None, '0x6b', 4),
+ '0x70': (('DPM_PDO_NUMB',), None, '0x70', 1),
+ '0x85': (('DPM_SNK_PDO1_0',), None, '0x85', 4),
+ '0x86': (('DPM_SNK_PDO1_1',), None, '0x85', 4),
+ '0x87': (('DPM_SNK_PDO1_2',), None, '0x85', 4),
+ '0x88': (('DPM_SNK_PDO1_3',), None, '0x85', 4),
+ '0x89': (('DPM_SNK_PDO2_0',), 'R/W', '0x89', 4),
+ '0x8a': (('DPM_SNK_PDO2_1',), 'R/W', '0x89', 4),
+ '0x8b': (('DPM_SNK_PDO2_2',), 'R/W', '0x89', 4),
+ '0x8c': (('DPM_SNK_PDO2_3',), 'R/W', '0x89', 4),
+ '0x8d': (('DPM_SNK_PDO3_0',), 'R/W', '0x8d', 4),
+ '0x8e': (('DPM_SNK_PDO3_1',), 'R/W', '0x8d', 4),
+ '0x8f': (('DPM_SNK_PDO3_2',), 'R/W', '0x8d', 4),
+ '0x90': (('DPM_SNK_PDO3_3',), 'R/W', '0x8d', 4),
+ '0x91': (('DPM_REQ_RDO_0', 'RDO_REG_STATUS_0'), None, '0x91', 4),
+ '0x92': (('DPM_REQ_RDO_1', 'RDO_REG_STATUS_1'), None, '0x91', 4),
+ '0x93': (('DPM_REQ_RDO_2', 'RDO_REG_STATUS_2'), None, '0x91', 4),
+ '0x94': (('DPM_REQ_RDO_3', 'RDO_REG_STATUS_3'), None, '0x91', 4),
+ '0x95': (('FTP_CUST_PASSWORD_REG',), None, '0x95', 1),
+ '0x96': (('FTP_CTRL_0',), None, '0x96', 1),
+ '0x97': (('FTP_CTRL_1',), None, '0x97', 1)}
+
+# hex address : bit fields (name, bit offset, width)
+FIELDS = {'0xb': (('PHY_STATUS_AL', 0, 1),
+         ('PRT_STATUS_AL', 1, 1),
+         ('_Reserved_2', 2, 1),
+         ('PD_TYPEC_STATUS_AL', 3, 1),
+         ('HW_FAULT_STATUS_AL', 4, 1),
+         ('MONITORING_STATUS_AL', 5, 1),
+         ('CC_DETECTION_STATUS_AL', 6, 1),
+         ('HARD_RESET_AL', 7, 1)),
+ '0xc': (('PHY_STATUS_AL_MASK', 0, 1),
+         ('PRT_STATUS_AL_MASK', 1, 1),
+         ('_Reserved_2', 2, 1),
+         ('PD_TYPEC_STATUS_AL_MASK', 3, 1),
+         ('HW_FAULT_STATUS_AL_MASK', 4, 1),
+         ('MONITORING_STATUS_AL_MASK', 5, 1),
+         ('CC_DETECTION_STATUS_AL_MASK', 6, 1),
+         ('HARD_RESET_AL_MASK', 7, 1)),
+ '0xd': (('ATTACH_STATE_TRANS', 0, 1), ('_Reserved_1_7', 1, 7)),
+ '0xe': (('CC_ATTACH_STATE', 0, 1),
+         ('CC_VCONN_SUPPLY_STATE', 1, 1),
+         ('CC_DATA_ROLE', 2, 1),
+         ('CC_POWER_ROLE', 3, 1),
+         ('START_UP_POWER_MODE', 4, 1),
+         ('CC_ATTACH_MODE', 5, 3)),
+ '0xf': (('VCONN_VALID_TRANS', 0, 1),
+         ('VBUS_VALID_SNK_TRANS', 1, 1),
+         ('VBUS_VSAFE0V_TRANS', 2, 1),
+         ('VBUS_READY_TRANS', 3, 1),
+         ('VBUS_LOW_STATUS', 4, 1),
+         ('VBUS_HIGH_STATUS', 5, 1),
+         ('Reserved6_7', 6, 2)),
+ '0x10': (('VCONN_VALID', 0, 1),
+          ('VBUS_VALID_SNK', 1, 1),
+          ('VBUS_VSAFE0V', 2, 1),
+          ('VBUS_READY', 3, 1),
+          ('_Reserved_4_7', 4, 4)),
+ '0x11': (('CC1_STATE', 0, 2),
+          ('CC2_STATE', 2, 2),
+          ('CONNECT_RESULT', 4, 1),
+          ('LOOKING_FOR_CONNECTION', 5, 1),
+          ('_Reserved_4_7', 6, 2)),
+ '0x12': (('VCONN_SW_OVP_FAULT_TRANS', 0, 1),
+          ('VCONN_SW_OCP_FAULT_TRANS', 1, 1),
+          ('VCONN_SW_RVP_FAULT_TRANS', 2, 1),
+          ('VBUS_VSRC_DISCH_FAULT_TRANS', 3, 1),
+          ('VPU_VALID_TRANS', 4, 1),
+          ('VPU_OVP_FAULT_TRANS', 5, 1),
+          ('_Reserved_6', 6, 1),
+          ('THERMAL_FAULT', 7, 1)),
+ '0x13': (('VCONN_SW_OVP_FAULT', 0, 1),
+          ('VCONN_SW_OCP_FAULT', 1, 1),
+          ('VCONN_SW_RVP_FAULT', 2, 1),
+          ('VSRC_DISCH_FAULT', 3, 1),
+          ('Reserved', 4, 1),
+          ('VBUS_DISCH_FAULT', 5, 1),
+          ('VPU_PRESENCE', 6, 1),
+          ('VPU_OVP_FAULT', 7, 1)),
+ '0x14': (('PD_TYPEC_HAND_CHECK', 0, 4), ('Reserved_4_7', 4, 4)),
+ '0x15': (('TYPEC_FSM_STATE', 0, 5), ('PD_SNK_TX_RP', 5, 1), ('PD_SRC_TX_RP', 6, 1), ('REVERSE', 7, 1)),
+ '0x16': (('HWRESET_RECEIVED', 0, 1),
+          ('HWRESET_DONE', 1, 1),
+          ('MSG_RECEIVED', 2, 1),
+          ('MSG_SENT', 3, 1),
+          ('BIST_RECEIVED', 4, 1),
+          ('BIST_SENT', 5, 1),
+          ('Reserved_6', 6, 1),
+          ('TX_ERROR', 7, 1)),
+ '0x17': (('TX_MSG_FAIL', 0, 1),
+          ('TX_MSG_DISC', 1, 1),
+          ('TX_MSG_SUCC', 2, 1),
+          ('IDLE', 3, 1),
+          ('Reserved2', 4, 1),
+          ('SOP_RX_Type', 5, 3)),
+ '0x18': (('CC_VCONN_SUPPLY_EN', 0, 1),
+          ('VCONN_SWAP_EN', 1, 1),
+          ('PR_SWAP_EN', 2, 1),
+          ('DR_SWAP_EN', 3, 1),
+          ('CC_VCONN_DISCHARGE_EN', 4, 1),
+          ('SNK_DISCONNECT_MODE', 5, 1),
+          ('CC_CURRENT_ADVERTISED', 6, 2)),
+ '0x19': (('PRT_TX_SOP_MSG', 0, 3), ('reserved_3', 3, 1), ('PRT_RETRY_MSG_CNT', 4, 2), ('reserved_6_7', 6, 2)),
+ '0x1a': (('PD_CMD', 0, 8),),
+ '0x1d': (('reserved_0', 0, 1), ('PHY_TX_RESET', 1, 1), ('reserved_2_5', 2, 4), ('PD_TOP_LAYER', 6, 2)),
+ '0x21': (('VSEL_PDO', 0, 8),),
+ '0x23': (('SW_RESET_EN', 0, 1), ('_Reserved_1_7', 1, 7)),
+ '0x85': (('Operational_Current', 0, 10),
+          ('Voltage', 10, 10),
+          ('Reserved_22_20', 20, 3),
+          ('Fast_Role_Req_cur', 23, 2),
+          ('Dual_Role_Data', 25, 1),
+          ('USB_Communications_Capable', 26, 1),
+          ('Unconstrained_Power', 27, 1),
+          ('Higher_Capability', 28, 1),
+          ('Dual_Role_Power', 29, 1),
+          ('Fixed_Supply', 30, 2)),
+ '0x91': (('MaxCurrent', 0, 10),
+          ('OperatingCurrent', 10, 10),
+          ('reserved_22_20', 20, 3),
+          ('UnchunkedMess_sup', 23, 1),
+          ('UsbSuspend', 24, 1),
+          ('UsbComCap', 25, 1),
+          ('CapaMismatch', 26, 1),
+          ('GiveBack', 27, 1),
+          ('Object_Pos', 28, 3),
+          ('reserved_31', 31, 1))}
+
+# NVM default content by sector
+NVM_SECTORS = ((0, 0, 176, 170, 0, 69, 0, 0),
+ (0, 64, 157, 28, 255, 1, 60, 223),
+ (2, 64, 15, 0, 50, 0, 252, 241),
+ (0, 25, 191, 85, 87, 85, 85, 0),
+ (0, 45, 240, 32, 67, 0, 0, 251))
@@ -0,0 +1,222 @@
+'''
+Export decoded STUSB4500 I2C traffic as a Chrome trace (trace event JSON)
+
+The file opens in chrome://tracing and in Perfetto (ui.perfetto.dev), next to the MCU firmware traces.
+ * one track per register group (alert, status, control, PD RX / TX, PDO / RDO, NVM) with a slice for
+   each decoded frame, from frame start to end
+ * instant events for the policy engine, Type-C and CC state transitions and for the alerts in
+   ALERT_STATUS_1
+ * counter tracks with the negotiated voltage and current from RDO_REG_STATUS_0
+
+The events are written while decoding through a buffered writer, so the trace is never held in memory.
+
+usage : python trace_export.py capture.csv [-o trace.json] [--offset 0.0] [-s name=value]
+
+October 2022, version 1.0.0
+Paul van Haastrecht
+'''
+import argparse
+import json
+import sys
+
+import HighLevelAnalyzer as stusb
+from HighLevelAnalyzer import STUSB_Registers, STATE_REGISTERS, StateEvents, transaction_access
+from offline import make_hla, read_export, parse_settings
+
+# register group : (first, last register address), the track of a register
+REGISTER_GROUPS = (
+    ("alert",       0x0b, 0x0c),
+    ("status",      0x0d, 0x17),
+    ("control",     0x18, 0x2f),
+    ("PD RX",       0x30, 0x4e),
+    ("PD TX",       0x50, 0x6e),
+    ("PDO / RDO",   0x70, 0x94),
+    ("NVM",         0x95, 0x97)
+)
+
+# tracks next to the register groups
+TRACK_OTHER = len(REGISTER_GROUPS) + 1
+TRACK_STATES = len(REGISTER_GROUPS) + 2
+TRACK_ALERTS = len(REGISTER_GROUPS) + 3
+
+Alert_names = {
+    stusb.PRT_STATUS_AL             : "PRT_STATUS_AL",
+    stusb.CC_HW_FAULT_STATUS_AL     : "CC_HW_FAULT_STATUS_AL",
+    stusb.TYPEC_MONITORING_STATUS_AL: "TYPEC_MONITORING_STATUS_AL",
+    stusb.PORT_STATUS_AL            : "PORT_STATUS_AL"
+}
+
+def register_track(register):
+    """ track (thread id) of a register """
+    if register is None:
+        return TRACK_OTHER
+
+    address = int(register, 16)
+
+    for num, (name, first, last) in enumerate(REGISTER_GROUPS):
+        if first <= address <= last:
+            return num + 1
+
+    return TRACK_OTHER
+
+class TraceWriter:
+    """ streams trace events to a file as JSON, encoded events are buffered and written in blocks """
+
+    def __init__(self, file, buffer_size=4096):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.count = 0
+        self.file.write('{"displayTimeUnit":"ns","traceEvents":[\n')
+
+    def add(self, event):
+        self.buffer.append(json.dumps(event, separators=(',', ':')))
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+
+        if self.count > 0:
+            self.file.write(",\n")
+
+        self.file.write(",\n".join(self.buffer))
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.write("\n]}\n")
+
+class TraceExporter:
+    """ decode frames and write the trace events """
+
+    def __init__(self, writer, settings=None, offset=0.0):
+        self.writer = writer
+        self.hla = make_hla(settings or {})
+        self.offset = offset                # seconds added to the capture time
+        self.events = {}                    # process id : StateEvents
+        self.rdo = {}                       # process id : last RDO value
+        self.pids = set()
+
+    def ts(self, seconds):
+        """ trace time stamp (microseconds) """
+        return (float(seconds) + self.offset) * 1e6
+
+    def process(self, address):
+        """ process id of an I2C address, with the track names on first use """
+        pid = address if address is not None else 0
+
+        if pid not in self.pids:
+            self.pids.add(pid)
+            self.writer.add({"ph": "M", "pid": pid, "name": "process_name",
+                             "args": {"name": "STUSB4500 " + (hex(address) if address is not None else "?")}})
+
+            names = [group[0] for group in REGISTER_GROUPS] + ["other", "state transitions", "alerts"]
+            for tid, name in enumerate(names, 1):
+                self.writer.add({"ph": "M", "pid": pid, "tid": tid, "name": "thread_name", "args": {"name": name}})
+                self.writer.add({"ph": "M", "pid": pid, "tid": tid, "name": "thread_sort_index", "args": {"sort_index": tid}})
+
+        return pid
+
+    def add_frames(self, frames):
+        for frame in frames:
+            tr = self.hla.collect(frame)
+
+            if tr is not None:
+                self.add_transaction(tr)
+
+    def add_transaction(self, tr):
+        rendered = self.hla.render(tr)
+        out = self.hla.emit(tr, rendered)
+        pid = self.process(tr[2])
+
+        if out is None:
+            out = []
+        elif not isinstance(out, list):
+            out = [out]
+
+        for frame in out:
+            self.add_frame(pid, rendered[3], frame)
+
+        register, values, is_read = transaction_access(tr)
+
+        if len(values) > 0:
+            self.add_events(pid, tr[0], register, values, is_read)
+
+    def add_frame(self, pid, register, frame):
+        """ slice of a decoded frame (transitions are instant events, see add_events) """
+        if frame.type == "transition":
+            return
+
+        if frame.type == "trigger":
+            self.writer.add({"ph": "i", "s": "g", "pid": pid, "tid": TRACK_STATES, "ts": self.ts(frame.start_time),
+                             "name": "TRIGGER " + frame.data.get("description", ""), "args": dict(frame.data)})
+            return
+
+        if frame.type == "ping":
+            name = "ping"
+        else:
+            name = STUSB_Registers.get(register, "unknown: ").strip(": ")
+
+        self.writer.add({"ph": "X", "pid": pid, "tid": register_track(register), "ts": self.ts(frame.start_time),
+                         "dur": max((float(frame.end_time) - float(frame.start_time)) * 1e6, 0.0),
+                         "name": name, "cat": frame.type, "args": dict(frame.data)})
+
+    def add_events(self, pid, start, register, values, is_read):
+        """ state transition and alert instants, RDO counters """
+        if is_read and register in STATE_REGISTERS:
+            if pid not in self.events:
+                self.events[pid] = StateEvents()
+
+            change = self.events[pid].update(register, values[0], start)
+
+            if change is not None:
+                previous, name, dwell = change
+                self.writer.add({"ph": "i", "s": "t", "pid": pid, "tid": TRACK_STATES, "ts": self.ts(start),
+                                 "name": STUSB_Registers[register] + name,
+                                 "args": {"previous": previous, "dwell": stusb.format_time(dwell)}})
+
+        elif is_read and register == stusb.ALERT_STATUS_1:
+            for bit, name in Alert_names.items():
+                if values[0] & bit:
+                    self.writer.add({"ph": "i", "s": "t", "pid": pid, "tid": TRACK_ALERTS, "ts": self.ts(start),
+                                     "name": name})
+
+        elif register == stusb.RDO_REG_STATUS_0 and len(values) >= 4:
+            rdo = int.from_bytes(values[:4], 'little')
+
+            if rdo != self.rdo.get(pid):
+                self.rdo[pid] = rdo
+                self.writer.add({"ph": "C", "pid": pid, "ts": self.ts(start), "name": "RDO voltage (V)",
+                                 "args": {"V": ((rdo >> 10) & 0x3ff) / 20}})
+                self.writer.add({"ph": "C", "pid": pid, "ts": self.ts(start), "name": "RDO current (A)",
+                                 "args": {"A": round((rdo & 0x3ff) * 0.01, 2)}})
+
+def export_file(capture, output, settings=None, offset=0.0):
+    """ decode a capture export into a trace file, returns the number of trace events """
+    with open(capture, newline='') as source, open(output, "w") as file:
+        writer = TraceWriter(file)
+        exporter = TraceExporter(writer, settings, offset)
+        exporter.add_frames(read_export(source))
+        writer.close()
+
+    return writer.count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a decoded STUSB4500 capture as Chrome / Perfetto trace")
+    parser.add_argument("capture", help="I2C analyzer table export (CSV) from Logic 2")
+    parser.add_argument("-o", "--output", help="trace file (default capture name with .json)")
+    parser.add_argument("--offset", type=float, default=0.0, help="seconds added to the capture time, to align with other traces")
+    parser.add_argument("-s", "--setting", action="append", help="analyzer setting as name=value")
+    args = parser.parse_args(argv)
+
+    output = args.output or args.capture.rsplit(".", 1)[0] + ".json"
+    count = export_file(args.capture, output, parse_settings(args.setting), args.offset)
+
+    print(count, "trace events written to", output, file=sys.stderr)
+
+if __name__ == '__main__':
+    main()